@@ -5,23 +5,42 @@ Customizes the admin interface for managing customers, products, invoices,
 and related entities with enhanced search, filtering, and bulk operations.
 """
 
-from django.contrib import admin
-from django.db.models import Case, When, Value, IntegerField
+from django.contrib import admin, messages
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.db.models import Case, When, Value, IntegerField, Q
 from django.urls import path, reverse
 from django.http import HttpResponseRedirect
 from django.utils.html import format_html
+from django.utils.timezone import localdate
 
+from .deletion_utils import delete_invoices
+from .deposit_utils import create_deposit_batch, reconcile_deposit_batch
 from .models import (
     Customer, Salesman, Deliveryman, Invoice, InvoiceItem, Product, 
-    ProductTransaction, Forbidden_Word, AdditionalItem, SpecialPrice
+    ProductTransaction, Forbidden_Word, AdditionalItem, SpecialPrice, CommissionTier, CommissionShare,
+    SharedSalesAccount, PricingRule, ClosedPeriod, ReportSnapshot, DepositBatch, DepositBatchTotal
 )
-from .forms import SpecialPriceInlineForm
+from .forms import (
+    SpecialPriceInlineForm, ProductAutocompleteSelect, ProductChoiceCache, ProductChoiceField, product_choice_label
+)
+from .pagination_utils import EstimatedCountPaginator, KeysetChangeList
+from .report_utils import rebuild_stale_snapshots
+from .search_utils import query_terms, ranked_search
 
 admin.site.site_header = "Lafarge Admin"
 admin.site.site_title = "Lafarge Admin Portal"
 admin.site.index_title = "Welcome to Lafarge Admin Panel"
 
 
+class SearchIndexAdminMixin:
+    """Answer the changelist search and autocomplete lookups from the full-text search index."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not query_terms(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return ranked_search(queryset, search_term), False
+
+
 class SpecialPriceInline(admin.TabularInline):
     model = SpecialPrice
     form = SpecialPriceInlineForm
@@ -29,33 +48,11 @@ class SpecialPriceInline(admin.TabularInline):
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'care_of', 'address', 'telephone_number')
+    # Searches rank name matches above care of, address and telephone matches
     search_fields = ('name', 'care_of', 'address', 'telephone_number')
     inlines = [SpecialPriceInline]
-    def get_search_results(self, request, queryset, search_term):
-        """
-        Override search to prioritize results by field importance.
-        
-        Search priority: name > care_of > address > telephone_number
-        """
-        # Get base search results from parent class
-        queryset, use_distinct = super().get_search_results(request, queryset, search_term)
-
-        if search_term:
-            # Search with priority: name > care_of > address > telephone
-            name_matches = queryset.filter(name__icontains=search_term)
-            care_of_matches = queryset.filter(care_of__icontains=search_term).exclude(
-                pk__in=name_matches.values_list('pk', flat=True))
-            address_matches = queryset.filter(address__icontains=search_term).exclude(
-                pk__in=name_matches.values_list('pk', flat=True))
-            telephone_matches = queryset.filter(telephone_number__icontains=search_term).exclude(
-                pk__in=name_matches.values_list('pk', flat=True))
-
-            # Combine results in priority order
-            queryset = name_matches | care_of_matches | address_matches | telephone_matches
-
-        return queryset, use_distinct
 
 
 @admin.register(Forbidden_Word)
@@ -69,22 +66,128 @@ class SalesmanAdmin(admin.ModelAdmin):
     search_fields = ('code', 'name')
 
 
+@admin.register(CommissionTier)
+class CommissionTierAdmin(admin.ModelAdmin):
+    list_display = ('min_sales', 'rate')
+
+
+@admin.register(CommissionShare)
+class CommissionShareAdmin(admin.ModelAdmin):
+    list_display = ('salesman', 'percentage')
+    list_select_related = ('salesman',)
+
+
+@admin.register(SharedSalesAccount)
+class SharedSalesAccountAdmin(admin.ModelAdmin):
+    list_display = ('salesman',)
+    list_select_related = ('salesman',)
+
+
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ('product_name_contains', 'rounding')
+    search_fields = ('product_name_contains',)
+
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'closed_at')
+    readonly_fields = ('closed_at',)
+
+
+@admin.register(ReportSnapshot)
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('report', 'year', 'month', 'scope_id', 'stale', 'built_at')
+    list_filter = ('report', 'stale', 'year')
+    readonly_fields = ('report', 'year', 'month', 'scope_id', 'html', 'stale', 'version', 'built_at')
+    actions = ['rebuild_stale']
+
+    def has_add_permission(self, request):
+        return False  # Snapshots are made by closing a period
+
+    @admin.action(description="Rebuild all stale snapshots")
+    def rebuild_stale(self, request, queryset):
+        self.message_user(request, f"Rebuilt {rebuild_stale_snapshots()} stale snapshots.")
+
+
+class DepositBatchTotalInline(admin.TabularInline):
+    model = DepositBatchTotal
+    extra = 0
+    fields = ('payment_method', 'expected', 'actual')
+    readonly_fields = ('payment_method', 'expected')
+
+    def has_add_permission(self, request, obj=None):
+        return False  # Totals are recorded when the batch is made
+
+
+@admin.register(DepositBatch)
+class DepositBatchAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'date', 'created_at', 'reconciled_at')
+    list_filter = ('reconciled_at',)
+    date_hierarchy = 'date'
+    readonly_fields = ('created_at', 'reconciled_at')
+    inlines = [DepositBatchTotalInline]
+    actions = ['reconcile']
+
+    def has_add_permission(self, request):
+        return False  # Batches are made from the selected invoices
+
+    @admin.action(description="Reconcile selected batches with the bank")
+    def reconcile(self, request, queryset):
+        reconciled = 0
+        for batch in queryset.filter(reconciled_at__isnull=True):
+            mismatches = reconcile_deposit_batch(batch)
+            if not mismatches:
+                reconciled += 1
+                continue
+            details = ", ".join(
+                f"{mismatch.label} expected ${mismatch.expected:,.2f}, "
+                f"{'not entered' if mismatch.actual is None else f'got ${mismatch.actual:,.2f}'}"
+                for mismatch in mismatches
+            )
+            self.message_user(request, f"{batch} does not match: {details}.", messages.WARNING)
+        self.message_user(request, f"Reconciled {reconciled} deposit batches.")
+
+
 @admin.register(Deliveryman)
 class DeliverymanAdmin(admin.ModelAdmin):
     list_display = ('code', 'name')
     search_fields = ('code', 'name')
 
 
+class ProductAutocompleteJsonView(AutocompleteJsonView):
+    """Product search for the invoice line picker: in-stock products first, labelled with lot and stock."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Keep the search ranking, or name order without a search term, within each stock group
+        ordering = queryset.query.order_by or ('name',)
+        return queryset.annotate(
+            sort_order=Case(
+                When(quantity__gt=0, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('sort_order', *ordering)
+
+    def serialize_result(self, obj, to_field_name):
+        return {'id': str(getattr(obj, to_field_name)), 'text': product_choice_label(obj)}
+
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'quantity', 'price', 'unit_per_box', 'box_amount', 'box_remain', 'copy_product_button')
     search_fields = ('name',)
     readonly_fields = ('box_amount', 'box_remain')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('copy/<int:product_id>/', self.admin_site.admin_view(self.copy_product), name='invoice_product_copy'),
+            path('autocomplete/', self.admin_site.admin_view(ProductAutocompleteJsonView.as_view(admin_site=self.admin_site)),
+                 name='invoice_product_autocomplete'),
         ]
         return custom_urls + urls
 
@@ -115,8 +218,18 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(ProductTransaction)
 class ProductTransactionAdmin(admin.ModelAdmin):
     list_display = ('product', 'transaction_type', 'change', 'quantity_after_transaction', 'timestamp', 'description')
+    list_select_related = ('product',)
     search_fields = ('product__name', 'transaction_type', 'description')
     list_filter = ('transaction_type', 'timestamp')
+    date_hierarchy = 'timestamp'
+    # The log pages newest first by timestamp with a cursor instead of OFFSET
+    ordering = ('-timestamp', '-id')
+    keyset_field = 'timestamp'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 
 class InvoiceItemInline(admin.TabularInline):
@@ -128,24 +241,28 @@ class InvoiceItemInline(admin.TabularInline):
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         """
-        Customize product dropdown to show in-stock items first.
+        Use the product autocomplete instead of rendering every product on every line.
+
+        Selected products for all lines come from one cached query per request.
         """
         if db_field.name == "product":
-            # Order products: in-stock first, then out-of-stock
-            products_gt_zero = Product.objects.filter(quantity__gt=0).order_by('name')
-            products_eq_zero = Product.objects.filter(quantity=0).order_by('name')
-
-            combined_queryset = (products_gt_zero | products_eq_zero).annotate(
-                sort_order=Case(
-                    When(quantity=0, then=Value(1)),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
-            ).order_by('sort_order', 'name')
-            kwargs["queryset"] = combined_queryset
-
+            kwargs["widget"] = ProductAutocompleteSelect(db_field, self.admin_site, using=kwargs.get("using"))
+            kwargs["form_class"] = ProductChoiceField
+            kwargs["choice_cache"] = self.product_choice_cache(request)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
+    def product_choice_cache(self, request):
+        """Cache of the products on the invoice being edited and in the submitted lines."""
+        if not hasattr(request, '_product_choice_cache'):
+            condition = Q(pk__in=[
+                value for key, value in request.POST.items() if key.endswith('-product') and value.isdigit()
+            ])
+            object_id = request.resolver_match.kwargs.get('object_id') if request.resolver_match else None
+            if object_id and object_id.isdigit():
+                condition |= Q(invoiceitem__invoice_id=object_id)
+            request._product_choice_cache = ProductChoiceCache(condition)
+        return request._product_choice_cache
+
 
 class AdditionalItemInline(admin.TabularInline):
     model = AdditionalItem
@@ -154,12 +271,17 @@ class AdditionalItemInline(admin.TabularInline):
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     autocomplete_fields = ['customer']
     list_display = ('number', 'terms', 'customer', 'delivery_date', 'payment_date', 'total_price', 'view_invoice_link')
+    list_select_related = ('customer',)
     search_fields = ('number', 'customer__name')
+    date_hierarchy = 'delivery_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [InvoiceItemInline, AdditionalItemInline]
-    readonly_fields = ('total_price', 'terms', 'salesman')
+    readonly_fields = ('total_price', 'terms', 'salesman', 'deposit_batch')
+    actions = ['batch_for_deposit']
 
     def view_invoice_link(self, obj):
         """Generate link to view invoice detail page."""
@@ -174,35 +296,17 @@ class InvoiceAdmin(admin.ModelAdmin):
         form.instance.save()
 
     def delete_model(self, request, obj):
-        """
-        Override delete_model to restock products when an invoice is deleted.
-        
-        When an invoice is deleted, this method restores product quantities
-        that were reduced during invoice creation and logs the restock transactions.
-        """
-        for invoice_item in obj.invoiceitem_set.all():
-            product = invoice_item.product
-            product.quantity += invoice_item.quantity
-            product.save()
-
-            # Record product restock transaction
-            if obj.delivery_date:
-                ProductTransaction.objects.create(
-                    product=product,
-                    transaction_type='restock',
-                    change=invoice_item.quantity,
-                    quantity_after_transaction=product.quantity,
-                    description=f"Restock due to deletion of invoice #{obj.number} from {obj.customer.name}"
-                )
-
-        # Proceed with invoice deletion
-        super().delete_model(request, obj)
+        """Delete the invoice, restocking its items and logging the restock transactions."""
+        delete_invoices(Invoice.objects.filter(pk=obj.pk))
 
     def delete_queryset(self, request, queryset):
-        """
-        Handle bulk deletion by calling delete_model for each invoice.
-        
-        This ensures proper product restocking for all deleted invoices.
-        """
-        for obj in queryset:
-            self.delete_model(request, obj)
+        """Delete the selected invoices in one transaction, restocking each product once."""
+        delete_invoices(queryset)
+
+    @admin.action(description="Batch selected payments for deposit today")
+    def batch_for_deposit(self, request, queryset):
+        batch = create_deposit_batch(queryset, localdate())
+        if batch is None:
+            self.message_user(request, "None of the selected invoices are waiting for deposit.", messages.WARNING)
+        else:
+            self.message_user(request, f"Created {batch} with {batch.invoices.count()} invoices.")
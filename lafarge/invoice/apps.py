@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class InvoiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoice'
+
+    def ready(self):
+        # Connect the SQLite profile to connection_created, the search index, sync log, pricing caches, view
+        # cache version, report snapshots and dashboard tiles to model signals, and the default commission and
+        # pricing rules to post_migrate
+        from . import (  # noqa: F401
+            cache_utils, commission_utils, dashboard_utils, price_book_utils, pricing_utils, report_utils,
+            search_utils, sqlite_utils, sync_utils,
+        )
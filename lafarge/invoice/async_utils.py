@@ -0,0 +1,53 @@
+"""
+Utility functions for the async JSON views.
+
+Django REST framework views are synchronous, so the read-heavy JSON endpoints
+are plain async Django views using the async ORM. ``api_response`` renders
+their data with DRF's ``JSONRenderer`` and ``async_api_view`` answers
+unsupported methods the way ``@api_view`` does, so clients see the same
+responses as before whether the project runs under WSGI or ASGI.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+async def alist(queryset):
+    """Evaluate ``queryset`` with the async ORM, running its ``prefetch_related`` lookups too."""
+    return [row async for row in queryset]
+
+
+def api_response(data, status=200):
+    """JSON response rendered exactly as a DRF ``Response`` of ``data`` is for a JSON client."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def aserialize(serializer_class, queryset):
+    """
+    Serialized rows of ``queryset``: the rows are fetched with the async ORM,
+    then serialized in a worker thread so a long list does not hold up the
+    event loop.
+    """
+    rows = await alist(queryset)
+    return await sync_to_async(lambda: serializer_class(rows, many=True).data)()
+
+
+def async_api_view(methods=('GET',)):
+    """Async counterpart of DRF's ``@api_view``: other methods are answered with 405 and a DRF error body."""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            allowed = list(methods) + (['HEAD'] if 'GET' in methods else [])
+            if request.method not in allowed:
+                response = api_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+                response['Allow'] = ', '.join(allowed)
+                return response
+            return await view(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
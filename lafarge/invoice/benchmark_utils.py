@@ -0,0 +1,295 @@
+"""
+Utility functions for benchmarking views and helpers against the current database.
+
+Provides timing with query counting, percentile summaries, the list of
+representative requests used by the ``benchmark`` management command and the
+concurrent load runs comparing the WSGI and ASGI handlers.
+"""
+
+import asyncio
+import itertools
+import math
+import statistics
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count, Q
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from .models import Customer, Deliveryman, Invoice, InvoiceItem, Product, Salesman
+from .period_utils import month_period
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+def percentile(values, pct):
+    """Return the ``pct`` percentile of ``values`` using linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower, upper = math.floor(rank), math.ceil(rank)
+    if lower == upper:
+        return ordered[int(rank)]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(durations, query_counts, statuses=()):
+    """Summarise raw timings (in seconds) as millisecond latency percentiles."""
+    durations_ms = [duration * 1000 for duration in durations]
+    summary = {
+        'iterations': len(durations_ms),
+        'p50_ms': round(percentile(durations_ms, 50), 3),
+        'p95_ms': round(percentile(durations_ms, 95), 3),
+        'mean_ms': round(statistics.fmean(durations_ms), 3),
+        'min_ms': round(min(durations_ms), 3),
+        'max_ms': round(max(durations_ms), 3),
+        'queries': max(query_counts) if query_counts else 0,
+    }
+    if statuses:
+        summary['status'] = sorted(set(statuses))
+    return summary
+
+
+@contextmanager
+def capture_queries():
+    """
+    Record the queries run inside the block on every database alias, so that
+    reads routed to the replica are counted along with those on ``default``.
+
+    Yields the list the queries are appended to, as ``alias``, ``sql`` and ``params`` dicts.
+    """
+    queries = []
+
+    def recorder(alias):
+        def record(execute, sql, params, many, context):
+            queries.append({'alias': alias, 'sql': sql, 'params': params})
+            return execute(sql, params, many, context)
+        return record
+
+    # Execute wrappers do not open connections, so unused aliases and a missing replica snapshot are left alone
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder(alias)))
+        yield queries
+
+
+def time_callable(function, iterations, warmup=1):
+    """
+    Call ``function`` repeatedly, recording wall time and queries per call.
+
+    Returns:
+        tuple: (durations in seconds, query counts, return values)
+    """
+    for _ in range(warmup):
+        function()
+
+    durations, query_counts, results = [], [], []
+    for _ in range(iterations):
+        with capture_queries() as queries:
+            start = time.perf_counter()
+            result = function()
+            durations.append(time.perf_counter() - start)
+        query_counts.append(len(queries))
+        results.append(result)
+    return durations, query_counts, results
+
+
+def benchmark_user(username=BENCHMARK_USERNAME):
+    """Dedicated superuser the benchmarks log in as, created on first use."""
+    user, _ = get_user_model().objects.get_or_create(username=username)
+    if not user.is_superuser:
+        user.is_staff = user.is_superuser = True
+        user.save()
+    return user
+
+
+def benchmark_client(username=BENCHMARK_USERNAME):
+    """Test client logged in as the benchmark superuser."""
+    client = Client(raise_request_exception=False)
+    client.force_login(benchmark_user(username))
+    return client
+
+
+def benchmark_request(client, url, iterations, warmup=1, **extra):
+    """Time GET requests to ``url`` with the given test client."""
+    durations, query_counts, responses = time_callable(
+        lambda: client.get(url, **extra), iterations, warmup=warmup
+    )
+    return summarize(durations, query_counts, [response.status_code for response in responses])
+
+
+def representative_requests():
+    """
+    Build the representative request set from the data in the database.
+
+    Parameters are chosen to hit the busiest data: the latest delivery month,
+    the salesman and deliveryman with most invoices in that month, the
+    customer with most unpaid invoices and the product with most invoice items.
+
+    Returns:
+        list: (name, url) pairs
+    """
+    latest = Invoice.objects.filter(delivery_date__isnull=False).order_by('-delivery_date').first()
+    if latest is None:
+        return []
+    year, month = latest.delivery_date.year, latest.delivery_date.month
+
+    latest_month = Q(**month_period(year, month).lookups('invoice__delivery_date'))
+    salesman = Salesman.objects.annotate(n=Count('invoice', filter=latest_month)).order_by('-n').first()
+    deliveryman = Deliveryman.objects.annotate(n=Count('invoice', filter=latest_month)).order_by('-n').first()
+    product = Product.objects.annotate(n=Count('invoiceitem')).order_by('-n').first()
+    customer = (
+        Customer.objects.filter(invoice__payment_date__isnull=True, invoice__delivery_date__isnull=False)
+        .annotate(n=Count('invoice')).order_by('-n').first()
+    ) or latest.customer
+    invoice = (
+        Invoice.objects.filter(delivery_date__isnull=False).exclude(number__startswith='S-')
+        .annotate(n=Count('invoiceitem')).order_by('-n').first()
+    )
+    sample = Invoice.objects.filter(number__startswith='S-').first() or invoice
+    care_of = customer.care_of or ''
+
+    requests = [
+        ('home', reverse('home')),
+        ('sales_data', reverse('sales_data')),
+        ('product_insights_data', reverse('product_insights')),
+        ('monthly_preview', reverse('monthly_preview')),
+        ('monthly_report', reverse('monthly_report', kwargs={'year': year, 'month': month})),
+        ('monthly_payment_preview', reverse('monthly_payment_preview')),
+        ('monthly_payment_report', reverse('monthly_payment_report', kwargs={'year': year, 'month': month})),
+        ('monthly_analyze_preview', reverse('monthly_analyze_preview')),
+        ('monthly_analyze_detail', reverse('monthly_analyze_detail', kwargs={'year': year, 'month': month})),
+        ('customers_with_unpaid_invoices', reverse('unpaid_invoices')),
+        ('unpaid_invoices_by_month_detail',
+         reverse('unpaid_invoices_by_month_detail', kwargs={'year_month': f"{year}-{month:02d}"})),
+        ('customer_list', reverse('customer_list')),
+        ('customer_detail', reverse('customer_detail', args=[customer.name, care_of or 'None'])),
+        ('invoice_list', reverse('invoice_list')),
+        ('invoice_detail', reverse('invoice_detail', args=[invoice.number])),
+        ('product_list', reverse('product_list')),
+        ('product_transaction_view', reverse('product_transactions', args=[product.id])),
+        ('product_transaction_detail', reverse('product_transaction_detail', args=[product.id])),
+        ('download_invoice_pdf', reverse('download_invoice_pdf', args=[invoice.number])),
+        ('download_invoice_legacy_pdf', reverse('download_invoice_legacy_pdf', args=[invoice.number])),
+        ('download_delivery_note_pdf', reverse('download_delivery_note_pdf', args=[invoice.number])),
+        ('download_order_form_pdf', reverse('download_order_form_pdf', args=[invoice.number])),
+        ('download_sample_pdf', reverse('download_sample_pdf', args=[sample.number])),
+        ('download_statement_pdf', reverse('download_statement_pdf', args=[customer.name, care_of or 'None'])),
+        ('api_products', reverse('ProductView')),
+        ('api_customers', reverse('CustomerView')),
+        ('api_invoices', reverse('InvoiceView')),
+        ('api_salesmen_commissions',
+         reverse('get_all_salesmen_commissions', kwargs={'year': year, 'month': month})),
+        ('monthly_analyze_api', reverse('monthly_analyze_api', kwargs={'year': year, 'month': month})),
+    ]
+    if salesman is not None:
+        requests += [
+            ('salesman_detail', reverse('salesman_detail', args=[salesman.id])),
+            ('salesman_monthly_preview', reverse('salesman_monthly_preview', args=[salesman.id])),
+            ('salesman_monthly_report', reverse('salesman_monthly_report',
+                                                kwargs={'salesman_id': salesman.id, 'year': year, 'month': month})),
+            ('api_salesman_monthly_preview', reverse('salesman-monthly-preview', args=[salesman.name])),
+        ]
+    if deliveryman is not None:
+        requests += [
+            ('deliveryman_monthly_preview', reverse('deliveryman_monthly_preview', args=[deliveryman.id])),
+            ('deliveryman_monthly_report', reverse('deliveryman_monthly_report',
+                                                   kwargs={'deliveryman_id': deliveryman.id,
+                                                           'year': year, 'month': month})),
+        ]
+    return requests
+
+
+def load_test_wsgi(user, urls, concurrency, duration):
+    """
+    Request ``urls`` in turn from ``concurrency`` threads through the WSGI
+    handler for ``duration`` seconds, the way a threaded WSGI server would.
+
+    Returns:
+        dict: url to lists of durations and status codes
+    """
+    outcomes = {url: ([], []) for url in urls}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(offset):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        local = {url: ([], []) for url in urls}
+        try:
+            for url in itertools.islice(itertools.cycle(urls), offset, None):
+                if time.perf_counter() >= stop_at:
+                    break
+                start = time.perf_counter()
+                response = client.get(url)
+                local[url][0].append(time.perf_counter() - start)
+                local[url][1].append(response.status_code)
+        finally:
+            connections.close_all()
+        with lock:
+            for url, (durations, statuses) in local.items():
+                outcomes[url][0].extend(durations)
+                outcomes[url][1].extend(statuses)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def load_test_asgi(user, urls, concurrency, duration):
+    """
+    Request ``urls`` in turn from ``concurrency`` tasks on one event loop
+    through the ASGI handler for ``duration`` seconds.
+
+    Each task keeps its own thread for the ORM, as a request does under an
+    ASGI server, so the database work is spread the same way as in the WSGI
+    run and the difference is the handling around it.
+
+    Returns:
+        dict: url to lists of durations and status codes
+    """
+    outcomes = {url: ([], []) for url in urls}
+    clients = []
+    for _ in range(concurrency):
+        client = AsyncClient(raise_request_exception=False)
+        client.force_login(user)
+        clients.append(client)
+
+    async def worker(client, offset, stop_at):
+        async with ThreadSensitiveContext():
+            try:
+                for url in itertools.islice(itertools.cycle(urls), offset, None):
+                    if time.perf_counter() >= stop_at:
+                        break
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    outcomes[url][0].append(time.perf_counter() - start)
+                    outcomes[url][1].append(response.status_code)
+            finally:
+                await sync_to_async(connections.close_all)()
+
+    async def run():
+        stop_at = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, offset, stop_at) for offset, client in enumerate(clients)))
+
+    asyncio.run(run())
+    return outcomes
+
+
+def dataset_summary():
+    """Row counts of the main tables, recorded alongside benchmark results."""
+    return {
+        'customers': Customer.objects.count(),
+        'products': Product.objects.count(),
+        'invoices': Invoice.objects.count(),
+        'invoice_items': InvoiceItem.objects.count(),
+    }
@@ -0,0 +1,167 @@
+"""
+Utility functions for the versioned view cache.
+
+``versioned_cache`` stores the responses of report views and JSON endpoints
+under keys that include a data version. Saving or deleting any invoice, item,
+product, customer, salesman, deliveryman, commission rule or deposit batch
+bumps the version, so every cached response is invalidated the moment the
+data changes rather than on a timer. Hits and misses are counted per view in the
+``lafarge_cache_requests_total`` metric.
+
+Worker processes only see each other's invalidations through a shared cache,
+so the ``invoice.E001`` check refuses the per-process ``locmem`` backend when
+``WEB_CONCURRENCY`` starts more than one worker.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Error, Tags, register
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.timezone import localdate
+from rest_framework.response import Response
+
+from .db_routers import reading_replica
+from .metrics_utils import record_cache_access
+from .models import (
+    AdditionalItem, CommissionShare, CommissionTier, Customer, Deliveryman, DepositBatch, DepositBatchTotal, Invoice,
+    InvoiceItem, Product, Salesman, SharedSalesAccount,
+)
+
+DATA_VERSION_KEY = 'invoice:data_version'
+# Entries are invalidated by the data version; the timeout only bounds the space taken by old versions
+VIEW_CACHE_TIMEOUT = 24 * 60 * 60
+
+VERSIONED_MODELS = (
+    Invoice, InvoiceItem, AdditionalItem, Product, Customer, Salesman, Deliveryman, CommissionTier, CommissionShare,
+    SharedSalesAccount, DepositBatch, DepositBatchTotal,
+)
+
+
+def data_version():
+    """Current data version, started from the clock so that a lost key never brings back an old version."""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        cache.add(DATA_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every versioned cache entry."""
+    try:
+        cache.incr(DATA_VERSION_KEY)
+    except ValueError:  # Not set yet, or evicted
+        cache.set(DATA_VERSION_KEY, time.time_ns(), None)
+
+
+def bump_data_version_on_commit():
+    bump_data_version()
+    # A request reading between the write and its commit would cache the old data under the new version
+    transaction.on_commit(bump_data_version)
+
+
+def view_cache_key(name, request, vary_on_user):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    user = (request.user.pk or 0) if vary_on_user else '-'
+    # Views reporting on "today" or "last month" change with the date even when the data does not
+    return f"invoice:view:{name}:{data_version()}:{localdate().isoformat()}:{user}:{path}"
+
+
+def _cache_entry(response):
+    """What to store for a response, or None when it should not be cached."""
+    # The replica can lag behind the data version, so its results are not stored under it
+    if response.status_code != 200 or reading_replica():
+        return None
+    if isinstance(response, Response):
+        return 'data', response.data, response.status_code
+    if isinstance(response, HttpResponse):
+        return 'response', response
+    return None
+
+
+def _cached_response(entry):
+    return Response(entry[1], status=entry[2]) if entry[0] == 'data' else entry[1]
+
+
+def versioned_cache(name, vary_on_user=True, timeout=VIEW_CACHE_TIMEOUT):
+    """
+    Cache the successful GET responses of a view until the data changes.
+
+    Apply it inside the access-control decorators, and to an ``APIView``'s
+    ``get`` with ``method_decorator``, whose ``Response`` data is cached and
+    rendered again on each hit. Async views are cached through the cache's
+    async API. Inside ``use_replica`` entries are served but only stored by
+    requests that read from ``default``.
+
+    Args:
+        name: cache and metrics label of the view
+        vary_on_user: cache per user, for pages whose rendering depends on who is viewing
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                key = await sync_to_async(view_cache_key)(name, request, vary_on_user)
+                entry = await cache.aget(key)
+                record_cache_access(f"view:{name}", hit=entry is not None)
+                if entry is not None:
+                    return _cached_response(entry)
+
+                response = await view(request, *args, **kwargs)
+                entry = _cache_entry(response)
+                if entry is not None:
+                    await cache.aset(key, entry, timeout)
+                return response
+
+            return async_wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            key = view_cache_key(name, request, vary_on_user)
+            entry = cache.get(key)
+            record_cache_access(f"view:{name}", hit=entry is not None)
+            if entry is not None:
+                return _cached_response(entry)
+
+            response = view(request, *args, **kwargs)
+            entry = _cache_entry(response)
+            if entry is not None:
+                cache.set(key, entry, timeout)
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.WEB_CONCURRENCY > 1 and settings.CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+        return [Error(
+            f"WEB_CONCURRENCY is {settings.WEB_CONCURRENCY} but the cache is local to each worker process.",
+            hint="Set CACHE_BACKEND to 'file' or 'redis' so that every worker sees the invalidations.",
+            id='invoice.E001',
+        )]
+    return []
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_changed_data_version(sender, **kwargs):
+    if sender in VERSIONED_MODELS:
+        bump_data_version_on_commit()
@@ -8,12 +8,18 @@ business-related prefixes that affect document formatting.
 from .models import Forbidden_Word
 
 
-def prefix_check(name):
+def get_forbidden_words():
+    """Load the lowercased forbidden words so repeated checks can share one query."""
+    return [word.lower() for word in Forbidden_Word.objects.values_list('word', flat=True)]
+
+
+def prefix_check(name, forbidden_words=None):
     """
     Check if a name contains medical/business prefixes or forbidden words.
     
     Args:
         name (str): The name to check
+        forbidden_words (list, optional): Preloaded result of get_forbidden_words()
         
     Returns:
         bool: True if name contains prefixes/forbidden words, False otherwise
@@ -25,9 +31,9 @@ def prefix_check(name):
     name_lower = name.lower()
     name_words = name_lower.split()
     
-    forbidden_words = Forbidden_Word.objects.values_list('word', flat=True)
-    forbidden_words_lower = [word.lower() for word in forbidden_words]
+    if forbidden_words is None:
+        forbidden_words = get_forbidden_words()
     
-    if any(keyword in name_words for keyword in keywords) or any(word in name_words for word in forbidden_words_lower):
+    if any(keyword in name_words for keyword in keywords) or any(word in name_words for word in forbidden_words):
         return True
     return False
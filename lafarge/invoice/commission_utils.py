@@ -0,0 +1,165 @@
+"""
+Utility functions for computing salesmen's commissions.
+
+A salesman's qualifying sales for a month are the totals of their own
+invoices plus their ``CommissionShare`` of the sales booked to the shared
+accounts. The rate is that of the highest ``CommissionTier`` reached, and the
+commission is qualifying sales × rate × 1.1. ``monthly_commissions`` does this
+for any salesmen and range of months from one grouped aggregate.
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from dateutil.relativedelta import relativedelta
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .models import CommissionShare, CommissionTier, Invoice, Salesman, SharedSalesAccount
+from .period_utils import Period
+
+COMMISSION_MULTIPLIER = Decimal('1.1')
+
+# Rules installed into an empty database, as they stood before they became editable in the admin
+DEFAULT_TIERS = [
+    (Decimal('0'), Decimal('0.02')),
+    (Decimal('50000'), Decimal('0.025')),
+    (Decimal('70000'), Decimal('0.0325')),
+    (Decimal('100000'), Decimal('0.04')),
+    (Decimal('130000'), Decimal('0.05')),
+    (Decimal('170000'), Decimal('0.055')),
+]
+DEFAULT_SHARES = {'Dominic So': Decimal('0.4'), 'Alex Cheung': Decimal('0.3'), 'Matthew Mak': Decimal('0.3')}
+DEFAULT_SHARED_ACCOUNTS = ('DS/MM/AC', 'Kelvin Ko')
+
+
+class Commission(NamedTuple):
+    salesman_id: int
+    personal_sales: Decimal
+    pooled_sales: Decimal  # sales of all the shared accounts
+    share_percentage: Decimal
+    shared_sales: Decimal  # the salesman's part of pooled_sales
+    qualifying_sales: Decimal
+    rate: Decimal
+    commission: Decimal
+
+
+class CommissionRules(NamedTuple):
+    tiers: list  # (min_sales, rate), highest first
+    shares: dict  # salesman id to share percentage
+    shared_accounts: frozenset  # salesman ids
+
+    def rate(self, sales):
+        """Incentive rate for ``sales``; the lowest tier also covers anything below it."""
+        if not self.tiers:
+            return Decimal('0')
+        return next((rate for minimum, rate in self.tiers if sales >= minimum), self.tiers[-1][1])
+
+    def tier_table(self, sales=None):
+        """Tiers lowest first as dicts with min_sales, max_sales (exclusive), rate and whether ``sales`` falls in it."""
+        tiers = self.tiers[::-1]
+        table = []
+        for index, (minimum, rate) in enumerate(tiers):
+            maximum = tiers[index + 1][0] if index + 1 < len(tiers) else None
+            current = sales is not None and (sales >= minimum or index == 0) and (maximum is None or sales < maximum)
+            table.append({'min_sales': minimum, 'max_sales': maximum, 'rate': rate, 'current': current})
+        return table
+
+    def commission(self, salesman_id, personal_sales, pooled_sales):
+        percentage = self.shares.get(salesman_id, Decimal('0'))
+        shared_sales = pooled_sales * percentage
+        qualifying_sales = personal_sales + shared_sales
+        rate = self.rate(qualifying_sales)
+        return Commission(salesman_id, personal_sales, pooled_sales, percentage, shared_sales, qualifying_sales,
+                          rate, qualifying_sales * rate * COMMISSION_MULTIPLIER)
+
+
+def load_rules(using=None):
+    return CommissionRules(
+        tiers=list(CommissionTier.objects.using(using).order_by('-min_sales').values_list('min_sales', 'rate')),
+        shares=dict(CommissionShare.objects.using(using).values_list('salesman_id', 'percentage')),
+        shared_accounts=frozenset(SharedSalesAccount.objects.using(using).values_list('salesman_id', flat=True)),
+    )
+
+
+def months_in(period):
+    """First day of every calendar month overlapping ``period``."""
+    month = period.start.replace(day=1)
+    while month < period.end:
+        yield month
+        month += relativedelta(months=1)
+
+
+def monthly_commissions(period, salesman_ids=None, rules=None, using=None):
+    """
+    Compute the commissions of every month in ``period`` with one grouped aggregate.
+
+    Args:
+        period: whole months to compute, as a ``period_utils.Period``
+        salesman_ids: salesmen to compute; the eligible ones (with a share) by default
+        rules: ``CommissionRules`` already loaded, to save their queries
+        using: database alias; the router's choice by default, so ``use_replica`` applies
+
+    Returns:
+        dict: first day of each month to a dict of salesman id to ``Commission``
+    """
+    rules = rules or load_rules(using)
+    salesman_ids = list(rules.shares if salesman_ids is None else salesman_ids)
+    totals = (
+        Invoice.objects.using(using)
+        .filter(salesman_id__in={*salesman_ids, *rules.shared_accounts}, **period.lookups('delivery_date'))
+        .annotate(month=TruncMonth('delivery_date'))
+        .values_list('month', 'salesman_id')
+        .annotate(total=Sum('total_price'))
+        .order_by()
+    )
+    sales = {(month, salesman_id): total for month, salesman_id, total in totals}
+
+    results = {}
+    for month in months_in(period):
+        pooled_sales = sum((sales.get((month, account), Decimal('0')) for account in rules.shared_accounts),
+                           Decimal('0'))
+        results[month] = {
+            salesman_id: rules.commission(salesman_id, sales.get((month, salesman_id), Decimal('0')), pooled_sales)
+            for salesman_id in salesman_ids
+        }
+    return results
+
+
+def month_commission(salesman_id, year, month, rules=None, using=None):
+    """``Commission`` of one salesman for one calendar month."""
+    start = date(int(year), int(month), 1)
+    results = monthly_commissions(Period(start, start + relativedelta(months=1)), [salesman_id], rules, using)
+    return results[start][salesman_id]
+
+
+def install_default_rules(using=DEFAULT_DB_ALIAS):
+    """Fill each empty rule table from the defaults, for the salesmen that exist."""
+    if not CommissionTier.objects.using(using).exists():
+        CommissionTier.objects.using(using).bulk_create(
+            CommissionTier(min_sales=minimum, rate=rate) for minimum, rate in DEFAULT_TIERS
+        )
+    salesmen = dict(Salesman.objects.using(using).filter(
+        name__in=[*DEFAULT_SHARES, *DEFAULT_SHARED_ACCOUNTS]).values_list('name', 'id'))
+    if not CommissionShare.objects.using(using).exists():
+        CommissionShare.objects.using(using).bulk_create(
+            CommissionShare(salesman_id=salesmen[name], percentage=percentage)
+            for name, percentage in DEFAULT_SHARES.items() if name in salesmen
+        )
+    if not SharedSalesAccount.objects.using(using).exists():
+        SharedSalesAccount.objects.using(using).bulk_create(
+            SharedSalesAccount(salesman_id=salesmen[name]) for name in DEFAULT_SHARED_ACCOUNTS if name in salesmen
+        )
+
+
+@receiver(post_migrate)
+def install_commission_rules(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Install the default rules after every migrate that leaves the rule tables in place, on new databases too."""
+    tables = {model._meta.db_table for model in (CommissionTier, CommissionShare, SharedSalesAccount)}
+    if sender.label == 'invoice' and router.allow_migrate(using, 'invoice') \
+            and tables <= set(connections[using].introspection.table_names()):
+        install_default_rules(using)
@@ -0,0 +1,216 @@
+"""
+Utility functions for the live home dashboard.
+
+The dashboard is split into tiles: today's deliveries, the payments pending
+deposit and the sales charts. Each tile has a version in the cache that is
+bumped when a committed invoice change touches it, so the event stream of
+``dashboard_events`` re-renders and pushes only the tiles that changed. A
+rendered tile is cached under its version, and every open dashboard shares
+that one render. Streams served by other workers see the bumps through the
+shared cache that the ``invoice.E001`` check requires for several workers.
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.timezone import localdate
+
+from .deposit_utils import pending_deposit_summary
+from .metrics_utils import record_cache_access
+from .models import Invoice
+from .report_utils import LOT_NUMBER
+
+DASHBOARD_TILES = ('today', 'deposits', 'charts')
+# Invoice fields deciding which tiles show an invoice, and what the charts add up
+DASHBOARD_FIELDS = ('delivery_date', 'payment_date', 'deposit_date', 'total_price', 'salesman_id')
+# Tiles rendered as HTML fragments; a change to the charts only tells the page to fetch their data again
+TILE_TEMPLATES = {
+    'today': 'invoice/dashboard/today.html',
+    'deposits': 'invoice/dashboard/deposits.html',
+}
+TILE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Seconds between two looks at the tile versions, and before a quiet stream sends a keepalive comment
+DASHBOARD_POLL_INTERVAL = 2
+DASHBOARD_KEEPALIVE_INTERVAL = 15
+# Streams end after this long and the browser reconnects, so no worker holds a connection forever
+DASHBOARD_STREAM_SECONDS = 5 * 60
+DASHBOARD_RETRY_MILLISECONDS = 3000
+
+
+def today_tile_context(today):
+    """Invoices delivered on ``today`` with their items grouped by product name."""
+    invoices_today = Invoice.objects.filter(delivery_date=today).select_related(
+        'customer', 'salesman', 'deliveryman',
+    ).prefetch_related('invoiceitem_set__product')
+
+    modified_invoices = []
+    for invoice in invoices_today:
+        grouped_items = defaultdict(list)
+        for item in invoice.invoiceitem_set.all():
+            if item.product:
+                grouped_items[LOT_NUMBER.sub("", item.product.name)].append(str(item.quantity))
+
+        modified_invoices.append({
+            'delivery_date': invoice.delivery_date,
+            'number': invoice.number,
+            'customer': invoice.customer,
+            'deliveryman': invoice.deliveryman,
+            'salesman': invoice.salesman,
+            'total_price': invoice.total_price,
+            'items': [f"{name} ({' + '.join(quantities)})" for name, quantities in grouped_items.items()]
+        })
+    return {'invoices_today': modified_invoices}
+
+
+TILE_CONTEXTS = {'today': today_tile_context, 'deposits': pending_deposit_summary}
+
+
+def tile_version_key(tile):
+    return f"invoice:dashboard:tile:{tile}"
+
+
+def tile_versions():
+    """Current version of every tile, started from the clock so that a lost key never brings back an old one."""
+    keys = {tile_version_key(tile): tile for tile in DASHBOARD_TILES}
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        for key in keys.keys() - versions.keys():
+            cache.add(key, time.time_ns(), None)
+        versions = cache.get_many(keys)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_tiles(tiles):
+    """Tell open dashboards that ``tiles`` changed."""
+    for tile in tiles:
+        try:
+            cache.incr(tile_version_key(tile))
+        except ValueError:  # Not set yet, or evicted
+            cache.set(tile_version_key(tile), time.time_ns(), None)
+
+
+def render_tile(tile, version, today):
+    """Event data of a tile at a version: its HTML for fragments, nothing for the charts."""
+    if tile not in TILE_TEMPLATES:
+        return {}
+    key = f"invoice:dashboard:html:{tile}:{version}:{today.isoformat()}"
+    data = cache.get(key)
+    record_cache_access('dashboard_tile', hit=data is not None)
+    if data is None:
+        data = {'html': render_to_string(TILE_TEMPLATES[tile], TILE_CONTEXTS[tile](today))}
+        cache.set(key, data, TILE_CACHE_TIMEOUT)
+    return data
+
+
+def format_state(today, versions):
+    """Event id standing for what a page shows: the date and each tile's version."""
+    return '.'.join([today.isoformat()] + [str(versions.get(tile, 0)) for tile in DASHBOARD_TILES])
+
+
+def parse_state(state):
+    """Date and tile versions of an event id, or None when the id is missing or malformed."""
+    parts = (state or '').split('.')
+    if len(parts) != len(DASHBOARD_TILES) + 1:
+        return None
+    try:
+        return date.fromisoformat(parts[0]), dict(zip(DASHBOARD_TILES, map(int, parts[1:])))
+    except ValueError:
+        return None
+
+
+def server_sent_event(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def dashboard_stream(since, with_charts=True, duration=DASHBOARD_STREAM_SECONDS):
+    """
+    Server-sent events pushing the tiles that changed after the state ``since``.
+
+    Args:
+        since: id of the last event the page has seen, or the state it was rendered with
+        with_charts: whether the viewer sees the sales charts
+        duration: seconds to keep watching for changes; 0 sends the pending changes and ends
+    """
+    tiles = [tile for tile in DASHBOARD_TILES if with_charts or tile != 'charts']
+    shown_date, shown = parse_state(since) or (None, {})
+    deadline = time.monotonic() + duration
+    quiet_since = time.monotonic()
+
+    yield f"retry: {DASHBOARD_RETRY_MILLISECONDS}\n\n"
+    while True:
+        today = localdate()
+        if shown_date != today:
+            # The date moving on changes "today" and which payments are post-dated
+            shown_date, shown = today, {}
+        versions = await sync_to_async(tile_versions)()
+        for tile in tiles:
+            if shown.get(tile) != versions[tile]:
+                data = await sync_to_async(render_tile)(tile, versions[tile], today)
+                shown[tile] = versions[tile]
+                yield server_sent_event(tile, data, format_state(today, shown))
+                quiet_since = time.monotonic()
+
+        if time.monotonic() >= deadline:
+            return
+        if time.monotonic() - quiet_since >= DASHBOARD_KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            quiet_since = time.monotonic()
+        await asyncio.sleep(DASHBOARD_POLL_INTERVAL)
+
+
+def _dashboard_state(invoice):
+    return tuple(getattr(invoice, field) for field in DASHBOARD_FIELDS)
+
+
+def changed_tiles(previous, current, today):
+    """
+    Tiles to refresh for an invoice going from the state ``previous`` to ``current``.
+
+    States are ``DASHBOARD_FIELDS`` tuples, None before a creation and after a
+    deletion. Any change to an invoice listed in a tile's table refreshes the
+    tile; the charts only sum delivered totals per month and salesman.
+    """
+    tiles = set()
+    for state in filter(None, (previous, current)):
+        delivery_date, payment_date, deposit_date, total_price, salesman_id = state
+        if delivery_date == today:
+            tiles.add('today')
+        if payment_date is not None and deposit_date is None:
+            tiles.add('deposits')
+
+    def charted(state):
+        return (state[0], state[3], state[4]) if state and state[0] is not None else None
+
+    if charted(previous) != charted(current):
+        tiles.add('charts')
+    return tiles
+
+
+def publish_dashboard_changes(previous, current, using=DEFAULT_DB_ALIAS):
+    tiles = changed_tiles(previous, current, localdate())
+    if tiles:
+        # Streams render a tile as soon as its version moves, so only move it once the change is visible
+        transaction.on_commit(lambda: bump_tiles(tiles), using=using)
+
+
+@receiver(post_save, sender=Invoice)
+def publish_saved_invoice(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    # The row the save replaced, loaded by models.remember_previous_invoice
+    previous = getattr(instance, '_previous_invoice', None)
+    previous_state = tuple(previous[field] for field in DASHBOARD_FIELDS) if previous else None
+    publish_dashboard_changes(previous_state, _dashboard_state(instance), using)
+
+
+@receiver(post_delete, sender=Invoice)
+def publish_deleted_invoice(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    publish_dashboard_changes(_dashboard_state(instance), None, using)
@@ -0,0 +1,93 @@
+"""
+Database router sending report reads to the ``replica`` database.
+
+Views opt in with the ``use_replica`` decorator; everything else, and every
+write, stays on ``default``. With SQLite the replica is a snapshot file
+refreshed by the ``refresh_replica`` command; reads fall back to ``default``
+while no snapshot exists or the snapshot is older than ``REPLICA_MAX_AGE``.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_snapshot_path():
+    """Path of the SQLite replica snapshot, or None when the replica is not a SQLite file."""
+    if REPLICA_ALIAS not in connections.settings:
+        return None
+    replica = connections[REPLICA_ALIAS]
+    if replica.vendor != 'sqlite' or replica.is_in_memory_db():
+        return None
+    return replica.settings_dict.get('SNAPSHOT_PATH')
+
+
+def replica_available():
+    """Whether the replica is configured and, for a SQLite snapshot, present and fresh."""
+    if REPLICA_ALIAS not in connections.settings:
+        return False
+    replica = connections[REPLICA_ALIAS]
+    if replica.vendor != 'sqlite':
+        return True
+    path = replica_snapshot_path()
+    if path is None or not os.path.exists(path):
+        return False
+    return time.time() - os.path.getmtime(path) <= settings.REPLICA_MAX_AGE
+
+
+def reading_replica():
+    """Whether the reads made here are routed to the replica."""
+    return _read_alias.get() == REPLICA_ALIAS
+
+
+@contextmanager
+def reading_from_replica():
+    """Route the reads made inside the block to the replica when it is available."""
+    token = _read_alias.set(REPLICA_ALIAS if replica_available() else None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def reading_from_primary():
+    """Route the reads made inside the block to ``default``, for results that must not lag behind writes."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go to the replica inside ``reading_from_replica``; writes and migrations never do."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == REPLICA_ALIAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary
+        return db != REPLICA_ALIAS
@@ -1,10 +1,46 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 
+from .db_routers import reading_from_replica
+
+def is_lafarge_or_superuser(user):
+    return user.is_superuser or user.username == 'lafarge'
+
 def user_is_lafarge_or_superuser(function):
     def wrap(request, *args, **kwargs):
-        if request.user.is_superuser or request.user.username == 'lafarge':
+        if is_lafarge_or_superuser(request.user):
+            return function(request, *args, **kwargs)
+        else:
+            raise PermissionDenied
+    return wrap
+
+def user_is_superuser(function):
+    def wrap(request, *args, **kwargs):
+        if request.user.is_superuser:
             return function(request, *args, **kwargs)
         else:
             raise PermissionDenied
-    return wrap
\ No newline at end of file
+    return wrap
+
+def staff_member_required_async(function):
+    # staff_member_required for async views: the lazy user is loaded in a thread before the view is awaited
+    async def wrap(request, *args, **kwargs):
+        if await sync_to_async(lambda: request.user.is_active and request.user.is_staff)():
+            return await function(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path(), 'admin:login')
+    return wrap
+
+def use_replica(function):
+    if iscoroutinefunction(function):
+        async def async_wrap(request, *args, **kwargs):
+            # The router reads a context variable, which sync_to_async carries into the ORM's thread
+            with reading_from_replica():
+                return await function(request, *args, **kwargs)
+        return async_wrap
+
+    def wrap(request, *args, **kwargs):
+        with reading_from_replica():
+            return function(request, *args, **kwargs)
+    return wrap
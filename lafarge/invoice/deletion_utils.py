@@ -0,0 +1,100 @@
+"""
+Utility functions for deleting invoices in bulk.
+
+Deleting an invoice puts its items back in stock and logs a restock
+transaction for each delivered item. ``delete_invoices`` does this for any
+number of invoices in one transaction: one stock update per product, one
+insert for all the restock transactions, one insert per model for the sync
+log, one update of the closed months' report snapshots, and no total
+recalculation for the invoices on their way out.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Floor
+
+from .models import InvoiceItem, Product, ProductTransaction, invoices_being_deleted
+from .report_utils import mark_stale
+from .search_utils import remove_objects
+from .sync_utils import record_changes
+
+
+def restock_products(quantities, using):
+    """
+    Add ``quantities`` (product id to amount) to the stock, with one UPDATE per product.
+
+    The box counts are recomputed in the same statement, as ``Product.save`` would.
+    """
+    for product_id, amount in quantities.items():
+        quantity = F('quantity') + amount
+        boxes = Floor(quantity / F('unit_per_box'))
+        Product.objects.using(using).filter(pk=product_id).update(
+            quantity=quantity,
+            box_amount=Case(When(unit_per_box__gt=0, then=Cast(boxes, IntegerField())), default=Value(0)),
+            box_remain=Cast(
+                Case(When(unit_per_box__gt=0, then=quantity - boxes * F('unit_per_box')), default=quantity),
+                IntegerField(),
+            ),
+        )
+
+
+def delete_invoices(queryset):
+    """
+    Delete the invoices in ``queryset`` and restock their items.
+
+    Returns:
+        int: number of invoices deleted
+    """
+    using = queryset.db
+    with transaction.atomic(using=using):
+        invoices = list(queryset.values_list('pk', 'delivery_date', 'payment_date'))
+        if not invoices:
+            return 0
+        invoice_ids = [pk for pk, _, _ in invoices]
+        items = list(
+            InvoiceItem.objects.using(using)
+            .filter(invoice_id__in=invoice_ids)
+            .order_by('invoice_id', 'id')
+            .values('id', 'product_id', 'quantity', 'invoice__number', 'invoice__delivery_date', 'invoice__customer__name')
+        )
+
+        restocked = defaultdict(int)
+        for item in items:
+            restocked[item['product_id']] += item['quantity']
+        # Lock the products so the logged running quantities match the updates
+        stock = dict(
+            Product.objects.using(using).select_for_update()
+            .filter(pk__in=restocked).values_list('pk', 'quantity')
+        )
+
+        transactions = []
+        for item in items:
+            stock[item['product_id']] += item['quantity']
+            # Undelivered invoices never logged a sale, so their restock is not logged either
+            if item['invoice__delivery_date']:
+                transactions.append(ProductTransaction(
+                    product_id=item['product_id'],
+                    transaction_type='restock',
+                    change=item['quantity'],
+                    quantity_after_transaction=stock[item['product_id']],
+                    description=f"Restock due to deletion of invoice #{item['invoice__number']} "
+                                f"from {item['invoice__customer__name']}",
+                ))
+
+        restock_products(restocked, using)
+        ProductTransaction.objects.using(using).bulk_create(transactions)
+
+        token = invoices_being_deleted.set(frozenset(invoice_ids))
+        try:
+            queryset.model.objects.using(using).filter(pk__in=invoice_ids).delete()
+        finally:
+            invoices_being_deleted.reset(token)
+        remove_objects(queryset.model, invoice_ids, using)
+        mark_stale({(day.year, day.month) for _, day, _ in invoices if day},
+                   {(day.year, day.month) for _, _, day in invoices if day}, using)
+        record_changes(Product, list(restocked), using=using)
+        record_changes(InvoiceItem, [item['id'] for item in items], deleted=True, using=using)
+        record_changes(queryset.model, invoice_ids, deleted=True, using=using)
+    return len(invoice_ids)
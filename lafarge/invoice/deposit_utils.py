@@ -0,0 +1,244 @@
+"""
+Utility functions for payments waiting to be deposited at the bank.
+
+``pending_deposit_summary`` builds the dashboard's deposit panel from one
+conditional aggregation, giving totals, invoice counts and distinct cheque
+counts per payment method for payments due now and post-dated ones, plus the
+list of pending invoices with their customers. ``build_deposit_slips``
+groups the payments due now into the slips taken to the bank.
+
+Payments taken to the bank together are recorded as a ``DepositBatch`` with
+the expected total of each payment method. Once the amounts credited by the
+bank are entered, ``reconcile_deposit_batch`` checks them against the
+invoices and gives every invoice of the batch its deposit date in one UPDATE.
+"""
+
+from datetime import date
+from decimal import Decimal
+from itertools import groupby
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .cache_utils import bump_data_version_on_commit
+from .models import DepositBatch, DepositBatchTotal, Invoice
+from .report_utils import mark_stale
+from .sync_utils import record_changes
+
+# Pending deposits are tracked from the day deposits started being recorded
+DEPOSITS_START_DATE = date(2025, 3, 19)
+
+# Methods paid by cheque, deposited one cheque per slip line however many invoices it settles
+CHEQUE_METHODS = ('cheque', 'credit(cq)')
+# Lines printed on one bank deposit slip
+DEPOSIT_SLIP_LINES = 15
+
+
+def payment_method_label(method):
+    return dict(Invoice.PAYMENT_TYPE_CHOICES).get(method, "Unspecified")
+
+
+class DepositLine(NamedTuple):
+    reference: str  # cheque detail for cheques, invoice number otherwise
+    invoices: list
+    amount: Decimal
+
+
+class DepositSlip(NamedTuple):
+    payment_method: str
+    lines: list
+    total: Decimal
+
+    @property
+    def label(self):
+        return payment_method_label(self.payment_method)
+
+
+class DepositMismatch(NamedTuple):
+    payment_method: str
+    expected: Decimal
+    actual: Decimal  # None when the bank's amount has not been entered
+
+    @property
+    def label(self):
+        return payment_method_label(self.payment_method)
+
+
+def pending_deposits():
+    """Invoices paid but not deposited yet."""
+    return Invoice.objects.filter(payment_date__isnull=False, deposit_date__isnull=True,
+                                  payment_date__gte=DEPOSITS_START_DATE)
+
+
+def pending_deposit_summary(today):
+    """
+    Deposit panel of the home dashboard, in two queries.
+
+    Payments dated after ``today`` are post-dated and reported apart. Counts
+    are distinct cheques for cheque payments and invoices otherwise.
+
+    Returns:
+        dict: ``pending_deposits`` (list), ``total_pending_deposit``, and per
+        payment method ``payment_totals_dict``, ``payment_counts_dict`` and
+        their ``future_`` post-dated counterparts
+    """
+    due, post_dated = Q(payment_date__lte=today), Q(payment_date__gt=today)
+    rows = pending_deposits().values('payment_method').annotate(
+        due_total=Sum('total_price', filter=due),
+        due_invoices=Count('id', filter=due),
+        due_cheques=Count('cheque_detail', filter=due, distinct=True),
+        post_dated_total=Sum('total_price', filter=post_dated),
+        post_dated_invoices=Count('id', filter=post_dated),
+        post_dated_cheques=Count('cheque_detail', filter=post_dated, distinct=True),
+    ).order_by()
+
+    payment_totals_dict, payment_counts_dict = {}, {}
+    future_payment_totals_dict, future_payment_counts_dict = {}, {}
+    for row in rows:
+        method = row['payment_method']
+        for prefix, totals, counts in (('due', payment_totals_dict, payment_counts_dict),
+                                       ('post_dated', future_payment_totals_dict, future_payment_counts_dict)):
+            if row[f'{prefix}_invoices']:
+                totals[method] = row[f'{prefix}_total']
+            counts[method] = row[f'{prefix}_cheques'] if method == 'cheque' else row[f'{prefix}_invoices']
+
+    return {
+        'pending_deposits': list(pending_deposits().select_related('customer')),
+        'total_pending_deposit': sum(payment_totals_dict.values()) or 0,
+        'payment_totals_dict': payment_totals_dict,
+        'future_payment_totals_dict': future_payment_totals_dict,
+        'payment_counts_dict': payment_counts_dict,
+        'future_payment_counts_dict': future_payment_counts_dict,
+    }
+
+
+def deposit_lines(invoices):
+    """Slip lines of one payment method's invoices: one per cheque for cheques, one per invoice otherwise."""
+    lines = []
+    for invoice in invoices:
+        cheque = invoice.cheque_detail if invoice.payment_method in CHEQUE_METHODS else None
+        if cheque and lines and lines[-1].reference == cheque:
+            lines[-1].invoices.append(invoice)
+            lines[-1] = lines[-1]._replace(amount=lines[-1].amount + invoice.total_price)
+        else:
+            lines.append(DepositLine(cheque or invoice.number, [invoice], invoice.total_price))
+    return lines
+
+
+def build_deposit_slips(invoices, lines_per_slip=DEPOSIT_SLIP_LINES):
+    """
+    Group paid invoices into bank deposit slips.
+
+    Each payment method gets its own slips, split when they would run over
+    ``lines_per_slip`` lines.
+
+    Args:
+        invoices: invoices ordered by payment method, then cheque detail
+
+    Returns:
+        list: DepositSlip
+    """
+    slips = []
+    for method, method_invoices in groupby(invoices, key=lambda invoice: invoice.payment_method):
+        lines = deposit_lines(method_invoices)
+        for start in range(0, len(lines), lines_per_slip):
+            slip_lines = lines[start:start + lines_per_slip]
+            slips.append(DepositSlip(method, slip_lines, sum((line.amount for line in slip_lines), Decimal('0.00'))))
+    return slips
+
+
+def due_deposit_slips(today):
+    """Deposit slips for the payments pending deposit that are due by ``today``."""
+    invoices = pending_deposits().filter(payment_date__lte=today).select_related('customer').order_by(
+        'payment_method', 'cheque_detail', 'payment_date', 'number')
+    return build_deposit_slips(invoices)
+
+
+def method_totals(invoices):
+    """Total of ``invoices`` per payment method, from one grouped aggregate."""
+    return dict(invoices.values_list('payment_method').annotate(total=Sum('total_price')).order_by())
+
+
+def create_deposit_batch(invoices, day):
+    """
+    Batch the payments among ``invoices`` that are pending deposit, due by
+    ``day`` and not in a batch yet, to be deposited on ``day``. Post-dated
+    cheques wait for a batch on or after their date.
+
+    The invoices are assigned with one UPDATE and the expected total of each
+    payment method is recorded from one aggregate.
+
+    Returns:
+        DepositBatch, or None when none of the invoices can be batched
+    """
+    using = invoices.db
+    with transaction.atomic(using=using):
+        pks = list(
+            pending_deposits().using(using).select_for_update()
+            .filter(pk__in=list(invoices.values_list('pk', flat=True)), deposit_batch__isnull=True,
+                    payment_date__lte=day)
+            .values_list('pk', flat=True)
+        )
+        if not pks:
+            return None
+        batched = Invoice.objects.using(using).filter(pk__in=pks)
+        batch = DepositBatch.objects.using(using).create(date=day)
+        DepositBatchTotal.objects.using(using).bulk_create([
+            DepositBatchTotal(batch=batch, payment_method=method, expected=total)
+            for method, total in method_totals(batched).items()
+        ])
+        batched.update(deposit_batch=batch)
+        record_changes(Invoice, pks, using=using)
+    return batch
+
+
+def reconcile_deposit_batch(batch):
+    """
+    Check the actual totals of a batch and, when every payment method
+    matches, set the deposit date of all its invoices with one UPDATE.
+
+    The expected totals are recomputed from the invoices first, so a payment
+    edited after it was batched is caught. The UPDATE bypasses the invoice
+    signals, so the report snapshots, dashboard and sync log they keep
+    current are updated here.
+
+    Returns:
+        list: DepositMismatch per payment method that does not match; empty once the batch is reconciled
+    """
+    using = batch._state.db
+    with transaction.atomic(using=using):
+        expected = method_totals(batch.invoices.all())
+        recorded = {total.payment_method: total for total in batch.totals.all()}
+        for method, amount in expected.items():
+            total = recorded.get(method)
+            if total is None:
+                recorded[method] = DepositBatchTotal.objects.using(using).create(
+                    batch=batch, payment_method=method, expected=amount)
+            elif total.expected != amount:
+                total.expected = amount
+                total.save(update_fields=['expected'])
+
+        mismatches = [
+            DepositMismatch(method, expected.get(method, Decimal('0.00')), total.actual)
+            for method, total in sorted(recorded.items(), key=lambda item: item[0] or '')
+            if total.actual is None or total.actual != expected.get(method, 0)
+        ]
+        if mismatches:
+            return mismatches
+
+        invoices = list(batch.invoices.values_list('pk', 'payment_date'))
+        batch.invoices.update(deposit_date=batch.date)
+        batch.reconciled_at = timezone.now()
+        batch.save(update_fields=['reconciled_at'])
+
+        pks = [pk for pk, _ in invoices]
+        bump_data_version_on_commit()
+        mark_stale(payment_months={(paid.year, paid.month) for _, paid in invoices}, using=using)
+        record_changes(Invoice, pks, using=using)
+        if pks:
+            # Imported here as the dashboard builds its deposit panel from this module
+            from .dashboard_utils import bump_tiles
+            transaction.on_commit(lambda: bump_tiles({'deposits'}), using=using)
+    return []
@@ -1,5 +1,7 @@
 from django import forms
-from .models import SpecialPrice, Product, extract_base_name
+from django.contrib.admin.widgets import AutocompleteSelect
+
+from .models import SpecialPrice, Product, extract_base_name, extract_lot_number
 
 
 class SpecialPriceInlineForm(forms.ModelForm):
@@ -15,4 +17,67 @@ class SpecialPriceInlineForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         product_names = Product.objects.values_list('name', flat=True)
         base_names = sorted(set(extract_base_name(name) for name in product_names))
-        self.fields['product_base_name'].choices = [(name, name) for name in base_names]
\ No newline at end of file
+        self.fields['product_base_name'].choices = [(name, name) for name in base_names]
+
+
+def product_choice_label(product):
+    """Label a product by base name, lot and stock, e.g. 'Amoxil 500mg · Lot L001 · 120.0 in stock'."""
+    parts = [extract_base_name(product.name)]
+    lot_number = extract_lot_number(product.name)
+    if lot_number:
+        parts.append(f"Lot {lot_number}")
+    parts.append(f"{product.quantity} in stock" if product.quantity > 0 else "out of stock")
+    return " · ".join(parts)
+
+
+class ProductChoiceCache:
+    """
+    Products selected on one change page, loaded with a single query.
+
+    Every inline row shares the cache, so rendering and validating the rows
+    costs one product query however many lines the invoice has.
+    """
+
+    def __init__(self, condition):
+        self.condition = condition
+        self.products = None
+
+    def get(self, pk):
+        if self.products is None:
+            self.products = {str(product.pk): product for product in Product.objects.filter(self.condition)}
+        return self.products.get(str(pk))
+
+
+class ProductAutocompleteSelect(AutocompleteSelect):
+    """Product autocomplete backed by the stock-aware ProductAdmin search endpoint."""
+    url_name = '%s:invoice_product_autocomplete'
+
+    def optgroups(self, name, value, attr=None):
+        field = self.choices.field
+        selected = [field.choice_cache.get(pk) for pk in value if str(pk) not in field.empty_values]
+        if None in selected:
+            return super().optgroups(name, value, attr)
+        groups = [(None, [], 0)]
+        if not self.is_required:
+            groups[0][1].append(self.create_option(name, "", "", False, 0))
+        for product in selected:
+            groups[0][1].append(self.create_option(
+                name, product.pk, field.label_from_instance(product), True, len(groups[0][1])
+            ))
+        return groups
+
+
+class ProductChoiceField(forms.ModelChoiceField):
+    """Product field resolving submitted and initial products from a ProductChoiceCache."""
+
+    def __init__(self, *args, choice_cache, **kwargs):
+        self.choice_cache = choice_cache
+        super().__init__(*args, **kwargs)
+
+    def label_from_instance(self, obj):
+        return product_choice_label(obj)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        return self.choice_cache.get(value) or super().to_python(value)
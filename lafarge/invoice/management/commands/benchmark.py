@@ -0,0 +1,304 @@
+"""
+Benchmark the important views and helpers against the current database.
+
+Reports p50/p95 latency and query counts per target as JSON so results from
+different branches can be compared. Generate data first with
+``generate_dataset``; the PDF targets need ``collectstatic`` to have run.
+
+The ``sqlite`` suite runs concurrent readers and writers against two copies of
+the database, one with SQLite defaults and one with the tuning profile, and
+reports throughput, latency and "database is locked" errors for each.
+
+The ``api`` suite serializes the first ``--limit`` invoices with their
+customers and items twice: through ``InvoiceSerializer`` and the other
+ModelSerializers, and through the values()-based ``serialize_invoices``.
+
+The ``load`` suite polls the async JSON views from ``--concurrency`` clients
+for ``--duration`` seconds, first through the WSGI handler from threads, then
+through the ASGI handler from tasks on one event loop, and reports
+throughput and latency for each mode. ``--no-cache`` measures the views
+themselves rather than the versioned cache in front of them.
+
+Usage:
+    python manage.py benchmark --iterations 20 --output bench.json
+    python manage.py benchmark --compare bench.json
+    python manage.py benchmark --suite sqlite --readers 4 --writers 2 --duration 10
+    python manage.py benchmark --suite api --limit 1000
+    python manage.py benchmark --suite load --concurrency 32 --duration 10 --no-cache
+"""
+
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Count, F, Sum
+from django.test import override_settings
+
+from invoice.benchmark_utils import (
+    benchmark_client, benchmark_request, benchmark_user, dataset_summary, load_test_asgi, load_test_wsgi,
+    representative_requests, summarize, time_callable,
+)
+from invoice.models import AdditionalItem, Customer, Invoice, InvoiceItem, Product, ProductTransaction
+from invoice.number_generation_utils import generate_next_number
+from invoice.period_utils import month_period
+from invoice.serializers import (
+    AdditionalItemSerializer, CustomerSerializer, InvoiceItemSerializer, InvoiceSerializer, serialize_invoices,
+)
+from invoice.sqlite_utils import backup_database, read_pragmas
+
+
+class Command(BaseCommand):
+    help = "Time the important views and APIs and report p50/p95 latency and query counts as JSON."
+
+    suites = ('views', 'sqlite', 'api', 'load')
+
+    # Read-only JSON views served by async views, polled by the load suite
+    load_targets = (
+        'sales_data', 'product_insights_data', 'monthly_analyze_api', 'api_salesman_monthly_preview',
+        'api_products', 'api_customers',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=self.suites, default='views')
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--only', help="Comma-separated target names to run.")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+        parser.add_argument('--compare', help="Print a comparison against a previous JSON result file.")
+        parser.add_argument('--readers', type=int, default=4, help="sqlite suite: concurrent reader threads.")
+        parser.add_argument('--writers', type=int, default=2, help="sqlite suite: concurrent writer threads.")
+        parser.add_argument('--duration', type=float, default=5, help="sqlite and load suites: seconds per run.")
+        parser.add_argument('--concurrency', type=int, default=16, help="load suite: concurrent clients.")
+        parser.add_argument('--no-cache', action='store_true', help="load suite: run without the view cache.")
+        parser.add_argument('--limit', type=int, default=500, help="api suite: invoices serialized per run.")
+
+    def handle(self, *args, **options):
+        only = set(options['only'].split(',')) if options['only'] else None
+        results = getattr(self, f"run_{options['suite']}")(options, only)
+        report = {
+            'suite': options['suite'],
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': dataset_summary(),
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + "\n")
+            self.stderr.write(f"Wrote {len(results)} results to {options['output']}")
+        elif not options['compare']:
+            self.stdout.write(output)
+
+        if options['compare']:
+            self.print_comparison(options['compare'], results)
+
+    def run_views(self, options, only):
+        targets = representative_requests()
+        if not targets:
+            raise CommandError("No delivered invoices found. Run generate_dataset first.")
+
+        client = benchmark_client()
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url in targets:
+                if only and name not in only:
+                    continue
+                self.stderr.write(f"{name}: {url}")
+                results[name] = benchmark_request(client, url, options['iterations'], options['warmup'])
+                results[name]['url'] = url
+
+        if not only or 'generate_next_number' in only:
+            durations, queries, _ = time_callable(generate_next_number, options['iterations'], options['warmup'])
+            results['generate_next_number'] = summarize(durations, queries)
+        return results
+
+    def run_sqlite(self, options, only):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError("The sqlite suite needs the default database to be a SQLite file.")
+        if not Product.objects.exists() or not Invoice.objects.exists():
+            raise CommandError("No data found. Run generate_dataset first.")
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in ('default', 'tuned'):
+                if only and profile not in only:
+                    continue
+                path = os.path.join(directory, f"{profile}.sqlite3")
+                backup_database(connection.settings_dict['NAME'], path)
+                if profile == 'default':
+                    # The copy inherits the journal mode of the live database
+                    with sqlite3.connect(path) as raw:
+                        raw.execute("PRAGMA journal_mode = DELETE")
+
+                alias = f"benchmark_{profile}"
+                connections.settings[alias] = {
+                    **connections.settings['default'], 'NAME': path, 'SQLITE_TUNING': profile == 'tuned',
+                }
+                try:
+                    self.stderr.write(f"{profile}: {options['readers']} readers, {options['writers']} writers, "
+                                      f"{options['duration']}s")
+                    results.update(self.run_concurrent_workload(alias, profile, options))
+                finally:
+                    del connections[alias]
+                    del connections.settings[alias]
+        return results
+
+    def run_api(self, options, only):
+        if not Invoice.objects.exists():
+            raise CommandError("No invoices found. Run generate_dataset first.")
+
+        limit = options['limit']
+
+        def model_serializers():
+            # What a client of the current API assembles: invoices, then their customers, items and extras
+            invoices = list(Invoice.objects.order_by('id')[:limit])
+            InvoiceSerializer(invoices, many=True).data
+            CustomerSerializer(Customer.objects.filter(invoice__in=invoices).distinct(), many=True).data
+            InvoiceItemSerializer(InvoiceItem.objects.filter(invoice__in=invoices), many=True).data
+            AdditionalItemSerializer(AdditionalItem.objects.filter(invoice__in=invoices), many=True).data
+
+        targets = {
+            'invoice_serializer': model_serializers,
+            'values_serializer': lambda: serialize_invoices(Invoice.objects.order_by('id')[:limit]),
+        }
+        results = {}
+        for name, target in targets.items():
+            if only and name not in only:
+                continue
+            self.stderr.write(f"{name}: {limit} invoices")
+            durations, queries, _ = time_callable(target, options['iterations'], options['warmup'])
+            results[name] = summarize(durations, queries)
+            results[name]['invoices'] = limit
+        return results
+
+    def run_load(self, options, only):
+        urls = {name: url for name, url in representative_requests()
+                if name in self.load_targets and (not only or name in only)}
+        if not urls:
+            raise CommandError("No delivered invoices found. Run generate_dataset first.")
+
+        user = benchmark_user()
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}} if options['no_cache'] \
+            else settings.CACHES
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=caches):
+            for mode, load_test in (('wsgi', load_test_wsgi), ('asgi', load_test_asgi)):
+                self.stderr.write(f"{mode}: {len(urls)} views, {options['concurrency']} clients, "
+                                  f"{options['duration']}s")
+                outcomes = load_test(user, list(urls.values()), options['concurrency'], options['duration'])
+                all_durations, all_statuses = [], []
+                for name, url in urls.items():
+                    durations, statuses = outcomes[url]
+                    all_durations += durations
+                    all_statuses += statuses
+                    results[f"{name}[{mode}]"] = self.load_summary(durations, statuses, options['duration'])
+                summary = results[f"all[{mode}]"] = self.load_summary(all_durations, all_statuses, options['duration'])
+                self.stderr.write(f"  {summary['per_second']}/s, p95 {summary.get('p95_ms')} ms, "
+                                  f"{summary['errors']} errors")
+        return results
+
+    @staticmethod
+    def load_summary(durations, statuses, duration):
+        summary = summarize(durations, [], statuses) if durations else {'iterations': 0}
+        summary['per_second'] = round(len(durations) / duration, 1)
+        summary['errors'] = sum(1 for status in statuses if status != 200)
+        return summary
+
+    def run_concurrent_workload(self, alias, profile, options):
+        """Run reader and writer threads against ``alias`` for the configured duration."""
+        latest = Invoice.objects.using(alias).exclude(delivery_date=None).latest('delivery_date').delivery_date
+        product_ids = list(Product.objects.using(alias).values_list('id', flat=True))
+        stop_at = time.perf_counter() + options['duration']
+        outcomes = {'reads': ([], []), 'writes': ([], [])}
+        lock = threading.Lock()
+
+        def read():
+            invoices = Invoice.objects.using(alias)
+            invoices.filter(**month_period(latest.year, latest.month).lookups('delivery_date')).aggregate(
+                total=Sum('total_price'), count=Count('id'))
+            list(invoices.select_related('customer').order_by('-id')[:50])
+
+        def write(rng):
+            # Read-then-write, the same shape as an admin stock adjustment
+            with transaction.atomic(using=alias):
+                product = Product.objects.using(alias).get(pk=rng.choice(product_ids))
+                Product.objects.using(alias).filter(pk=product.pk).update(quantity=F('quantity') + 1)
+                ProductTransaction.objects.using(alias).create(
+                    product=product, transaction_type='adjustment', change=1,
+                    quantity_after_transaction=product.quantity + 1, description="benchmark",
+                )
+
+        def worker(kind, operation):
+            durations, errors = outcomes[kind]
+            local_durations, local_errors = [], []
+            try:
+                while time.perf_counter() < stop_at:
+                    start = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError as error:
+                        local_errors.append(str(error))
+                    else:
+                        local_durations.append(time.perf_counter() - start)
+            finally:
+                connections[alias].close()
+            with lock:
+                durations.extend(local_durations)
+                errors.extend(local_errors)
+
+        threads = [threading.Thread(target=worker, args=('reads', read)) for _ in range(options['readers'])]
+        threads += [
+            threading.Thread(target=worker, args=('writes', lambda rng=random.Random(seed): write(rng)))
+            for seed in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        pragmas = read_pragmas(connections[alias])
+        connections[alias].close()
+
+        results = {}
+        for kind, (durations, errors) in outcomes.items():
+            summary = summarize(durations, []) if durations else {'iterations': 0}
+            summary['per_second'] = round(len(durations) / options['duration'], 1)
+            summary['errors'] = len(errors)
+            if errors:
+                summary['first_error'] = errors[0]
+            summary['pragmas'] = pragmas
+            results[f"{kind}[{profile}]"] = summary
+            self.stderr.write(f"  {kind}: {summary['per_second']}/s, {len(errors)} errors")
+        return results
+
+    def print_comparison(self, path, results):
+        with open(path) as handle:
+            baseline = json.load(handle)['results']
+        self.stdout.write(f"{'target':40} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} "
+                          f"{'p95 after':>10} {'queries':>13}")
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            self.stdout.write(
+                f"{name:40} {before['p50_ms']:>11.1f} {result['p50_ms']:>10.1f} {before['p95_ms']:>11.1f} "
+                f"{result['p95_ms']:>10.1f} {before['queries']:>6} -> {result['queries']:<4}"
+            )
@@ -0,0 +1,66 @@
+"""
+Close monthly reporting periods, reopen them, or rebuild their stale reports.
+
+Closing a month stores the rendered monthly, payment, analysis, salesman and
+deliveryman reports as snapshots, which the report pages then serve as they
+are. Invoice edits in a closed month mark its snapshots stale; run
+``--rebuild-stale`` from cron to rebuild them ahead of the next view:
+
+    python manage.py close_period 2024 3
+    python manage.py close_period --before 2025-01
+    python manage.py close_period 2024 3 --reopen
+    python manage.py close_period --rebuild-stale
+"""
+
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from invoice.models import Invoice
+from invoice.report_utils import close_period, rebuild_stale_snapshots, reopen_period
+
+
+class Command(BaseCommand):
+    help = "Snapshot the reports of closed months, or reopen months or rebuild their stale reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', nargs='?', type=int)
+        parser.add_argument('month', nargs='?', type=int)
+        parser.add_argument('--before', help="Close every month with invoices before this YYYY-MM.")
+        parser.add_argument('--reopen', action='store_true', help="Reopen the month instead of closing it.")
+        parser.add_argument('--rebuild-stale', action='store_true', help="Rebuild the stale snapshots.")
+
+    def handle(self, *args, **options):
+        if options['rebuild_stale']:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuild_stale_snapshots()} stale snapshots."))
+            return
+
+        months = self.months(options)
+        for year, month in months:
+            if options['reopen']:
+                reopen_period(year, month)
+                self.stdout.write(f"Reopened {year}-{month:02d}.")
+            else:
+                count = close_period(year, month)
+                self.stdout.write(f"Closed {year}-{month:02d} with {count} report snapshots.")
+        self.stdout.write(self.style.SUCCESS(f"Done with {len(months)} months."))
+
+    def months(self, options):
+        if options['before']:
+            try:
+                end = date(*map(int, options['before'].split('-')), 1)
+            except (TypeError, ValueError):
+                raise CommandError("--before takes a month as YYYY-MM.")
+            first = Invoice.objects.aggregate(first=Min('delivery_date'))['first']
+            months, month = [], first.replace(day=1) if first else end
+            while month < end:
+                months.append((month.year, month.month))
+                month += relativedelta(months=1)
+            return months
+        if options['year'] is None or options['month'] is None:
+            raise CommandError("Give a year and month, --before or --rebuild-stale.")
+        if not 1 <= options['month'] <= 12:
+            raise CommandError("The month must be between 1 and 12.")
+        return [(options['year'], options['month'])]
@@ -0,0 +1,268 @@
+"""
+Generate a realistic synthetic dataset for benchmarking.
+
+Creates salesmen (including the commission share accounts), deliverymen,
+customers, products with lot numbers, special prices and several years of
+invoices with items, payments, deposits and sale transactions.
+
+Usage:
+    python manage.py generate_dataset --months 24 --invoices-per-month 300 --flush
+"""
+
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.timezone import make_aware
+
+from invoice.cache_utils import bump_data_version_on_commit
+from invoice.commission_utils import install_default_rules
+from invoice.models import (
+    AdditionalItem, ClosedPeriod, CommissionShare, CommissionTier, Customer, Deliveryman, DepositBatch, DepositBatchTotal,
+    Forbidden_Word, Invoice, InvoiceItem, PricingRule, Product, ProductTransaction, ReportSnapshot, Salesman,
+    SharedSalesAccount, SpecialPrice, SyncChange, extract_base_name,
+)
+from invoice.pricing_utils import get_pricing_rules, install_default_pricing_rules, price_line
+from invoice.report_utils import CLOSED_PERIODS_KEY
+from invoice.search_utils import rebuild_index
+from invoice.sync_utils import log_unlogged_objects
+
+SALESMEN = [
+    ('DS', 'Dominic So'),
+    ('AC', 'Alex Cheung'),
+    ('MM', 'Matthew Mak'),
+    ('DS/MM/AC', 'DS/MM/AC'),
+    ('KK', 'Kelvin Ko'),
+    ('Lafarge', 'Lafarge'),
+]
+
+PRODUCT_WORDS = [
+    'Amoxil', 'Augmentin', 'Brufen', 'Cetrizine', 'Daktarin', 'Eurax', 'Fucidin', 'Gaviscon', 'Hirudoid',
+    'Imodium', 'Klacid', 'Licarlo', 'Mucosolvan', 'Nexium', 'Omeprazole', 'Panadol', 'Ranitidine',
+    'Stilnox', 'Tramadol', 'Ventolin', 'Xyzal', 'Zyrtec',
+]
+FORMS = ['Tablet 500mg', 'Capsule 250mg', 'Syrup 100ml', 'Cream 15g', 'Drops 10ml', 'Injection 1ml']
+SURNAMES = ['Chan', 'Wong', 'Lee', 'Cheung', 'Lau', 'Ho', 'Ng', 'Leung', 'Tam', 'Yip', 'Kwok', 'Lam', 'Mak', 'So']
+GIVEN = ['Tai Man', 'Siu Ming', 'Ka Yan', 'Wing Sze', 'Chi Keung', 'Mei Ling', 'Hoi Yin', 'Kin Wai']
+CLINIC_SUFFIXES = ['Medical Centre', 'Clinic', 'Dispensary', 'Medical Practice', 'Pharmacy']
+DISTRICTS = ['Mong Kok', 'Tsim Sha Tsui', 'Causeway Bay', 'Sha Tin', 'Tuen Mun', 'Kwun Tong', 'Yuen Long']
+PAYMENT_METHODS = ['cheque', 'cheque', 'cheque', 'cash', 'fps', 'credit(cq)']
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset of configurable size for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=300)
+        parser.add_argument('--products', type=int, default=60, help="Number of base products.")
+        parser.add_argument('--max-lots', type=int, default=3, help="Maximum lot numbers per base product.")
+        parser.add_argument('--deliverymen', type=int, default=4)
+        parser.add_argument('--months', type=int, default=24, help="Months of invoice history, ending this month.")
+        parser.add_argument('--invoices-per-month', type=int, default=250)
+        parser.add_argument('--max-items', type=int, default=8, help="Maximum invoice lines per invoice.")
+        parser.add_argument('--special-price-ratio', type=float, default=0.2,
+                            help="Share of customer/product pairs with a special price.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true', help="Delete existing invoice data first.")
+
+    def handle(self, *args, **options):
+        if Invoice.objects.exists() and not options['flush']:
+            raise CommandError("Invoices already exist. Use --flush to replace the existing data.")
+
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            if options['flush']:
+                self.flush()
+            salesmen = self.create_salesmen()
+            deliverymen = self.create_deliverymen(options['deliverymen'])
+            customers = self.create_customers(options['customers'], salesmen)
+            products = self.create_products(options['products'], options['max_lots'])
+            special_prices = self.create_special_prices(customers, products, options['special_price_ratio'])
+            invoice_count, item_count = self.create_invoices(
+                customers, products, deliverymen, special_prices,
+                options['months'], options['invoices_per_month'], options['max_items'],
+            )
+            # Bulk inserts skip the save signals that maintain the search index, sync log and view cache
+            rebuild_index()
+            log_unlogged_objects()
+            bump_data_version_on_commit()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(customers)} customers, {len(products)} products, "
+            f"{invoice_count} invoices and {item_count} invoice items."
+        ))
+
+    def flush(self):
+        # Plain DELETEs skip the per-item signal handlers that recalculate invoice totals
+        with connection.cursor() as cursor:
+            for model in (ReportSnapshot, ClosedPeriod, SyncChange, ProductTransaction, AdditionalItem, InvoiceItem,
+                          Invoice, DepositBatchTotal, DepositBatch, SpecialPrice, PricingRule, Product, Customer, Deliveryman, CommissionTier,
+                          CommissionShare, SharedSalesAccount, Salesman):
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+        cache.delete(CLOSED_PERIODS_KEY)
+
+    def create_salesmen(self):
+        Forbidden_Word.objects.get_or_create(word='hospital')
+        salesmen = [Salesman.objects.get_or_create(code=code, defaults={'name': name})[0] for code, name in SALESMEN]
+        install_default_rules()
+        return salesmen
+
+    def create_deliverymen(self, count):
+        return Deliveryman.objects.bulk_create(
+            Deliveryman(code=f"D{index:02d}", name=f"Driver {index}") for index in range(1, count + 1)
+        )
+
+    def create_customers(self, count, salesmen):
+        rng = self.random
+        customers = []
+        for index in range(count):
+            surname = rng.choice(SURNAMES)
+            name = f"{surname} {rng.choice(GIVEN)} {index}"
+            care_of = f"{rng.choice(SURNAMES)} {rng.choice(CLINIC_SUFFIXES)}" if rng.random() < 0.6 else None
+            district = rng.choice(DISTRICTS)
+            customers.append(Customer(
+                name=name,
+                care_of=care_of,
+                address=f"Room {rng.randint(100, 2999)}, {rng.randint(1, 300)} Nathan Road\n{district}\nKowloon",
+                terms=rng.choice(['C.O.D.', '30 days', '60 days', None]),
+                office_hour="Mon-Fri 9:00-18:00\nSat 9:00-13:00",
+                telephone_number=f"2{index:07d}",
+                contact_person=f"Ms. {rng.choice(SURNAMES)}",
+                delivery_to=care_of or name,
+                delivery_address=f"Shop {rng.randint(1, 99)}, {district}",
+                salesman=rng.choice(salesmen),
+            ))
+        return Customer.objects.bulk_create(customers)
+
+    def create_products(self, base_count, max_lots):
+        rng = self.random
+        products = []
+        for index in range(base_count):
+            base_name = f"{PRODUCT_WORDS[index % len(PRODUCT_WORDS)]} {FORMS[index % len(FORMS)]}"
+            if index >= len(PRODUCT_WORDS):
+                base_name += f" #{index}"
+            price = Decimal(rng.randint(20, 900))
+            units_per_pack = rng.choice([1, 1, 1, 10, 100])
+            for lot in range(rng.randint(1, max_lots)):
+                products.append(Product(
+                    name=f"{base_name} (Lot no.: L{index:03d}{lot:02d})",
+                    supplier=rng.choice(['Pharma Co.', 'Medi Supplies Ltd', 'HK Drug House']),
+                    import_date=date.today() - timedelta(days=rng.randint(30, 900)),
+                    import_invoice_number=f"IMP-{index:03d}-{lot:02d}",
+                    registration_code=f"HK-{rng.randint(10000, 99999)}",
+                    expiry_date=date.today() + timedelta(days=rng.randint(90, 1200)),
+                    unit=rng.choice(['box', 'bottle', 'tube', 'pack']),
+                    price=price,
+                    units_per_pack=units_per_pack,
+                    quantity=Decimal(rng.randint(5000, 20000)),
+                    unit_per_box=rng.choice([1, 10, 12, 50]),
+                ))
+        for product in products:
+            product.box_amount, product.box_remain = divmod(int(product.quantity), product.unit_per_box)
+        install_default_pricing_rules()
+        return Product.objects.bulk_create(products)
+
+    def create_special_prices(self, customers, products, ratio):
+        rng = self.random
+        base_prices = {}
+        for product in products:
+            base_prices.setdefault(product.name.split('(')[0].strip(), product.price)
+        special_prices = []
+        for customer in customers:
+            for base_name, price in base_prices.items():
+                if rng.random() < ratio:
+                    discount = Decimal(rng.choice([0.8, 0.85, 0.9, 0.95])).quantize(Decimal('0.01'))
+                    special_prices.append(SpecialPrice(
+                        customer=customer, product_base_name=base_name,
+                        special_price=(price * discount).quantize(Decimal('0.01')),
+                    ))
+        SpecialPrice.objects.bulk_create(special_prices)
+        return {(sp.customer_id, sp.product_base_name): sp.special_price for sp in special_prices}
+
+    def create_invoices(self, customers, products, deliverymen, special_prices, months, per_month, max_items):
+        rng = self.random
+        today = date.today()
+        first_month = today.replace(day=1) - relativedelta(months=months - 1)
+        number = 30000
+
+        invoices = []
+        for offset in range(months):
+            month_start = first_month + relativedelta(months=offset)
+            days_in_month = ((month_start + relativedelta(months=1)) - month_start).days
+            for _ in range(per_month):
+                number += 1
+                customer = rng.choice(customers)
+                delivery_date = month_start + timedelta(days=rng.randrange(days_in_month))
+                if delivery_date > today:
+                    delivery_date = None
+                is_sample = rng.random() < 0.03
+                invoice = Invoice(
+                    number=f"S-{number}" if is_sample else (f"{number} DS" if rng.random() < 0.1 else str(number)),
+                    customer=customer,
+                    salesman_id=customer.salesman_id,
+                    terms=customer.terms,
+                    sample_customer=f"Dr. {rng.choice(SURNAMES)}" if is_sample else None,
+                    deliveryman=rng.choice(deliverymen) if deliverymen else None,
+                    delivery_date=delivery_date,
+                    order_number=f"PO{number}" if rng.random() < 0.2 else None,
+                )
+                self.assign_payment(invoice, today)
+                invoices.append(invoice)
+        Invoice.objects.bulk_create(invoices, batch_size=500)
+
+        items, transactions, additional_items = [], [], []
+        pricing_rules = get_pricing_rules()
+        for invoice in invoices:
+            total = Decimal('0.00')
+            for product in rng.sample(products, rng.randint(1, min(max_items, len(products)))):
+                product_type = 'sample' if invoice.number.startswith('S-') else (
+                    'bonus' if rng.random() < 0.1 else 'normal')
+                quantity = Decimal(rng.choice([1, 2, 3, 5, 10, 20, 50]))
+                item = InvoiceItem(invoice=invoice, product=product, quantity=quantity, product_type=product_type,
+                                   price=Decimal('0.00'), sum_price=Decimal('0.00'))
+                if product_type == 'normal':
+                    special_price = special_prices.get((invoice.customer_id, extract_base_name(product.name)))
+                    line = price_line(product, quantity, special_price=special_price, rules=pricing_rules)
+                    item.price, item.sum_price = line.price, line.sum_price
+                total += item.sum_price
+                items.append(item)
+                if invoice.delivery_date:
+                    transactions.append(ProductTransaction(
+                        product=product, transaction_type='sale', change=-int(quantity),
+                        quantity_after_transaction=int(product.quantity),
+                        description=f"{product_type.capitalize()} transaction in invoice #{invoice.number} "
+                                    f"from {invoice.customer.name}",
+                        timestamp=make_aware(datetime.combine(invoice.delivery_date, time())),
+                    ))
+            if rng.random() < 0.05:
+                delivery_fee = Decimal('50.00')
+                additional_items.append(AdditionalItem(invoice=invoice, description="Delivery fee",
+                                                       price=delivery_fee))
+                total += delivery_fee
+            invoice.total_price = total
+
+        InvoiceItem.objects.bulk_create(items, batch_size=1000)
+        AdditionalItem.objects.bulk_create(additional_items, batch_size=1000)
+        ProductTransaction.objects.bulk_create(transactions, batch_size=1000)
+        Invoice.objects.bulk_update(invoices, ['total_price'], batch_size=500)
+        return len(invoices), len(items)
+
+    def assign_payment(self, invoice, today):
+        """Pay most delivered invoices, grouping cheques per customer and deposit day."""
+        rng = self.random
+        if not invoice.delivery_date or invoice.number.startswith('S-'):
+            return
+        age = (today - invoice.delivery_date).days
+        if age < 45 and rng.random() < 0.6 or rng.random() < 0.03:
+            return
+        payment_date = invoice.delivery_date + timedelta(days=rng.randint(0, 60))
+        invoice.payment_date = payment_date
+        invoice.payment_method = rng.choice(PAYMENT_METHODS)
+        if invoice.payment_method in ('cheque', 'credit(cq)'):
+            invoice.cheque_detail = f"HSBC {invoice.customer_id:04d}{payment_date:%m%d}"
+        if payment_date <= today - timedelta(days=3):
+            invoice.deposit_date = payment_date + timedelta(days=rng.randint(1, 3))
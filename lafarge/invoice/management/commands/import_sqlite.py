@@ -0,0 +1,132 @@
+"""
+Copy the data from an existing SQLite database file into another database.
+
+This is the migration path from ``database.sqlite3`` to PostgreSQL: point the
+settings at the new database, create the schema with ``migrate``, then run
+
+    python manage.py import_sqlite database.sqlite3
+
+Users, groups and all invoice data are copied with their primary keys, and the
+target's sequences are reset afterwards. Permissions and content types are
+matched by natural key because ``migrate`` has already created them.
+"""
+
+import os
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from invoice.cache_utils import bump_data_version_on_commit
+from invoice.commission_utils import install_default_rules
+from invoice.models import CommissionShare, CommissionTier, Invoice, PricingRule, SharedSalesAccount
+from invoice.pricing_utils import install_default_pricing_rules
+from invoice.search_utils import rebuild_index
+from invoice.sync_utils import log_unlogged_objects
+
+SOURCE_ALIAS = 'import_source'
+IMPORTED_MODELS = ('auth.Group', 'auth.User', 'invoice')
+# Filled with the defaults by migrate; a file that has these tables brings its own rows instead
+DEFAULT_RULE_MODELS = (CommissionTier, CommissionShare, SharedSalesAccount, PricingRule)
+
+
+def imported_models():
+    """Models to copy, ordered so that foreign key targets come first."""
+    app_list = {}
+    for label in IMPORTED_MODELS:
+        if '.' in label:
+            model = apps.get_model(label)
+            app_list.setdefault(model._meta.app_config, []).append(model)
+        else:
+            app_list[apps.get_app_config(label)] = None
+    return serializers.sort_dependencies(app_list.items(), allow_cycles=True)
+
+
+class Command(BaseCommand):
+    help = "Copy users and invoice data from a SQLite database file into the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path of the SQLite database file to import.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database to import into.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path, target = os.path.abspath(options['path']), options['database']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        target_settings = connections[target].settings_dict
+        if connections[target].vendor == 'sqlite' and os.path.abspath(target_settings['NAME']) == path:
+            raise CommandError("The source file is the target database.")
+        if Invoice.objects.using(target).exists():
+            raise CommandError(f"The '{target}' database already has invoices. Import into an empty database.")
+
+        connections.settings[SOURCE_ALIAS] = {
+            **target_settings,
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': {},
+            # Read the file as it is, without switching it to WAL
+            'SQLITE_TUNING': False,
+        }
+        try:
+            models = imported_models()
+            with transaction.atomic(using=target):
+                source_tables = set(connections[SOURCE_ALIAS].introspection.table_names())
+                for model in models:
+                    # Files from older versions lack the tables added since, such as the sync log
+                    if model._meta.db_table not in source_tables:
+                        continue
+                    if model in DEFAULT_RULE_MODELS:
+                        model._default_manager.using(target).all().delete()
+                    count = self.copy_model(model, target, options['batch_size'])
+                    self.stdout.write(f"{model._meta.label}: {count}")
+                self.reset_sequences(models, target)
+                rebuild_index(target)
+                log_unlogged_objects(target)
+                bump_data_version_on_commit()
+                # Files from before the commission and pricing rules were stored get the rules they used
+                install_default_rules(target)
+                install_default_pricing_rules(target)
+        finally:
+            connections[SOURCE_ALIAS].close()
+            del connections[SOURCE_ALIAS]
+            del connections.settings[SOURCE_ALIAS]
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(models)} tables from {path}."))
+
+    def copy_model(self, model, target, batch_size):
+        """Copy every row of ``model``; rows with many-to-many data are saved one by one."""
+        queryset = model._default_manager.using(SOURCE_ALIAS).order_by('pk')
+        # Many-to-many fields with an explicit through model are copied as rows of that model
+        has_m2m = any(field.remote_field.through._meta.auto_created for field in model._meta.many_to_many)
+        count, batch = 0, []
+        for row in queryset.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                count += self.save_batch(model, batch, target, has_m2m)
+                batch = []
+        if batch:
+            count += self.save_batch(model, batch, target, has_m2m)
+        return count
+
+    def save_batch(self, model, rows, target, has_m2m):
+        # A serialize/deserialize round trip resolves permissions and content
+        # types by natural key, since their ids differ between databases
+        data = serializers.serialize('python', rows, use_natural_foreign_keys=True)
+        objects = list(serializers.deserialize('python', data, using=target))
+        if has_m2m:
+            for deserialized in objects:
+                deserialized.save(using=target)
+        else:
+            model._default_manager.using(target).bulk_create([deserialized.object for deserialized in objects])
+        return len(objects)
+
+    def reset_sequences(self, models, target):
+        connection = connections[target]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
@@ -0,0 +1,97 @@
+"""
+Suggest indexes to add or drop from the query plans of the real view workload.
+
+Requests every representative view, API and PDF (see
+``invoice.benchmark_utils.representative_requests``), captures the SELECT
+statements they issue and explains each one. The report lists full table
+scans, temporary sorts, indexes that no plan used and indexes made redundant
+by a wider index. Run it against production-sized data, e.g. after
+``generate_dataset``.
+
+Usage:
+    python manage.py index_advisor
+    python manage.py index_advisor --format json --output advice.json
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from invoice.benchmark_utils import benchmark_client, representative_requests
+from invoice.query_plan_utils import analyse_workload, capture_workload
+
+
+class Command(BaseCommand):
+    help = "Explain the queries behind every report view and API and suggest indexes to add or drop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help="Only suggest new indexes for tables with at least this many rows.")
+        parser.add_argument('--only', help="Comma-separated target names to run.")
+        parser.add_argument('--format', choices=('text', 'json'), default='text')
+        parser.add_argument('--output', help="Write the report to this file instead of stdout.")
+        parser.add_argument('--show-sql', action='store_true', help="Include the SQL of each flagged statement.")
+
+    def handle(self, *args, **options):
+        targets = representative_requests()
+        if not targets:
+            raise CommandError("No delivered invoices found. Run generate_dataset first.")
+        if options['only']:
+            only = set(options['only'].split(','))
+            targets = [(name, url) for name, url in targets if name in only]
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            statements = capture_workload(benchmark_client(), targets)
+        report = analyse_workload(statements, min_rows=options['min_rows'])
+        report['targets'] = [name for name, _ in targets]
+
+        if options['format'] == 'json':
+            output = json.dumps(report, indent=2, default=sorted)
+        else:
+            output = "\n".join(self.format_text(report, options['show_sql']))
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + "\n")
+            self.stderr.write(f"Wrote the index report to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def format_text(self, report, show_sql):
+        lines = [f"Explained {report['statements']} distinct statements from {len(report['targets'])} views.", ""]
+
+        lines.append(f"Full table scans ({len(report['full_scans'])}):")
+        for scan in report['full_scans']:
+            filtered = f"filter on {', '.join(scan['filter'])}" if scan['filter'] else "no filter"
+            lines.append(f"  {scan['table']} ({scan['rows']} rows, {filtered}) in {', '.join(scan['views'])}")
+            if show_sql:
+                lines.append(f"      {scan['sql']}")
+
+        lines += ["", f"Temporary sorts ({len(report['temp_sorts'])}):"]
+        for sort in report['temp_sorts']:
+            lines.append(f"  {sort['table'] or '-'}: {sort['sort']} in {', '.join(sort['views'])}")
+            if show_sql:
+                lines.append(f"      {sort['sql']}")
+
+        lines += ["", "Suggested indexes to add:"]
+        for suggestion in report['add']:
+            lines.append(f"  {suggestion['table']} ({', '.join(suggestion['columns'])}) "
+                         f"for {', '.join(suggestion['views'])}")
+        if not report['add']:
+            lines.append("  none")
+
+        lines += ["", "Suggested indexes to drop:"]
+        for entry in report['redundant']:
+            index, other = entry['index'], entry['covered_by']
+            kind = "unique constraint" if other['unique'] else "index"
+            lines.append(f"  {index['name']} on {index['table']} ({', '.join(index['columns'])}): "
+                         f"redundant with {kind} {other['name']} ({', '.join(other['columns'])})")
+        for index in report['unused']:
+            lines.append(f"  {index['name']} on {index['table']} ({', '.join(index['columns'])}): "
+                         f"not used by any plan")
+        if not report['redundant'] and not report['unused']:
+            lines.append("  none")
+        lines += ["", "Foreign key indexes flagged as unused still serve cascade deletes; "
+                      "check admin delete paths before dropping them."]
+        return lines
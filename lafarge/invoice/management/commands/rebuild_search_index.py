@@ -0,0 +1,29 @@
+"""
+Rebuild the full-text search index from the customer, product and invoice tables.
+
+Save signals keep the index in sync; run this after loading fixtures or other
+bulk writes that bypass them:
+
+    python manage.py rebuild_search_index
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from invoice.search_utils import create_search_table, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Re-create every entry of the full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database to rebuild the index in.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        create_search_table(connections[using])
+        with transaction.atomic(using=using):
+            counts = rebuild_index(using)
+        self.stdout.write(self.style.SUCCESS(
+            "Indexed " + ", ".join(f"{count} {kind} entries" for kind, count in counts.items()) + "."
+        ))
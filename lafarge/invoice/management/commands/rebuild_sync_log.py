@@ -0,0 +1,33 @@
+"""
+Bring the delta-sync change log up to date with the synced tables.
+
+Save and delete signals log every change; run this once after deploying the
+sync API, and after fixtures or other bulk writes that bypass the signals, so
+that a sync from position 0 returns every object. ``--compact`` also drops
+the changes superseded by a later change of the same object:
+
+    python manage.py rebuild_sync_log --compact
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from invoice.sync_utils import compact_changes, log_unlogged_objects
+
+
+class Command(BaseCommand):
+    help = "Log a change for every synced object missing from the sync log."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database to update the log in.")
+        parser.add_argument('--compact', action='store_true', help="Delete superseded changes too.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            counts = log_unlogged_objects(using)
+            compacted = compact_changes(using) if options['compact'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            "Logged " + ", ".join(f"{count} {name} changes" for name, count in counts.items())
+            + (f"; deleted {compacted} superseded changes." if options['compact'] else ".")
+        ))
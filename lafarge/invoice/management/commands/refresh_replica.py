@@ -0,0 +1,54 @@
+"""
+Refresh the SQLite replica snapshot that report views read from.
+
+Copies the default database with the online backup API into a temporary file
+and swaps it into place, so report queries never see a half-written copy and
+the primary keeps accepting writes during the copy. Run it from cron, or keep
+it running with ``--interval``:
+
+    python manage.py refresh_replica
+    python manage.py refresh_replica --interval 300
+"""
+
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from invoice.db_routers import REPLICA_ALIAS, replica_snapshot_path
+from invoice.sqlite_utils import backup_database
+
+
+class Command(BaseCommand):
+    help = "Copy the default SQLite database to the replica snapshot used by report views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, help="Keep running and refresh every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        path = replica_snapshot_path()
+        if path is None:
+            raise CommandError("No SQLite replica is configured; PostgreSQL replicas are kept in sync by the server.")
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or primary.is_in_memory_db():
+            raise CommandError("The default database must be a SQLite file to snapshot it.")
+
+        while True:
+            start = time.perf_counter()
+            self.refresh(primary.settings_dict['NAME'], str(path))
+            self.stdout.write(f"Replica refreshed in {time.perf_counter() - start:.2f}s: {path}")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def refresh(self, source, path):
+        temporary = f"{path}.tmp"
+        backup_database(source, temporary)
+        # Readers open the snapshot read-only, which needs a rollback journal rather than WAL
+        with sqlite3.connect(temporary) as snapshot:
+            snapshot.execute("PRAGMA journal_mode = DELETE")
+        snapshot.close()
+        os.replace(temporary, path)
+        connections[REPLICA_ALIAS].close()
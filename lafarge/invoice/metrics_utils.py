@@ -0,0 +1,189 @@
+"""
+In-process metrics collection with Prometheus text-format exposition.
+
+Defines the counters, gauges and histograms recorded by the metrics middleware,
+the PDF download views and the cache layer, and renders them for the
+``/metrics`` endpoint. Values are kept per worker process.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{_escape_label_value(value)}"' for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class for a labelled metric family."""
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down, or be computed on scrape by a callback."""
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._callbacks = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def set_function(self, function, **labels):
+        """Evaluate ``function`` on every scrape to obtain the gauge value."""
+        self._callbacks[self._key(labels)] = function
+
+    def expose(self):
+        for key, function in list(self._callbacks.items()):
+            try:
+                value = function()
+            except Exception:
+                continue
+            with _lock:
+                self._values[key] = value
+        return super().expose()
+
+
+class Histogram(Metric):
+    """Cumulative bucketed distribution with sum and count."""
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['buckets'][bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with _lock:
+            items = sorted((key, {**state, 'buckets': list(state['buckets'])}) for key, state in self._values.items())
+        for label_values, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state['buckets']):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+# Request metrics, recorded by invoice.middleware.MetricsMiddleware
+request_latency = Histogram(
+    'lafarge_request_duration_seconds', 'Request latency per view.', labels=('view', 'method'))
+request_queries = Histogram(
+    'lafarge_request_db_queries', 'Database queries issued per request, per view.', labels=('view',),
+    buckets=QUERY_COUNT_BUCKETS)
+requests_total = Counter(
+    'lafarge_requests_total', 'Requests served per view and status code.', labels=('view', 'status'))
+
+# PDF rendering, recorded by the PDF download views
+pdf_render_duration = Histogram(
+    'lafarge_pdf_render_duration_seconds', 'Time spent drawing a PDF document.', labels=('document',))
+
+# Caches report hits and misses through record_cache_access
+cache_requests = Counter(
+    'lafarge_cache_requests_total', 'Cache lookups by cache layer and result (hit or miss).',
+    labels=('cache', 'result'))
+
+# Background job queues register a depth callback through register_queue
+job_queue_depth = Gauge('lafarge_job_queue_depth', 'Jobs waiting in each queue.', labels=('queue',))
+
+
+def time_pdf_render(document):
+    """Context manager timing the drawing of one PDF document type."""
+    return pdf_render_duration.time(document=document)
+
+
+def record_cache_access(cache, hit):
+    """Count a lookup against a cache layer."""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def register_queue(queue, depth_function):
+    """Expose the depth of a job queue, evaluated on every scrape."""
+    job_queue_depth.set_function(depth_function, queue=queue)
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    with _lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
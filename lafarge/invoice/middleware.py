@@ -0,0 +1,84 @@
+"""
+Request middleware for the invoice application.
+
+Records per-view latency, database query counts and status codes into the
+metrics registry exposed at ``/metrics``.
+"""
+
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+
+from .metrics_utils import request_latency, request_queries, requests_total
+
+
+class _QueryCounter:
+    """Database execute wrapper that counts the queries it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Time every request and count its queries, labelled by the resolved view name.
+
+    Under ASGI the middleware runs async, so the chain stays async down to the
+    async views. Their ORM calls run on the request's sync thread, where the
+    query counter is installed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with self._counting_queries(counter):
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        stack = await sync_to_async(self._counting_queries)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self._record(request, response, time.perf_counter() - start, counter)
+        return response
+
+    @staticmethod
+    def _counting_queries(counter):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        return stack
+
+    def _record(self, request, response, duration, counter):
+        view = self._view_name(request)
+        if view != 'metrics':
+            request_latency.observe(duration, view=view, method=request.method)
+            request_queries.observe(counter.count, view=view)
+            requests_total.inc(view=view, status=response.status_code)
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match._func_path
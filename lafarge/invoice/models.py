@@ -5,12 +5,13 @@ This module defines the core business models including customers, products,
 invoices, and related transaction tracking.
 """
 
-import math
+import re
+from contextvars import ContextVar
 from datetime import timedelta
-from decimal import Decimal, ROUND_DOWN
-from django.db import models, transaction
-from django.db.models import Q
-from django.db.models.signals import post_save, post_delete
+
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Exists, Q
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
@@ -30,6 +31,35 @@ class Salesman(models.Model):
         return self.code
 
 
+class CommissionTier(models.Model):
+    """Incentive rate earned once a salesman's qualifying monthly sales reach ``min_sales``."""
+    min_sales = models.DecimalField(max_digits=12, decimal_places=2, unique=True)
+    rate = models.DecimalField(max_digits=6, decimal_places=4)
+
+    class Meta:
+        ordering = ['min_sales']
+
+    def __str__(self):
+        return f"${self.min_sales:,.0f}+: {self.rate * 100:g}%"
+
+
+class SharedSalesAccount(models.Model):
+    """Salesman account whose sales are pooled and split between the commission-eligible salesmen."""
+    salesman = models.OneToOneField(Salesman, on_delete=models.CASCADE, related_name='shared_account')
+
+    def __str__(self):
+        return self.salesman.name
+
+
+class CommissionShare(models.Model):
+    """Share of the pooled sales credited to a salesman; salesmen with a share earn commission."""
+    salesman = models.OneToOneField(Salesman, on_delete=models.CASCADE, related_name='commission_share')
+    percentage = models.DecimalField(max_digits=5, decimal_places=4)
+
+    def __str__(self):
+        return f"{self.salesman.name}: {self.percentage * 100:g}%"
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=255, db_index=True)
     hide_care_of = models.BooleanField(default=False)
@@ -106,11 +136,30 @@ class SpecialPrice(models.Model):
         return f"{self.customer.name} - {self.product_base_name}: {self.special_price}"
 
 
+class PricingRule(models.Model):
+    """Rounding applied to the line totals of products whose name contains ``product_name_contains``."""
+    ROUNDING_CHOICES = [
+        ('floor', 'Round down to a whole dollar'),
+    ]
+
+    product_name_contains = models.CharField(max_length=255, unique=True)
+    rounding = models.CharField(max_length=10, choices=ROUNDING_CHOICES, default='floor')
+
+    def __str__(self):
+        return f"{self.product_name_contains}: {self.get_rounding_display()}"
+
+
 def extract_base_name(full_name: str) -> str:
     """Extract base product name by removing lot number information in parentheses."""
     return full_name.split('(')[0].strip()
 
 
+def extract_lot_number(full_name: str) -> str:
+    """Extract the lot number from a product name such as 'Name (Lot no.: A123)', or '' without one."""
+    match = re.search(r"\(Lot\s*no\.?:?\s*([A-Za-z0-9-]+)\)", full_name)
+    return match.group(1) if match else ""
+
+
 class ProductTransaction(models.Model):
     TRANSACTION_CHOICES = [
         ('sale', 'Sale'),
@@ -157,6 +206,8 @@ class Invoice(models.Model):
     products = models.ManyToManyField(Product, through='InvoiceItem')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     order_number = models.CharField(max_length=50, null=True, blank=True)
+    deposit_batch = models.ForeignKey('DepositBatch', on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='invoices')
 
     @staticmethod
     def get_unpaid_invoices():
@@ -203,14 +254,13 @@ class Invoice(models.Model):
         self.terms = self.customer.terms
 
         is_new = self.pk is None
-        previous_delivery_date = None
 
         if not is_new and self.pk:
-            previous_delivery_date = Invoice.objects.get(pk=self.pk).delivery_date
             self.calculate_total_price()
 
         super().save(*args, **kwargs)
 
+        previous_delivery_date = (self._previous_invoice or {}).get('delivery_date')
         if not previous_delivery_date and self.delivery_date:
             for item in self.invoiceitem_set.all():
                 product = item.product
@@ -276,29 +326,17 @@ class InvoiceItem(models.Model):
             current_product.quantity = new_quantity
 
             if self.product_type == 'normal':
-
-                base_name = extract_base_name(current_product.name)
-
-                if self.net_price:
-                    self.price = self.net_price
-                else:
-                    try:
-                        special_price_obj = SpecialPrice.objects.get(
-                            customer=self.invoice.customer,
-                            product_base_name=base_name
-                        )
-                        self.price = special_price_obj.special_price
-                    except SpecialPrice.DoesNotExist:
-                        self.price = current_product.price
-
-                if "Licarlo" in self.product.name:
-                    self.sum_price = math.floor(self.price / current_product.units_per_pack * self.quantity)
-                else:
-                    self.sum_price = self.price / current_product.units_per_pack * self.quantity
-                if self.sum_price % 1 < 0.50:
-                    self.sum_price = Decimal(self.sum_price).quantize(Decimal('1'), rounding=ROUND_DOWN)
-                else:
-                    self.sum_price = Decimal(self.sum_price).quantize(Decimal('0.01'))
+                # Both modules import this one
+                from .price_book_utils import get_price_book
+                from .pricing_utils import get_pricing_rules, price_line
+
+                special_price = None
+                if not self.net_price:
+                    special_price = get_price_book(self.invoice.customer_id).get(
+                        extract_base_name(current_product.name))
+                line = price_line(current_product, self.quantity, net_price=self.net_price,
+                                  special_price=special_price, rules=get_pricing_rules())
+                self.price, self.sum_price = line.price, line.sum_price
             else:
                 self.sum_price = 0.00  # Sample and bonus items have no monetary value
 
@@ -330,10 +368,130 @@ class AdditionalItem(models.Model):
         return f"{self.description} - ${self.price}"
 
 
+class SyncChange(models.Model):
+    """One save or delete of a synced object; ``seq`` orders the change feed read by ``api/sync/``."""
+    MODEL_CHOICES = [
+        ('customer', 'Customer'),
+        ('product', 'Product'),
+        ('invoice', 'Invoice'),
+        ('invoiceitem', 'Invoice item'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id']),  # For compacting superseded changes
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {'delete' if self.deleted else 'save'} {self.model} {self.object_id}"
+
+
+class ClosedPeriod(models.Model):
+    """Calendar month whose reports are served from ``ReportSnapshot`` rows instead of being recomputed."""
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    closed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('year', 'month')
+        ordering = ['-year', '-month']
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d}"
+
+
+class ReportSnapshot(models.Model):
+    """Rendered body of one monthly report of a closed period; ``stale`` once an invoice of the month changes."""
+    REPORT_CHOICES = [
+        ('monthly_report', 'Monthly sales report'),
+        ('monthly_payment_report', 'Monthly payment report'),
+        ('salesman_monthly_report', 'Salesman monthly report'),
+        ('deliveryman_monthly_report', 'Deliveryman monthly report'),
+        ('monthly_analyze_detail', 'Monthly product analysis'),
+    ]
+
+    report = models.CharField(max_length=50, choices=REPORT_CHOICES)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    scope_id = models.PositiveIntegerField(default=0)  # Salesman or deliveryman of the per-person reports
+    html = models.TextField()
+    stale = models.BooleanField(default=False, db_index=True)
+    version = models.PositiveIntegerField(default=0)  # Bumped when marked stale, so a slower rebuild cannot undo it
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('report', 'year', 'month', 'scope_id')
+
+    def __str__(self):
+        scope = f" #{self.scope_id}" if self.scope_id else ""
+        return f"{self.get_report_display()}{scope} {self.year}-{self.month:02d}"
+
+
+class DepositBatch(models.Model):
+    """Payments taken to the bank together on ``date``; reconciling it gives its invoices that deposit date."""
+    date = models.DateField(db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        verbose_name_plural = "deposit batches"
+
+    def __str__(self):
+        return f"Deposit {self.date} #{self.pk}"
+
+
+class DepositBatchTotal(models.Model):
+    """Total of one payment method in a deposit batch: ``expected`` from its invoices, ``actual`` from the bank."""
+    batch = models.ForeignKey(DepositBatch, on_delete=models.CASCADE, related_name='totals')
+    payment_method = models.CharField(max_length=10, choices=Invoice.PAYMENT_TYPE_CHOICES, null=True, blank=True)
+    expected = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    actual = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        unique_together = ('batch', 'payment_method')
+
+    def __str__(self):
+        return f"{self.batch} {self.get_payment_method_display() or 'Unspecified'}"
+
+
+# Ids of the invoices being deleted by deletion_utils.delete_invoices
+invoices_being_deleted = ContextVar('invoices_being_deleted', default=frozenset())
+
+
+# Invoice fields of the row a save replaces, kept for the receivers comparing the save against it
+PREVIOUS_INVOICE_FIELDS = ('delivery_date', 'payment_date', 'deposit_date', 'total_price', 'salesman_id')
+
+
+@receiver(pre_save, sender=Invoice)
+def remember_previous_invoice(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Load the row an invoice save replaces, with whether any month is closed,
+    in one query shared by the stock, dashboard and report receivers.
+    """
+    instance._previous_invoice = None
+    instance._any_closed_period = None
+    if instance.pk and not raw:
+        previous = Invoice.objects.using(using).filter(pk=instance.pk).values(
+            *PREVIOUS_INVOICE_FIELDS, any_closed_period=Exists(ClosedPeriod.objects.all()),
+        ).first()
+        if previous:
+            instance._any_closed_period = previous.pop('any_closed_period')
+            instance._previous_invoice = previous
+
+
 # Model signals for automatic invoice total calculation
 @receiver(post_save, sender=InvoiceItem)
 def update_invoice_total(sender, instance, **kwargs):
     """Update invoice total when invoice item is saved."""
+    if kwargs.get('raw'):  # Fixture and import loads carry their own totals
+        return
     instance.invoice.calculate_total_price()
     instance.invoice.save()
 
@@ -341,6 +499,8 @@ def update_invoice_total(sender, instance, **kwargs):
 @receiver(post_delete, sender=InvoiceItem)
 def revert_invoice_total(sender, instance, **kwargs):
     """Update invoice total when invoice item is deleted."""
+    if instance.invoice_id in invoices_being_deleted.get():  # The invoice goes too
+        return
     instance.invoice.calculate_total_price()
     instance.invoice.save()
 
@@ -348,6 +508,8 @@ def revert_invoice_total(sender, instance, **kwargs):
 @receiver(post_save, sender=AdditionalItem)
 def update_invoice_total_additional(sender, instance, **kwargs):
     """Update invoice total when additional item is saved."""
+    if kwargs.get('raw'):  # Fixture and import loads carry their own totals
+        return
     instance.invoice.calculate_total_price()
     instance.invoice.save()
 
@@ -355,5 +517,7 @@ def update_invoice_total_additional(sender, instance, **kwargs):
 @receiver(post_delete, sender=AdditionalItem)
 def revert_invoice_total_additional(sender, instance, **kwargs):
     """Update invoice total when additional item is deleted."""
+    if instance.invoice_id in invoices_being_deleted.get():  # The invoice goes too
+        return
     instance.invoice.calculate_total_price()
     instance.invoice.save()
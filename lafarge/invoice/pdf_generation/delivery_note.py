@@ -5,7 +5,7 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import Table, TableStyle
 
-from ..check_utils import prefix_check
+from ..check_utils import get_forbidden_words, prefix_check
 
 
 def draw_left_aligned_wrapped(pdf, x_left, y_bottom, text, max_width=145, fontsize=10, fontname="Helvetica"):
@@ -75,6 +75,7 @@ def draw_delivery_note(pdf, invoice):
         invoice: The Invoice object.
     """
     width, height = A4
+    forbidden_words = get_forbidden_words()
 
     background_image_path = os.path.join(settings.STATIC_ROOT, 'DeliveryNote.png')
     pdf.drawImage(background_image_path, 0, 0, width, height)
@@ -82,12 +83,12 @@ def draw_delivery_note(pdf, invoice):
     # Customer information
     address_lines = [line.strip() for line in invoice.customer.delivery_address.split("\n") if line.strip()]
     pdf.setFont("Helvetica-Bold", 10)
-    if prefix_check(invoice.customer.delivery_to.lower()):
+    if prefix_check(invoice.customer.delivery_to.lower(), forbidden_words):
         pdf.drawString(50, height - 180, f"Deliver To: {invoice.customer.delivery_to}")
     else:
         pdf.drawString(50, height - 180, f"Deliver To: Dr. {invoice.customer.delivery_to}")
     if invoice.customer.care_of:
-        if prefix_check(invoice.customer.care_of.lower()):
+        if prefix_check(invoice.customer.care_of.lower(), forbidden_words):
             pdf.drawString(50, height - 190, f"C/O: {invoice.customer.care_of}")
         else:
             pdf.drawString(50, height - 190, f"C/O: Dr. {invoice.customer.care_of}")
@@ -8,7 +8,7 @@ from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Table, TableStyle
 from reportlab.graphics.barcode import code128
 
-from ..check_utils import prefix_check
+from ..check_utils import get_forbidden_words, prefix_check
 
 
 def draw_invoice_page(pdf, invoice, copy_type):
@@ -21,6 +21,7 @@ def draw_invoice_page(pdf, invoice, copy_type):
         copy_type: A string indicating the type of copy (e.g., "Original", "Customer Copy", "Company Copy", "Poison Form").
     """
     width, height = A4
+    forbidden_words = get_forbidden_words()
 
     # Set background image based on copy type
     if copy_type == "Poison Form":
@@ -39,12 +40,12 @@ def draw_invoice_page(pdf, invoice, copy_type):
     delivery_address_lines = [line.strip() for line in invoice.customer.delivery_address.split("\n") if line.strip()]
     office_hour_lines = [line.strip() for line in invoice.customer.office_hour.split("\n") if line.strip()]
     pdf.setFont("Helvetica-Bold", 10)
-    if prefix_check(invoice.customer.name.lower()):
+    if prefix_check(invoice.customer.name.lower(), forbidden_words):
         pdf.drawString(50, height - 165, f"SOLD TO: {invoice.customer.name}")
     else:
         pdf.drawString(50, height - 165, f"SOLD TO: Dr. {invoice.customer.name}")
     if invoice.customer.care_of and not invoice.customer.hide_care_of:
-        if prefix_check(invoice.customer.care_of.lower()):
+        if prefix_check(invoice.customer.care_of.lower(), forbidden_words):
             pdf.drawString(50, height - 185, f"{invoice.customer.care_of}")
         else:
             pdf.drawString(50, height - 185, f"C/O: Dr. {invoice.customer.care_of}")
@@ -5,7 +5,7 @@ from reportlab.lib.pagesizes import A4
 from reportlab.platypus import Table, TableStyle
 from reportlab.graphics.barcode import code128
 
-from ..check_utils import prefix_check
+from ..check_utils import get_forbidden_words, prefix_check
 
 
 def draw_invoice_page_legacy(pdf, invoice):
@@ -17,6 +17,7 @@ def draw_invoice_page_legacy(pdf, invoice):
         invoice: The Invoice object.
     """
     width, height = A4
+    forbidden_words = get_forbidden_words()
 
     # Draw the background image
     # background_image_path = os.path.join(settings.STATIC_ROOT, 'Invoice_Legacy.png')
@@ -31,12 +32,12 @@ def draw_invoice_page_legacy(pdf, invoice):
     y_position = height - 150 + 8
     text_object = pdf.beginText(100, y_position)
     text_object.setFont("Times-Roman", 12)
-    if prefix_check(invoice.customer.name.lower()):
+    if prefix_check(invoice.customer.name.lower(), forbidden_words):
         text_object.textLine(f"{invoice.customer.name}")
     else:
         text_object.textLine(f"Dr. {invoice.customer.name}")
     if invoice.customer.care_of and not invoice.customer.hide_care_of:
-        if prefix_check(invoice.customer.care_of.lower()):
+        if prefix_check(invoice.customer.care_of.lower(), forbidden_words):
             text_object.textLine(f"{invoice.customer.care_of}")
         else:
             text_object.textLine(f"C/O: Dr. {invoice.customer.care_of}")
@@ -6,7 +6,7 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import A5
 from reportlab.platypus import Table, TableStyle
 
-from ..check_utils import prefix_check
+from ..check_utils import get_forbidden_words, prefix_check
 
 
 def draw_order_form_page(pdf, order):
@@ -18,6 +18,7 @@ def draw_order_form_page(pdf, order):
         order: The Order object.
     """
     width, height = A5
+    forbidden_words = get_forbidden_words()
 
     # Draw the background image
     background_image_path = os.path.join(settings.STATIC_ROOT, 'OrderForm.png')
@@ -26,12 +27,12 @@ def draw_order_form_page(pdf, order):
     # Customer information
     pdf.setFont("Helvetica-Bold", 10)
     if order.customer.care_of:
-        if prefix_check(order.customer.care_of.lower()):
+        if prefix_check(order.customer.care_of.lower(), forbidden_words):
             pdf.drawString(30, height - 100, f"From: {order.customer.care_of}")
         else:
             pdf.drawString(30, height - 100, f"From: Dr. {order.customer.care_of}")
     else:
-        if prefix_check(order.customer.name.lower()):
+        if prefix_check(order.customer.name.lower(), forbidden_words):
             pdf.drawString(30, height - 100, f"From: {order.customer.name}")
         else:
             pdf.drawString(30, height - 100, f"From: Dr. {order.customer.name}")
@@ -76,7 +77,7 @@ def draw_order_form_page(pdf, order):
     table.drawOn(pdf, 110, height - 200 - table_height)  # Start lower for downward expansion
 
     # Footer
-    if prefix_check(order.customer.name.lower()):
+    if prefix_check(order.customer.name.lower(), forbidden_words):
         pdf.drawString(30, height - 390, f"Please confirm by replying to {order.customer.name}")
     else:
         pdf.drawString(30, height - 390, f"Please confirm by replying to Dr. {order.customer.name}")
@@ -5,7 +5,7 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import A5
 from reportlab.platypus import Table, TableStyle
 
-from ..check_utils import prefix_check
+from ..check_utils import get_forbidden_words, prefix_check
 
 
 def draw_sample_page(pdf, invoice):
@@ -17,6 +17,7 @@ def draw_sample_page(pdf, invoice):
         order: The Order object.
     """
     width, height = A5
+    forbidden_words = get_forbidden_words()
 
     # Draw the background image
     background_image_path = os.path.join(settings.STATIC_ROOT, 'Sample.png')
@@ -32,12 +33,12 @@ def draw_sample_page(pdf, invoice):
     office_hour_lines = [line.strip() for line in invoice.customer.office_hour.split("\n") if line.strip()]
     pdf.setFont("Helvetica-Bold", 10)
     if invoice.customer.name != "Sample":
-        if prefix_check(invoice.customer.name.lower()):
+        if prefix_check(invoice.customer.name.lower(), forbidden_words):
             pdf.drawString(30, height - 120, f"TO: {invoice.customer.name}")
         else:
             pdf.drawString(30, height - 120, f"TO: Dr. {invoice.customer.name}")
         if invoice.customer.care_of:
-            if prefix_check(invoice.customer.care_of.lower()):
+            if prefix_check(invoice.customer.care_of.lower(), forbidden_words):
                 pdf.drawString(30, height - 130, f"{invoice.customer.care_of}")
             else:
                 pdf.drawString(30, height - 130, f"C/O: Dr. {invoice.customer.care_of}")
@@ -6,7 +6,7 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import Table, TableStyle
 
-from ..check_utils import prefix_check
+from ..check_utils import get_forbidden_words, prefix_check
 
 
 def draw_statement_page(pdf, customer, unpaid_invoices):
@@ -18,6 +18,7 @@ def draw_statement_page(pdf, customer, unpaid_invoices):
         invoice: The Invoice object.
     """
     width, height = A4
+    forbidden_words = get_forbidden_words()
 
     # Draw the background image
 
@@ -32,12 +33,12 @@ def draw_statement_page(pdf, customer, unpaid_invoices):
                                          line.strip()]
     pdf.setFont("Helvetica-Bold", 10)
     pdf.drawString(50, height - 105, f"Date: {datetime.today().strftime('%Y-%b-%d')}")
-    if prefix_check(customer.name.lower()):
+    if prefix_check(customer.name.lower(), forbidden_words):
         pdf.drawString(60, height - 180, f"{customer.name}")
     else:
         pdf.drawString(60, height - 180, f"Dr. {customer.name}")
     if customer.care_of:
-        if prefix_check(customer.care_of.lower()):
+        if prefix_check(customer.care_of.lower(), forbidden_words):
             pdf.drawString(60, height - 200, f"C/O: {customer.care_of}")
         else:
             pdf.drawString(60, height - 200, f"C/O: Dr. {customer.care_of}")
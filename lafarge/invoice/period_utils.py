@@ -0,0 +1,59 @@
+"""
+Utility functions for filtering querysets by reporting period.
+
+A period is a half-open ``[start, end)`` range of dates. Filtering with
+``field >= start AND field < end`` lets the database use the date column
+indexes, unlike ``__year``/``__month`` lookups which wrap the column in a
+``strftime``/``EXTRACT`` call.
+"""
+
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from dateutil.relativedelta import relativedelta
+
+
+class Period(NamedTuple):
+    start: date
+    end: date  # exclusive
+
+    def lookups(self, field):
+        """Filter keyword arguments selecting ``field`` (a DateField path) within the period."""
+        return {f'{field}__gte': self.start, f'{field}__lt': self.end}
+
+    def __contains__(self, day):
+        return self.start <= day < self.end
+
+    @property
+    def last_day(self):
+        return self.end - timedelta(days=1)
+
+
+def month_period(year, month):
+    """Calendar month ``month`` of ``year``."""
+    start = date(int(year), int(month), 1)
+    return Period(start, start + relativedelta(months=1))
+
+
+def week_period(day):
+    """ISO week (Monday to Sunday) containing ``day``."""
+    start = day - timedelta(days=day.weekday())
+    return Period(start, start + timedelta(weeks=1))
+
+
+def quarter_period(year, quarter):
+    """Calendar quarter ``quarter`` (1-4) of ``year``."""
+    start = date(int(year), 3 * (int(quarter) - 1) + 1, 1)
+    return Period(start, start + relativedelta(months=3))
+
+
+def year_period(year):
+    """Calendar year ``year``."""
+    return Period(date(int(year), 1, 1), date(int(year) + 1, 1, 1))
+
+
+def custom_period(first_day, last_day):
+    """Period from ``first_day`` to ``last_day``, both inclusive."""
+    if last_day < first_day:
+        raise ValueError("last_day must not be before first_day")
+    return Period(first_day, last_day + timedelta(days=1))
@@ -0,0 +1,77 @@
+"""
+Utility functions for customers' price books.
+
+A price book maps a customer's product base names to their special prices.
+It is loaded with one query, kept in the cache until one of the customer's
+``SpecialPrice`` rows is saved or deleted, and resolves the unit prices of
+any number of products at once. A special price moved to another customer
+invalidates both books. Workers see each other's invalidations through the
+shared cache required by the ``invoice.E001`` check.
+"""
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import SpecialPrice, extract_base_name
+
+# Safety net for bulk writes that bypass the SpecialPrice signals
+PRICE_BOOK_TIMEOUT = 60 * 60
+
+
+def price_book_key(customer_id):
+    return f"invoice:price_book:{customer_id}"
+
+
+def get_price_book(customer_id):
+    """Special prices of one customer by product base name."""
+    key = price_book_key(customer_id)
+    book = cache.get(key)
+    if book is None:
+        book = dict(
+            SpecialPrice.objects.filter(customer_id=customer_id).values_list('product_base_name', 'special_price')
+        )
+        cache.set(key, book, PRICE_BOOK_TIMEOUT)
+    return book
+
+
+def invalidate_price_book(customer_id):
+    key = price_book_key(customer_id)
+    cache.delete(key)
+    # A request reading between the write and its commit would cache the old prices again
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def resolve_prices(customer_id, products):
+    """
+    Unit price of each product for the customer: the special price of its base
+    name if there is one, its list price otherwise.
+
+    Returns:
+        dict: product id to a ``(price, is_special)`` pair
+    """
+    book = get_price_book(customer_id)
+    prices = {}
+    for product in products:
+        special_price = book.get(extract_base_name(product.name))
+        prices[product.pk] = (special_price, True) if special_price is not None else (product.price, False)
+    return prices
+
+
+@receiver(pre_save, sender=SpecialPrice)
+def remember_price_book_customer(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Keep the customer a special price is leaving, whose book loses it."""
+    instance._previous_customer_id = None
+    if instance.pk and not raw:
+        instance._previous_customer_id = SpecialPrice.objects.using(using).filter(pk=instance.pk).values_list(
+            'customer_id', flat=True).first()
+
+
+@receiver(post_save, sender=SpecialPrice)
+@receiver(post_delete, sender=SpecialPrice)
+def invalidate_changed_price_book(sender, instance, **kwargs):
+    invalidate_price_book(instance.customer_id)
+    previous = getattr(instance, '_previous_customer_id', None)
+    if previous is not None and previous != instance.customer_id:
+        invalidate_price_book(previous)
@@ -0,0 +1,139 @@
+"""
+Utility functions for pricing invoice lines.
+
+``price_line`` is the pricing of ``InvoiceItem.save`` without the stock
+updates and signals: net price override, customer special price or list
+price, per-pack division, ``PricingRule`` rounding and the invoice's cents
+rule. ``quote_order`` prices a whole draft order with a fixed number of
+queries and writes nothing. The rules are cached until one changes, in the
+cache shared by the workers as required by the ``invoice.E001`` check.
+"""
+
+import math
+from decimal import ROUND_DOWN, Decimal
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .models import PricingRule, Product, extract_base_name
+from .price_book_utils import get_price_book
+
+PRICING_RULES_KEY = 'invoice:pricing_rules'
+# Safety net for bulk writes that bypass the PricingRule signals
+PRICING_RULES_TIMEOUT = 60 * 60
+
+# Rules installed into an empty table, as they were applied before they became editable in the admin
+DEFAULT_PRICING_RULES = [('Licarlo', 'floor')]
+
+
+class LinePrice(NamedTuple):
+    price: Decimal  # unit price charged; None for bonus and sample lines, which keep theirs
+    sum_price: Decimal
+    source: str  # 'net', 'special' or 'list'; None for bonus and sample lines
+
+
+def get_pricing_rules():
+    """Pricing rules as ``(product_name_contains, rounding)`` pairs, cached until a rule changes."""
+    rules = cache.get(PRICING_RULES_KEY)
+    if rules is None:
+        rules = list(PricingRule.objects.order_by('id').values_list('product_name_contains', 'rounding'))
+        cache.set(PRICING_RULES_KEY, rules, PRICING_RULES_TIMEOUT)
+    return rules
+
+
+def line_rounding(product_name, rules):
+    """Rounding of the first rule matching ``product_name``, or None."""
+    return next((rounding for match, rounding in rules if match in product_name), None)
+
+
+def price_line(product, quantity, product_type='normal', net_price=None, special_price=None, rules=()):
+    """
+    Price one invoice line without touching the database.
+
+    Args:
+        product: object with ``name``, ``price`` and ``units_per_pack``
+        net_price: price typed on the line, overriding the others when set
+        special_price: the customer's special price for the product's base name, if any
+        rules: pricing rules from ``get_pricing_rules``
+
+    Returns:
+        LinePrice
+    """
+    if product_type != 'normal':
+        return LinePrice(None, Decimal('0.00'), None)  # Sample and bonus items have no monetary value
+    if net_price:
+        price, source = net_price, 'net'
+    elif special_price is not None:
+        price, source = special_price, 'special'
+    else:
+        price, source = product.price, 'list'
+
+    total = price / product.units_per_pack * quantity
+    if line_rounding(product.name, rules) == 'floor':
+        total = math.floor(total)
+    # Line totals drop cents under 50 and keep them otherwise
+    if total % 1 < Decimal('0.50'):
+        total = Decimal(total).quantize(Decimal('1'), rounding=ROUND_DOWN)
+    else:
+        total = Decimal(total).quantize(Decimal('0.01'))
+    return LinePrice(price, total, source)
+
+
+def quote_order(customer_id, lines):
+    """
+    Price a draft order for a customer.
+
+    Args:
+        lines: dicts with ``product`` (id), ``quantity`` and optionally
+            ``product_type`` and ``net_price``
+
+    Returns:
+        dict: ``lines`` (each input line with price, sum_price and source),
+        ``total`` and ``unknown_products`` (ids not found)
+    """
+    products = Product.objects.only('id', 'name', 'price', 'units_per_pack').in_bulk(
+        {line['product'] for line in lines})
+    book, rules = get_price_book(customer_id), get_pricing_rules()
+
+    priced, total = [], Decimal('0.00')
+    for line in lines:
+        product = products.get(line['product'])
+        if product is None:
+            continue
+        result = price_line(
+            product, line['quantity'], line.get('product_type', 'normal'), line.get('net_price'),
+            book.get(extract_base_name(product.name)), rules,
+        )
+        priced.append({**line, 'name': product.name, **result._asdict()})
+        total += result.sum_price
+    return {
+        'lines': priced,
+        'total': total,
+        'unknown_products': sorted({line['product'] for line in lines} - set(products)),
+    }
+
+
+def install_default_pricing_rules(using=DEFAULT_DB_ALIAS):
+    if not PricingRule.objects.using(using).exists():
+        PricingRule.objects.using(using).bulk_create(
+            PricingRule(product_name_contains=match, rounding=rounding) for match, rounding in DEFAULT_PRICING_RULES
+        )
+        cache.delete(PRICING_RULES_KEY)
+
+
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+def invalidate_pricing_rules(sender, **kwargs):
+    cache.delete(PRICING_RULES_KEY)
+    transaction.on_commit(lambda: cache.delete(PRICING_RULES_KEY))
+
+
+@receiver(post_migrate)
+def install_pricing_rules(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Install the default rules after every migrate that leaves the rule table in place, on new databases too."""
+    if sender.label == 'invoice' and router.allow_migrate(using, 'invoice') \
+            and PricingRule._meta.db_table in connections[using].introspection.table_names():
+        install_default_pricing_rules(using)
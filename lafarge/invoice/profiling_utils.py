@@ -0,0 +1,179 @@
+"""
+Utility functions for capturing on-demand request profiles.
+
+A superuser can profile a single request by adding ``?_profile=<mode>`` to the
+URL or by sending an ``X-Profile: <mode>`` header, where mode is ``cprofile``,
+``tracemalloc`` or ``all`` (``1`` is shorthand for ``cprofile``). Captures are
+written to ``settings.PROFILING_DIR`` and listed on the profiles admin page.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import re
+import time
+import tracemalloc
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+PROFILE_QUERY_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+PROFILE_MODES = {
+    '1': ('cprofile',),
+    'cprofile': ('cprofile',),
+    'tracemalloc': ('tracemalloc',),
+    'all': ('cprofile', 'tracemalloc'),
+}
+
+CAPTURE_NAME_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+ALLOCATION_TOP_LIMIT = 25
+FUNCTION_TOP_LIMIT = 15
+
+
+def get_profile_dir():
+    """Return the directory captures are stored in, creating it if needed."""
+    profile_dir = Path(settings.PROFILING_DIR)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    return profile_dir
+
+
+def requested_profile_modes(request):
+    """
+    Return the profiling modes requested for this request.
+
+    Only superusers may request a profile; everyone else gets an empty tuple.
+    """
+    if not getattr(settings, 'PROFILING_ENABLED', False):
+        return ()
+    if not request.user.is_authenticated or not request.user.is_superuser:
+        return ()
+    value = request.GET.get(PROFILE_QUERY_PARAM) or request.META.get(PROFILE_HEADER) or ''
+    return PROFILE_MODES.get(value.strip().lower(), ())
+
+
+def profile_view(function):
+    """Decorator that profiles the wrapped view when a superuser asks for it."""
+    @wraps(function)
+    def wrap(request, *args, **kwargs):
+        modes = requested_profile_modes(request)
+        if not modes:
+            return function(request, *args, **kwargs)
+        return _run_profiled(function, modes, request, *args, **kwargs)
+    return wrap
+
+
+def _run_profiled(function, modes, request, *args, **kwargs):
+    """Run a view under cProfile and/or tracemalloc and save the capture."""
+    started = timezone.now()
+    capture_name = f"{started:%Y%m%d-%H%M%S-%f}_{function.__name__}"
+    profile_dir = get_profile_dir()
+
+    profiler = cProfile.Profile() if 'cprofile' in modes else None
+    trace_allocations = 'tracemalloc' in modes
+    started_tracing = False
+    if trace_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            response = profiler.runcall(function, request, *args, **kwargs)
+        else:
+            response = function(request, *args, **kwargs)
+        duration = time.perf_counter() - start
+
+        peak_kb = None
+        if trace_allocations:
+            snapshot = tracemalloc.take_snapshot()
+            peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+            _write_allocation_top_list(profile_dir / f"{capture_name}.alloc.txt", snapshot)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    if profiler is not None:
+        profiler.dump_stats(str(profile_dir / f"{capture_name}.prof"))
+
+    metadata = {
+        'name': capture_name,
+        'view': function.__name__,
+        'path': request.get_full_path(),
+        'user': request.user.get_username(),
+        'started': started.isoformat(),
+        'duration_ms': round(duration * 1000, 2),
+        'modes': list(modes),
+        'peak_kb': round(peak_kb, 1) if peak_kb is not None else None,
+    }
+    (profile_dir / f"{capture_name}.json").write_text(json.dumps(metadata, indent=2))
+
+    response['X-Profile-Id'] = capture_name
+    return response
+
+
+def _write_allocation_top_list(path, snapshot):
+    """Write the biggest allocation sites of a tracemalloc snapshot."""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    stats = snapshot.statistics('lineno')
+    lines = [f"Top {ALLOCATION_TOP_LIMIT} allocation sites by size"]
+    for index, stat in enumerate(stats[:ALLOCATION_TOP_LIMIT], start=1):
+        frame = stat.traceback[0]
+        lines.append(f"#{index}: {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+    total = sum(stat.size for stat in stats)
+    lines.append(f"Total allocated: {total / 1024:.1f} KiB")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def top_functions(prof_path, limit=FUNCTION_TOP_LIMIT):
+    """
+    Summarise a ``.prof`` file as its most expensive functions.
+
+    Returns:
+        list: Dicts with function location, call count, total and cumulative time
+    """
+    stats = pstats.Stats(str(prof_path), stream=io.StringIO())
+    rows = []
+    for (filename, lineno, func_name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{func_name} ({Path(filename).name}:{lineno})",
+            'ncalls': ncalls,
+            'tottime': tottime,
+            'cumtime': cumtime,
+        })
+    rows.sort(key=lambda row: row['cumtime'], reverse=True)
+    return rows[:limit]
+
+
+def list_captures():
+    """Return metadata for every stored capture, newest first."""
+    profile_dir = get_profile_dir()
+    captures = []
+    for meta_path in sorted(profile_dir.glob('*.json'), reverse=True):
+        try:
+            metadata = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            continue
+        name = metadata.get('name', meta_path.stem)
+        prof_path = profile_dir / f"{name}.prof"
+        alloc_path = profile_dir / f"{name}.alloc.txt"
+        metadata['has_prof'] = prof_path.exists()
+        metadata['top_functions'] = top_functions(prof_path) if prof_path.exists() else []
+        metadata['allocations'] = alloc_path.read_text() if alloc_path.exists() else ''
+        captures.append(metadata)
+    return captures
+
+
+def get_capture_path(name, suffix):
+    """Resolve a capture file by name, rejecting anything outside the profile directory."""
+    if not CAPTURE_NAME_RE.match(name):
+        return None
+    path = get_profile_dir() / f"{name}{suffix}"
+    return path if path.exists() else None
@@ -0,0 +1,257 @@
+"""
+Utility functions for collecting query plans from a real request workload.
+
+Captures the SELECT statements issued while serving a list of requests, runs
+``EXPLAIN QUERY PLAN`` (SQLite) or ``EXPLAIN (FORMAT JSON)`` (PostgreSQL) on
+each, and summarises full table scans, temporary sort structures and index
+usage for the ``index_advisor`` command.
+"""
+
+import json
+import re
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.db import connections
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?')
+SQLITE_SEARCH_RE = re.compile(r'^SEARCH (?:TABLE )?(\w+)(?: AS \w+)? USING (?:COVERING )?INDEX (\w+)')
+SQLITE_TEMP_BTREE_RE = re.compile(r'USE TEMP B-TREE FOR (.+)$')
+FROM_TABLE_RE = re.compile(r'\bFROM "(\w+)"')
+CLAUSE_END_RE = re.compile(r' (?:GROUP BY|ORDER BY|HAVING|LIMIT|UNION) ')
+FILTER_COLUMN_RE = r'"{table}"\."(\w+)" (?:=|<|>|<=|>=|IN|IS|BETWEEN)'
+ORDER_COLUMN_RE = r'"{table}"\."(\w+)"(?: (?:ASC|DESC))?'
+
+
+class _StatementRecorder:
+    """Database execute wrapper keeping each distinct SELECT with the views that issued it."""
+
+    def __init__(self):
+        self.statements = {}
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            key = (context['connection'].alias, sql)
+            entry = self.statements.setdefault(key, {'params': params, 'views': set(), 'executions': 0})
+            entry['views'].add(self.view)
+            entry['executions'] += 1
+        return execute(sql, params, many, context)
+
+
+def capture_workload(client, targets):
+    """
+    Request every ``(name, url)`` target and record the SELECT statements issued.
+
+    Returns:
+        list: dicts with alias, sql, params, views and executions
+    """
+    recorder = _StatementRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        for name, url in targets:
+            recorder.view = name
+            client.get(url)
+    return [
+        {'alias': alias, 'sql': sql, **entry}
+        for (alias, sql), entry in recorder.statements.items()
+    ]
+
+
+def explain(connection, sql, params):
+    """
+    Return the plan of one statement as scanned tables, temp sorts and used indexes.
+
+    Returns:
+        dict: ``scans`` (tables read in full), ``temp_sorts`` (descriptions),
+        ``indexes`` (index names used) and ``plan`` (raw plan lines)
+    """
+    if connection.vendor == 'postgresql':
+        return _explain_postgresql(connection, sql, params)
+    return _explain_sqlite(connection, sql, params)
+
+
+def _explain_sqlite(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[-1] for row in cursor.fetchall()]
+
+    result = {'scans': set(), 'temp_sorts': [], 'indexes': set(), 'plan': details}
+    for detail in details:
+        scan, search, temp = (SQLITE_SCAN_RE.match(detail), SQLITE_SEARCH_RE.match(detail),
+                              SQLITE_TEMP_BTREE_RE.search(detail))
+        if search:
+            result['indexes'].add(search.group(2))
+        elif scan:
+            if scan.group(2):
+                result['indexes'].add(scan.group(2))
+            else:
+                result['scans'].add(scan.group(1))
+        if temp:
+            result['temp_sorts'].append(temp.group(1))
+    return result
+
+
+def _explain_postgresql(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        document = cursor.fetchone()[0]
+    if isinstance(document, str):
+        document = json.loads(document)
+
+    result = {'scans': set(), 'temp_sorts': [], 'indexes': set(), 'plan': []}
+
+    def walk(node, depth=0):
+        relation = node.get('Relation Name')
+        result['plan'].append("  " * depth + node['Node Type'] + (f" on {relation}" if relation else ""))
+        if node['Node Type'] == 'Seq Scan':
+            result['scans'].add(relation)
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            result['temp_sorts'].append(", ".join(node.get('Sort Key', [])))
+        if 'Index Name' in node:
+            result['indexes'].add(node['Index Name'])
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(document[0]['Plan'])
+    return result
+
+
+def app_tables(app_label='invoice'):
+    return {model._meta.db_table for model in apps.get_app_config(app_label).get_models()}
+
+
+def declared_indexes(connection, tables):
+    """
+    Introspect the indexes of ``tables``.
+
+    Returns:
+        list: dicts with table, name, columns and unique; primary keys are left out
+    """
+    indexes = []
+    with connection.cursor() as cursor:
+        for table in sorted(tables):
+            for name, info in connection.introspection.get_constraints(cursor, table).items():
+                if info['primary_key'] or not (info['index'] or info['unique']) or not info['columns']:
+                    continue
+                indexes.append({'table': table, 'name': name, 'columns': tuple(info['columns']),
+                                'unique': bool(info['unique'])})
+    return indexes
+
+
+def redundant_indexes(indexes):
+    """
+    Non-unique indexes whose columns are a leading prefix of another index on the same table.
+
+    Returns:
+        list: (redundant index, covering index) pairs
+    """
+    pairs = []
+    for index in indexes:
+        if index['unique']:
+            continue
+        for other in indexes:
+            if other is index or other['table'] != index['table']:
+                continue
+            covers = other['columns'][:len(index['columns'])] == index['columns']
+            # Equal column lists: keep the unique one, or the first declared
+            if covers and (len(other['columns']) > len(index['columns']) or other['unique']
+                           or indexes.index(other) < indexes.index(index)):
+                pairs.append((index, other))
+                break
+    return pairs
+
+
+def _clause(sql, keyword):
+    position = sql.find(f' {keyword} ')
+    if position < 0:
+        return ''
+    clause = sql[position + len(keyword) + 2:]
+    end = CLAUSE_END_RE.search(clause)
+    return clause[:end.start()] if end else clause
+
+
+def main_table(sql, tables):
+    """Table of the statement's outer FROM clause, when it is one of ``tables``; subqueries come later."""
+    match = FROM_TABLE_RE.search(sql)
+    return match.group(1) if match and match.group(1) in tables else None
+
+
+def filter_columns(sql, table):
+    """Columns of ``table`` compared in the statement's WHERE clause, in order of appearance."""
+    columns = re.findall(FILTER_COLUMN_RE.format(table=table), _clause(sql, 'WHERE'))
+    return tuple(dict.fromkeys(columns))
+
+
+def order_columns(sql, table):
+    """Columns of ``table`` in the statement's ORDER BY clause."""
+    position = sql.rfind(' ORDER BY ')
+    if position < 0:
+        return ()
+    clause = re.split(r' LIMIT | OFFSET ', sql[position + 10:])[0]
+    return tuple(dict.fromkeys(re.findall(ORDER_COLUMN_RE.format(table=table), clause)))
+
+
+def table_row_counts(connection, tables):
+    with connection.cursor() as cursor:
+        counts = {}
+        for table in tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def analyse_workload(statements, using='default', min_rows=1000):
+    """
+    Explain every captured statement and build the index report.
+
+    Returns:
+        dict: ``full_scans``, ``temp_sorts``, ``add`` (suggested indexes),
+        ``unused`` and ``redundant`` indexes, and ``statements`` explained
+    """
+    connection = connections[using]
+    tables = app_tables()
+    row_counts = table_row_counts(connection, tables)
+    indexes = declared_indexes(connection, tables)
+
+    used, full_scans, temp_sorts = set(), [], []
+    suggestions = defaultdict(set)
+    for statement in statements:
+        plan = explain(connections[statement['alias']], statement['sql'], statement['params'])
+        used |= plan['indexes']
+        views = sorted(statement['views'])
+        for table in sorted(plan['scans'] & tables):
+            columns = filter_columns(statement['sql'], table)
+            full_scans.append({'table': table, 'rows': row_counts[table], 'filter': columns, 'views': views,
+                               'sql': statement['sql']})
+            if columns and row_counts[table] >= min_rows:
+                suggestions[(table, columns)].update(views)
+        for sort in plan['temp_sorts']:
+            table = main_table(statement['sql'], tables)
+            columns = order_columns(statement['sql'], table) if table else ()
+            temp_sorts.append({'table': table, 'sort': sort, 'order': columns, 'views': views,
+                               'sql': statement['sql']})
+            if columns and row_counts.get(table, 0) >= min_rows:
+                key = tuple(dict.fromkeys(filter_columns(statement['sql'], table) + columns))
+                suggestions[(table, key)].update(views)
+
+    redundant = redundant_indexes(indexes)
+    redundant_names = {index['name'] for index, _ in redundant}
+    unused = [index for index in indexes
+              if not index['unique'] and index['name'] not in used and index['name'] not in redundant_names]
+
+    def already_indexed(table, columns):
+        return any(index['table'] == table and index['columns'][:len(columns)] == columns for index in indexes)
+
+    return {
+        'statements': len(statements),
+        'full_scans': sorted(full_scans, key=lambda scan: -scan['rows']),
+        'temp_sorts': temp_sorts,
+        'add': [{'table': table, 'columns': columns, 'views': sorted(views)}
+                for (table, columns), views in sorted(suggestions.items()) if not already_indexed(table, columns)],
+        'unused': unused,
+        'redundant': [{'index': index, 'covered_by': other} for index, other in redundant],
+        'used': sorted(used),
+    }
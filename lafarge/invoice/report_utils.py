@@ -0,0 +1,384 @@
+"""
+Utility functions for the monthly reports and their closed-period snapshots.
+
+Each report's context is built by a function of the month (and the salesman
+or deliveryman for the per-person reports) and rendered from
+``invoice/reports/<report>.html``. Once a month is closed with
+``close_period``, the rendered bodies are stored as ``ReportSnapshot`` rows and
+served as they are. Saving or deleting an invoice of a closed month marks its
+snapshots stale; stale snapshots are the rebuild queue, worked through by
+``rebuild_stale_snapshots`` and by the next view of each report.
+"""
+
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, NamedTuple
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .commission_utils import COMMISSION_MULTIPLIER, load_rules, month_commission
+from .db_routers import reading_from_primary
+from .models import (
+    ClosedPeriod, CommissionShare, CommissionTier, Deliveryman, DepositBatch, DepositBatchTotal, Invoice, InvoiceItem,
+    ReportSnapshot, Salesman, SharedSalesAccount, invoices_being_deleted,
+)
+from .period_utils import month_period
+
+CLOSED_PERIODS_KEY = 'invoice:closed_periods'
+# Safety net for bulk writes that bypass the ClosedPeriod signals
+CLOSED_PERIODS_TIMEOUT = 60 * 60
+
+LOT_NUMBER = re.compile(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)")
+
+
+def _weekly_invoices(invoices):
+    """Invoices grouped into weeks 1-5 of the month with their totals, each given its ``items`` lines."""
+    weeks = {week: {"invoices": [], "total": Decimal("0.00")} for week in range(1, 6)}
+    monthly_total = Decimal("0.00")
+
+    for invoice in invoices:
+        week_number = min((invoice.delivery_date.day - 1) // 7 + 1, 5)  # Week 5 holds days 29 to 31
+        weeks[week_number]["invoices"].append(invoice)
+        weeks[week_number]["total"] += invoice.total_price
+        monthly_total += invoice.total_price
+
+        # Group invoice items by product name without the lot number
+        grouped_items = defaultdict(list)
+        for item in invoice.invoiceitem_set.all():
+            if item.product:
+                grouped_items[LOT_NUMBER.sub("", item.product.name)].append(str(item.quantity))
+        invoice.items = [f"{name} ({' + '.join(quantities)})" for name, quantities in grouped_items.items()]
+    return weeks, monthly_total
+
+
+def monthly_report_context(year, month, scope=None):
+    invoices = Invoice.objects.filter(**month_period(year, month).lookups('delivery_date')).select_related(
+        "customer", "salesman"
+    ).prefetch_related(
+        "invoiceitem_set", "invoiceitem_set__product", "additionalitem_set"
+    )
+    weeks, monthly_total = _weekly_invoices(invoices)
+    return {"weeks": weeks, "year": year, "month": month, "monthly_total": monthly_total}
+
+
+def monthly_payment_report_context(year, month, scope=None):
+    invoices = Invoice.objects.filter(**month_period(year, month).lookups('payment_date')).select_related(
+        "customer"
+    ).order_by('cheque_detail', 'payment_date')
+    grouped_invoices = {}
+    for invoice in invoices:
+        cheque_detail = invoice.cheque_detail
+        if cheque_detail not in grouped_invoices:
+            grouped_invoices[cheque_detail] = {
+                'invoices': [],
+                'total_price': 0
+            }
+        grouped_invoices[cheque_detail]['invoices'].append(invoice)
+        grouped_invoices[cheque_detail]['total_price'] += invoice.total_price
+    return {"year": year, "month": month, "grouped_invoices": grouped_invoices, **deposit_batch_summary(year, month)}
+
+
+def deposit_batch_summary(year, month):
+    """
+    Deposit batches dated in the month, with their expected and actual totals
+    summed by the database from the per-method totals rather than from the invoices.
+    """
+    period = month_period(year, month)
+    batches = DepositBatch.objects.filter(**period.lookups('date')).annotate(
+        expected_total=Sum('totals__expected'),
+        actual_total=Sum('totals__actual'),
+        missing_actuals=Count('totals', filter=Q(totals__actual__isnull=True)),
+    )
+    labels = dict(Invoice.PAYMENT_TYPE_CHOICES)
+    method_totals = [
+        {**row, 'label': labels.get(row['payment_method'], "Unspecified")}
+        for row in DepositBatchTotal.objects.filter(**period.lookups('batch__date')).values('payment_method').annotate(
+            expected=Sum('expected'), actual=Sum('actual')).order_by('payment_method')
+    ]
+    return {"deposit_batches": list(batches), "deposit_method_totals": method_totals}
+
+
+def salesman_monthly_report_context(year, month, salesman):
+    current_date = datetime.now()
+    # Prevent showing the current month's commission report
+    show_commission_summary = not (year == current_date.year and month == current_date.month)
+    breadcrumbs = [
+        {"name": "Salesmen", "url": reverse("salesman_list")},
+        {"name": salesman.name, "url": reverse("salesman_monthly_preview", kwargs={"salesman_id": salesman.id})},
+        {"name": f"{year}-{month} Report", "url": ""},
+    ]
+    invoices = Invoice.objects.filter(
+        salesman=salesman, **month_period(year, month).lookups('delivery_date')
+    ).select_related('customer', 'salesman').prefetch_related("invoiceitem_set__product")
+    weeks, monthly_total = _weekly_invoices(invoices)
+
+    rules = load_rules()
+    commission = month_commission(salesman.id, year, month, rules)
+    return {"weeks": weeks, "year": year, "month": month, "monthly_total": monthly_total,
+            "salesman": salesman, "commission": commission.commission,
+            "monthly_total_share": commission.pooled_sales,
+            "monthly_total_share_percentage": commission.share_percentage,
+            "personal_monthly_total_share": commission.shared_sales,
+            "sales_monthly_total": commission.qualifying_sales,
+            "incentive_percentage": commission.rate,
+            "commission_eligible": salesman.id in rules.shares,
+            "commission_tiers": rules.tier_table(commission.qualifying_sales),
+            "commission_multiplier": COMMISSION_MULTIPLIER,
+            "commission_shares": CommissionShare.objects.select_related('salesman').order_by('-percentage'),
+            "show_commission_summary": show_commission_summary,
+            "breadcrumbs": breadcrumbs}
+
+
+def deliveryman_monthly_report_context(year, month, deliveryman):
+    breadcrumbs = [
+        {"name": "Deliverymen", "url": reverse("deliveryman_list")},
+        {"name": deliveryman.name,
+         "url": reverse("deliveryman_monthly_preview", kwargs={"deliveryman_id": deliveryman.id})},
+        {"name": f"{year}-{month:02d} Report", "url": ""},
+    ]
+    invoices = Invoice.objects.filter(
+        deliveryman=deliveryman,
+        **month_period(year, month).lookups('delivery_date')
+    ).select_related('customer').prefetch_related('invoiceitem_set__product').order_by('delivery_date')
+
+    daily_groups = defaultdict(list)
+    for invoice in invoices:
+        daily_groups[invoice.delivery_date].append(invoice)
+
+        grouped = defaultdict(list)
+        for item in invoice.invoiceitem_set.all():
+            if item.product:
+                grouped[LOT_NUMBER.sub("", item.product.name).strip()].append(str(item.quantity))
+        invoice.display_items = [f"{name} ({' + '.join(qtys)})" for name, qtys in grouped.items()]
+
+    return {
+        "deliveryman": deliveryman,
+        "year": year,
+        "month": month,
+        "daily_groups": sorted(daily_groups.items()),
+        "breadcrumbs": breadcrumbs,
+        "total_monthly_invoices": sum(len(invoices) for invoices in daily_groups.values()),
+    }
+
+
+def monthly_analyze_detail_context(year, month, scope=None):
+    invoice_items = (
+        InvoiceItem.objects
+        .filter(**month_period(year, month).lookups('invoice__delivery_date'))
+        .values('product__name', 'sum_price', 'quantity')
+    )
+
+    # Group by cleaned product name (without lot numbers)
+    grouped_products = defaultdict(lambda: {'revenue': 0.0, 'quantity': 0.0})
+    for item in invoice_items:
+        if item['product__name']:
+            clean_name = LOT_NUMBER.sub("", item['product__name'])
+            grouped_products[clean_name]['revenue'] += float(item['sum_price'] or 0)
+            grouped_products[clean_name]['quantity'] += float(item['quantity'] or 0)
+
+    product_analysis = [
+        {'name': name, 'revenue': data['revenue'], 'quantity': data['quantity']}
+        for name, data in sorted(grouped_products.items(), key=lambda x: x[1]['revenue'], reverse=True)
+    ]
+    return {
+        'year': year,
+        'month': month,
+        'month_name': datetime(year, month, 1).strftime('%B %Y'),
+        'product_analysis': product_analysis,
+        'total_revenue': sum(p['revenue'] for p in product_analysis),
+        'total_products': len(product_analysis),
+    }
+
+
+class Report(NamedTuple):
+    context: Callable  # (year, month, scope) -> template context
+    scope_model: type = None  # Salesman or Deliveryman for the per-person reports
+    by_payment_date: bool = False  # Whether the report's month is that of the payments rather than the deliveries
+
+
+REPORTS = {
+    'monthly_report': Report(monthly_report_context),
+    'monthly_payment_report': Report(monthly_payment_report_context, by_payment_date=True),
+    'salesman_monthly_report': Report(salesman_monthly_report_context, Salesman),
+    'deliveryman_monthly_report': Report(deliveryman_monthly_report_context, Deliveryman),
+    'monthly_analyze_detail': Report(monthly_analyze_detail_context),
+}
+
+
+def build_report(name, year, month, scope=None):
+    """Render the body of a report from the current data."""
+    return render_to_string(f"invoice/reports/{name}.html", REPORTS[name].context(year, month, scope))
+
+
+def closed_periods():
+    """
+    ``(year, month)`` pairs of the closed months, cached until one is closed or
+    reopened. Only the views read this: a close in another process may not have
+    reached the cache yet, so the write paths ask ``ClosedPeriod`` itself.
+    """
+    periods = cache.get(CLOSED_PERIODS_KEY)
+    if periods is None:
+        periods = frozenset(ClosedPeriod.objects.using(DEFAULT_DB_ALIAS).values_list('year', 'month'))
+        cache.set(CLOSED_PERIODS_KEY, periods, CLOSED_PERIODS_TIMEOUT)
+    return periods
+
+
+def _store_snapshot(name, year, month, scope_id, html, version=None):
+    """Store a rebuilt snapshot unless it was marked stale again since ``version`` was read."""
+    snapshots = ReportSnapshot.objects.using(DEFAULT_DB_ALIAS)
+    key = {'report': name, 'year': year, 'month': month, 'scope_id': scope_id}
+    if version is None:
+        snapshots.update_or_create(**key, defaults={'html': html, 'stale': False, 'built_at': timezone.now()})
+    else:
+        snapshots.filter(**key, version=version).update(html=html, stale=False, built_at=timezone.now())
+
+
+def render_report(name, year, month, scope=None):
+    """
+    Body of a report as safe HTML: the snapshot of a closed month when it is
+    fresh, otherwise rendered now, and stored when the month is closed.
+    """
+    year, month = int(year), int(month)
+    if (year, month) not in closed_periods():
+        return mark_safe(build_report(name, year, month, scope))
+
+    scope_id = scope.pk if scope is not None else 0
+    # Snapshots are read from the primary: a lagging replica could still show a stale one as fresh
+    snapshot = ReportSnapshot.objects.using(DEFAULT_DB_ALIAS).filter(
+        report=name, year=year, month=month, scope_id=scope_id).values('html', 'stale', 'version').first()
+    if snapshot and not snapshot['stale']:
+        return mark_safe(snapshot['html'])
+
+    with reading_from_primary():
+        html = build_report(name, year, month, scope)
+    _store_snapshot(name, year, month, scope_id, html, snapshot['version'] if snapshot else None)
+    return mark_safe(html)
+
+
+def close_period(year, month):
+    """Close a month and snapshot all its reports, per salesman and deliveryman included."""
+    with reading_from_primary():
+        ClosedPeriod.objects.using(DEFAULT_DB_ALIAS).get_or_create(year=year, month=month)
+        count = 0
+        for name, report in REPORTS.items():
+            scopes = report.scope_model.objects.using(DEFAULT_DB_ALIAS).all() if report.scope_model else [None]
+            for scope in scopes:
+                html = build_report(name, year, month, scope)
+                _store_snapshot(name, year, month, scope.pk if scope is not None else 0, html)
+                count += 1
+    cache.delete(CLOSED_PERIODS_KEY)
+    return count
+
+
+def reopen_period(year, month):
+    """Reopen a month: its reports are computed on every view again."""
+    ClosedPeriod.objects.using(DEFAULT_DB_ALIAS).filter(year=year, month=month).delete()
+    ReportSnapshot.objects.using(DEFAULT_DB_ALIAS).filter(year=year, month=month).delete()
+    cache.delete(CLOSED_PERIODS_KEY)
+
+
+def rebuild_stale_snapshots():
+    """Rebuild every stale snapshot; returns how many were rebuilt."""
+    scope_models = {name: report.scope_model for name, report in REPORTS.items()}
+    stale = ReportSnapshot.objects.using(DEFAULT_DB_ALIAS).filter(stale=True).values_list(
+        'report', 'year', 'month', 'scope_id', 'version')
+    count = 0
+    with reading_from_primary():
+        for name, year, month, scope_id, version in stale:
+            model = scope_models[name]
+            scope = model.objects.using(DEFAULT_DB_ALIAS).filter(pk=scope_id).first() if model else None
+            if model and scope is None:  # The salesman or deliveryman is gone
+                ReportSnapshot.objects.using(DEFAULT_DB_ALIAS).filter(
+                    report=name, year=year, month=month, scope_id=scope_id).delete()
+                continue
+            _store_snapshot(name, year, month, scope_id, build_report(name, year, month, scope), version)
+            count += 1
+    return count
+
+
+def mark_stale(delivery_months=(), payment_months=(), using=DEFAULT_DB_ALIAS):
+    """Mark stale the snapshots of the closed months among those given, with one UPDATE."""
+    if not (delivery_months or payment_months):
+        return
+    closed = set(ClosedPeriod.objects.using(using).values_list('year', 'month'))
+    delivery_months = {month for month in delivery_months if month in closed}
+    payment_months = {month for month in payment_months if month in closed}
+    if not (delivery_months or payment_months):
+        return
+    by_payment_date = [name for name, report in REPORTS.items() if report.by_payment_date]
+    condition = Q(pk__in=[])
+    for year, month in delivery_months:
+        condition |= Q(year=year, month=month) & ~Q(report__in=by_payment_date)
+    for year, month in payment_months:
+        condition |= Q(year=year, month=month, report__in=by_payment_date)
+    ReportSnapshot.objects.using(using).filter(condition).update(stale=True, version=F('version') + 1)
+
+
+def _months(*dates):
+    return {(day.year, day.month) for day in dates if day}
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def mark_changed_reports_stale(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if instance.pk in invoices_being_deleted.get():  # Marked in one batch
+        return
+    # Found by models.remember_previous_invoice, and only valid for the save that follows it
+    any_closed, instance._any_closed_period = getattr(instance, '_any_closed_period', None), None
+    if any_closed is False:
+        return
+    # The months an invoice moves out of go stale too
+    previous = getattr(instance, '_previous_invoice', None) or {}
+    mark_stale(_months(instance.delivery_date, previous.get('delivery_date')),
+               _months(instance.payment_date, previous.get('payment_date')), using)
+
+
+@receiver(pre_save, sender=DepositBatch)
+def remember_batch_month(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    instance._previous_batch_date = None
+    if instance.pk and not raw and ClosedPeriod.objects.using(using).exists():
+        instance._previous_batch_date = DepositBatch.objects.using(using).filter(pk=instance.pk).values_list(
+            'date', flat=True).first()
+
+
+@receiver(post_save, sender=DepositBatch)
+@receiver(post_delete, sender=DepositBatch)
+def mark_batch_reports_stale(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """The payment report lists the deposit batches dated in its month."""
+    mark_stale(payment_months=_months(instance.date, getattr(instance, '_previous_batch_date', None)), using=using)
+
+
+@receiver(post_save, sender=DepositBatchTotal)
+@receiver(post_delete, sender=DepositBatchTotal)
+def mark_batch_total_reports_stale(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if ClosedPeriod.objects.using(using).exists():
+        mark_stale(payment_months=_months(instance.batch.date), using=using)
+
+
+@receiver(post_save, sender=CommissionTier)
+@receiver(post_delete, sender=CommissionTier)
+@receiver(post_save, sender=CommissionShare)
+@receiver(post_delete, sender=CommissionShare)
+@receiver(post_save, sender=SharedSalesAccount)
+@receiver(post_delete, sender=SharedSalesAccount)
+def mark_commission_reports_stale(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Commission rules are not dated: a change shows in every salesman report."""
+    ReportSnapshot.objects.using(using).filter(report='salesman_monthly_report').update(
+        stale=True, version=F('version') + 1)
+
+
+@receiver(post_save, sender=ClosedPeriod)
+@receiver(post_delete, sender=ClosedPeriod)
+def invalidate_closed_periods(sender, **kwargs):
+    cache.delete(CLOSED_PERIODS_KEY)
+    transaction.on_commit(lambda: cache.delete(CLOSED_PERIODS_KEY))
@@ -0,0 +1,336 @@
+"""
+Utility functions for the full-text search index.
+
+Customers, products and invoices are indexed in one ``invoice_search`` table:
+an FTS5 virtual table on SQLite, and a table with a generated ``tsvector``
+column and a GIN index on PostgreSQL. Save and delete signals keep it in sync,
+skipping saves that leave the indexed fields as they were loaded, such as
+stock and total updates. Searches match word prefixes, rank matches by the column they hit, and match
+any run of digits within a phone number, whatever its spacing.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Customer, Invoice, Product, invoices_being_deleted
+
+SEARCH_TABLE = 'invoice_search'
+
+# Indexed columns with their PostgreSQL weight class and SQLite bm25 weight
+SEARCH_COLUMNS = {
+    'title': ('A', 10.0),
+    'subtitle': ('C', 5.0),
+    'body': ('D', 2.0),
+    'phone': ('B', 8.0),
+}
+# ts_rank weights are given in {D, C, B, A} order
+POSTGRESQL_WEIGHTS = '{0.2, 0.5, 0.8, 1.0}'
+
+# Kind codes also key the SQLite rowid, so that an entry is replaced without scanning the index
+KINDS = {'customer': 1, 'product': 2, 'invoice': 3}
+MODEL_KINDS = {Customer: 'customer', Product: 'product', Invoice: 'invoice'}
+
+# Fields each kind's entry is built from, and the customer fields its invoices' entries repeat
+INDEXED_FIELDS = {
+    Customer: ('name', 'care_of', 'address', 'telephone_number'),
+    Product: ('name', 'name_alias', 'supplier', 'registration_code'),
+    Invoice: ('number', 'order_number', 'customer_id'),
+}
+CUSTOMER_INVOICE_FIELDS = ('name', 'care_of')
+
+PHONE_QUERY_RE = re.compile(r'^[\d\s()+-]+$')
+# Shortest run of digits searched as a phone number
+MIN_PHONE_DIGITS = 3
+
+
+def normalize_phone(value):
+    """
+    Index tokens for a phone number: every suffix of its digits, so that the
+    prefix match used for all terms finds any run of digits inside the number.
+    """
+    digits = re.sub(r'\D', '', value or '')
+    return " ".join(digits[start:] for start in range(max(len(digits) - MIN_PHONE_DIGITS + 1, 1)))
+
+
+def query_terms(query):
+    """
+    Split a search into lowercase word prefixes.
+
+    A search made only of digits and phone punctuation, such as
+    ``+852 2345-6789``, becomes a single run of digits.
+    """
+    query = (query or '').strip()
+    if PHONE_QUERY_RE.match(query) and sum(char.isdigit() for char in query) >= MIN_PHONE_DIGITS:
+        return [re.sub(r'\D', '', query)]
+    return [term.lower() for term in re.findall(r'\w+', query)]
+
+
+def search_entry(instance):
+    """Return the (title, subtitle, body, phone) texts indexed for a customer, product or invoice."""
+    if isinstance(instance, Customer):
+        return instance.name, instance.care_of, instance.address, normalize_phone(instance.telephone_number)
+    if isinstance(instance, Product):
+        details = " ".join(filter(None, [instance.supplier, instance.registration_code]))
+        return instance.name, instance.name_alias, details, ''
+    customer = instance.customer
+    return " ".join(filter(None, [instance.number, instance.order_number])), customer.name, customer.care_of, ''
+
+
+def _rowid(kind, pk):
+    return pk * len(KINDS) + KINDS[kind]
+
+
+def create_search_table(connection):
+    """Create the search index table on ``connection`` if it does not exist yet."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            document = " || ".join(
+                f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+                for column, (weight, _) in SEARCH_COLUMNS.items()
+            )
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"kind varchar(16) NOT NULL, object_id bigint NOT NULL, "
+                f"{', '.join(f'{column} text' for column in SEARCH_COLUMNS)}, "
+                f"document tsvector GENERATED ALWAYS AS ({document}) STORED, "
+                f"PRIMARY KEY (kind, object_id))"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)")
+        else:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                f"kind UNINDEXED, object_id UNINDEXED, {', '.join(SEARCH_COLUMNS)}, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+
+
+def index_objects(model, objects, using=DEFAULT_DB_ALIAS):
+    """Add or replace the index entries of ``objects`` (instances of one indexed model)."""
+    kind = MODEL_KINDS[model]
+    rows = [(kind, instance.pk, *[value or '' for value in search_entry(instance)]) for instance in objects]
+    if not rows:
+        return
+    connection = connections[using]
+    columns = ", ".join(SEARCH_COLUMNS)
+    placeholders = ", ".join(["%s"] * len(SEARCH_COLUMNS))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in SEARCH_COLUMNS)
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (kind, object_id, {columns}) VALUES (%s, %s, {placeholders}) "
+                f"ON CONFLICT (kind, object_id) DO UPDATE SET {updates}",
+                rows,
+            )
+        else:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(_rowid(kind, row[1]),) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, {columns}) VALUES (%s, %s, %s, {placeholders})",
+                [(_rowid(kind, row[1]), *row) for row in rows],
+            )
+
+
+def remove_objects(model, pks, using=DEFAULT_DB_ALIAS):
+    """Remove the index entries of the ``model`` rows with primary keys ``pks``."""
+    kind = MODEL_KINDS[model]
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE kind = %s AND object_id = %s",
+                               [(kind, pk) for pk in pks])
+        else:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(_rowid(kind, pk),) for pk in pks])
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS, batch_size=2000):
+    """
+    Re-create every index entry from the model tables.
+
+    Returns:
+        dict: entries written per kind
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    counts = {}
+    for model, kind in MODEL_KINDS.items():
+        queryset = model._default_manager.using(using).order_by('pk')
+        if model is Invoice:
+            queryset = queryset.select_related('customer')
+        batch, counts[kind] = [], 0
+        for instance in queryset.iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) >= batch_size:
+                index_objects(model, batch, using)
+                counts[kind], batch = counts[kind] + len(batch), []
+        index_objects(model, batch, using)
+        counts[kind] += len(batch)
+    return counts
+
+
+def match_expression(connection, terms, columns=None):
+    """Build the FTS5 MATCH string or PostgreSQL tsquery for prefix ``terms``, optionally limited to ``columns``."""
+    columns = columns or []
+    if connection.vendor == 'postgresql':
+        weights = "".join(SEARCH_COLUMNS[column][0] for column in columns)
+        return " & ".join(f"{term}:*{weights}" for term in terms)
+    expression = " AND ".join(f'"{term}"*' for term in terms)
+    return f"{{{' '.join(columns)}}} : ({expression})" if columns else expression
+
+
+def search_queryset(queryset, query, columns=None):
+    """
+    Restrict a customer, product or invoice ``queryset`` to the rows matching ``query``.
+
+    Args:
+        columns: index columns to search (``title``, ``subtitle``, ``body``,
+            ``phone``); all of them by default
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+    connection = connections[queryset.db]
+    kind = MODEL_KINDS[queryset.model]
+    match = match_expression(connection, terms, columns)
+    if connection.vendor == 'postgresql':
+        sql = f"SELECT object_id FROM {SEARCH_TABLE} WHERE kind = %s AND document @@ to_tsquery('simple', %s)"
+        params = (kind, match)
+    else:
+        sql = f"SELECT object_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s"
+        params = (match, kind)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def ranked_search(queryset, query, columns=None):
+    """Like ``search_queryset``, ordered by relevance, best match first."""
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+    connection = connections[queryset.db]
+    kind = MODEL_KINDS[queryset.model]
+    match = match_expression(connection, terms, columns)
+    meta = queryset.model._meta
+    outer_pk = f"{connection.ops.quote_name(meta.db_table)}.{connection.ops.quote_name(meta.pk.column)}"
+    if connection.vendor == 'postgresql':
+        rank = RawSQL(
+            f"SELECT -ts_rank('{POSTGRESQL_WEIGHTS}', document, to_tsquery('simple', %s)) FROM {SEARCH_TABLE} "
+            f"WHERE kind = %s AND object_id = {outer_pk}",
+            (match, kind),
+        )
+    else:
+        weights = ", ".join(str(weight) for _, weight in SEARCH_COLUMNS.values())
+        rank = RawSQL(
+            f"SELECT bm25({SEARCH_TABLE}, 0, 0, {weights}) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE}.rowid = {outer_pk} * {len(KINDS)} + {KINDS[kind]} AND {SEARCH_TABLE} MATCH %s",
+            (match,),
+        )
+    # Lower is better for both bm25 and the negated ts_rank
+    return search_queryset(queryset, query, columns).annotate(search_rank=rank).order_by(F('search_rank').asc(), 'pk')
+
+
+def search(query, kinds=None, limit=20, using=DEFAULT_DB_ALIAS):
+    """
+    Search every indexed kind at once.
+
+    Returns:
+        list: dicts with kind, id, title, subtitle and rank, best match first
+    """
+    terms = query_terms(query)
+    kinds = list(kinds or KINDS)
+    if not terms or not kinds:
+        return []
+    connection = connections[using]
+    match = match_expression(connection, terms)
+    kind_placeholders = ", ".join(["%s"] * len(kinds))
+    if connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT kind, object_id, title, subtitle, "
+            f"-ts_rank('{POSTGRESQL_WEIGHTS}', document, to_tsquery('simple', %s)) AS rank FROM {SEARCH_TABLE} "
+            f"WHERE document @@ to_tsquery('simple', %s) AND kind IN ({kind_placeholders}) ORDER BY rank LIMIT %s"
+        )
+        params = [match, match, *kinds, limit]
+    else:
+        weights = ", ".join(str(weight) for _, weight in SEARCH_COLUMNS.values())
+        sql = (
+            f"SELECT kind, object_id, title, subtitle, bm25({SEARCH_TABLE}, 0, 0, {weights}) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind IN ({kind_placeholders}) "
+            f"ORDER BY rank LIMIT %s"
+        )
+        params = [match, *kinds, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {'kind': kind, 'id': object_id, 'title': title, 'subtitle': subtitle, 'rank': rank}
+            for kind, object_id, title, subtitle, rank in cursor.fetchall()
+        ]
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Create the search table once the invoice tables exist."""
+    if sender.label == 'invoice' and router.allow_migrate(using, 'invoice'):
+        create_search_table(connections[using])
+
+
+def _indexed_values(instance):
+    """Indexed field values of ``instance``; deferred fields are left out."""
+    return {field: instance.__dict__[field] for field in INDEXED_FIELDS[type(instance)] if field in instance.__dict__}
+
+
+@receiver(post_init, sender=Customer)
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Invoice)
+def remember_indexed_values(sender, instance, **kwargs):
+    instance._indexed_values = _indexed_values(instance)
+
+
+@receiver(pre_save, sender=Customer)
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Invoice)
+def forget_unloaded_values(sender, instance, **kwargs):
+    """An instance built with a primary key rather than loaded holds no proof of what is indexed."""
+    if instance._state.adding:
+        instance._indexed_values = None
+
+
+def _changed_fields(instance, update_fields):
+    """Indexed fields of ``instance`` that may differ from its entry."""
+    fields = INDEXED_FIELDS[type(instance)]
+    previous = getattr(instance, '_indexed_values', None)
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields or field.removesuffix('_id') in update_fields]
+    if previous is None:
+        return set(fields)
+    current = _indexed_values(instance)
+    return {field for field in fields if field not in previous or previous[field] != current.get(field)}
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Invoice)
+def index_saved_object(sender, instance, raw=False, update_fields=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Refresh the saved object's entry; a customer's invoices are indexed under its name too."""
+    if raw:  # Fixture and import loads are indexed by rebuild_search_index
+        return
+    changed = _changed_fields(instance, update_fields)
+    if not changed:
+        return
+    index_objects(sender, [instance], using)
+    if sender is Customer and changed & set(CUSTOMER_INVOICE_FIELDS):
+        invoices = list(Invoice.objects.using(using).filter(customer=instance))
+        for invoice in invoices:
+            invoice.customer = instance
+        index_objects(Invoice, invoices, using)
+    instance._indexed_values = _indexed_values(instance)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Invoice)
+def unindex_deleted_object(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender is Invoice and instance.pk in invoices_being_deleted.get():  # Removed in one batch
+        return
+    remove_objects(sender, [instance.pk], using)
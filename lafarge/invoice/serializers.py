@@ -1,8 +1,11 @@
 """Django REST Framework serializers for the invoice application."""
 
+from decimal import Decimal
+
 from rest_framework import serializers
 
 from .models import *
+from .models import extract_base_name, extract_lot_number
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -45,3 +48,79 @@ class AdditionalItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = AdditionalItem
         fields = '__all__'
+
+
+class QuoteLineSerializer(serializers.Serializer):
+    """One line of a draft order to price."""
+    product = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=1, min_value=0)
+    product_type = serializers.ChoiceField(choices=InvoiceItem.PRODUCT_TYPE_CHOICES, default='normal')
+    net_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=Decimal('0.00'))
+
+
+class QuoteSerializer(serializers.Serializer):
+    """Draft order to price: a customer and its lines."""
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all())
+    lines = QuoteLineSerializer(many=True, allow_empty=False)
+
+
+# Read-optimised invoice output built from values() rows instead of DRF field introspection
+INVOICE_READ_FIELDS = (
+    'id', 'number', 'terms', 'sample_customer', 'delivery_date', 'payment_date', 'deposit_date',
+    'payment_method', 'cheque_detail', 'total_price', 'order_number',
+)
+RELATED_READ_FIELDS = {
+    'customer': ('id', 'name', 'care_of', 'address', 'telephone_number', 'terms'),
+    'salesman': ('id', 'code', 'name'),
+    'deliveryman': ('id', 'code', 'name'),
+}
+ITEM_READ_FIELDS = ('id', 'invoice_id', 'product_id', 'product__name', 'quantity', 'price', 'net_price',
+                    'sum_price', 'product_type', 'hide_nett')
+ADDITIONAL_ITEM_READ_FIELDS = ('id', 'invoice_id', 'description', 'price')
+
+
+def _plain(value):
+    """Match DRF's output: decimals as strings, everything else as is."""
+    return str(value) if isinstance(value, Decimal) else value
+
+
+def serialize_invoices(invoices):
+    """
+    Serialize invoices with their customer, salesman, deliveryman, items and additional items embedded.
+
+    Runs three queries whatever the number of invoices: the invoices joined
+    to their related rows, then all their items, then all their additional
+    items.
+
+    Args:
+        invoices: Invoice queryset, already filtered, ordered and sliced
+
+    Returns:
+        list: one dict per invoice
+    """
+    related_fields = [f'{relation}__{field}' for relation, fields in RELATED_READ_FIELDS.items() for field in fields]
+    rows = list(invoices.values(*INVOICE_READ_FIELDS, *related_fields))
+    results, by_id = [], {}
+    for row in rows:
+        invoice = {field: _plain(row[field]) for field in INVOICE_READ_FIELDS}
+        for relation, fields in RELATED_READ_FIELDS.items():
+            related = {field: row[f'{relation}__{field}'] for field in fields}
+            invoice[relation] = related if related['id'] is not None else None
+        invoice['items'], invoice['additional_items'] = [], []
+        results.append(invoice)
+        by_id[invoice['id']] = invoice
+
+    if not by_id:
+        return results
+    items = InvoiceItem.objects.using(invoices.db).filter(invoice_id__in=by_id).order_by('id')
+    for row in items.values(*ITEM_READ_FIELDS):
+        name = row.pop('product__name')
+        item = {field: _plain(value) for field, value in row.items() if field != 'invoice_id'}
+        item.update(product_name=name, base_name=extract_base_name(name), lot_number=extract_lot_number(name))
+        by_id[row['invoice_id']]['items'].append(item)
+    additional_items = AdditionalItem.objects.using(invoices.db).filter(invoice_id__in=by_id).order_by('id')
+    for row in additional_items.values(*ADDITIONAL_ITEM_READ_FIELDS):
+        by_id[row['invoice_id']]['additional_items'].append(
+            {field: _plain(value) for field, value in row.items() if field != 'invoice_id'}
+        )
+    return results
@@ -0,0 +1,23 @@
+"""
+SQLite database backend that starts write transactions with BEGIN IMMEDIATE.
+
+A deferred transaction that reads before it writes has to upgrade its lock
+mid-transaction, and SQLite fails that upgrade with "database is locked"
+instead of waiting on the busy timeout. Taking the write lock up front lets
+concurrent admin saves queue behind each other while readers continue in WAL
+mode.
+"""
+
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+from ..sqlite_utils import tuning_enabled
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        if settings.SQLITE_IMMEDIATE_TRANSACTIONS and tuning_enabled(self):
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,72 @@
+"""
+Utility functions for tuning and copying SQLite databases.
+
+Applies the SQLite performance profile from settings (WAL journal, relaxed
+syncs, busy timeout, larger page cache and memory-mapped reads) to every new
+connection, and copies live databases with the online backup API.
+"""
+
+import sqlite3
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def tuning_enabled(connection):
+    """
+    Whether the SQLite profile applies to ``connection``.
+
+    A database entry can opt out with ``'SQLITE_TUNING': False``; in-memory
+    databases (the test suite) are never tuned.
+    """
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return False
+    return connection.settings_dict.get('SQLITE_TUNING', settings.SQLITE_TUNING_ENABLED)
+
+
+def pragma_statements(pragmas=None):
+    """Build the PRAGMA statements for the configured profile."""
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+@receiver(connection_created)
+def apply_sqlite_profile(sender, connection, **kwargs):
+    """Run the profile pragmas on each new SQLite connection; a database entry may override them."""
+    if not tuning_enabled(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(connection.settings_dict.get('SQLITE_PRAGMAS')):
+            cursor.execute(statement)
+
+
+def read_pragmas(connection, names=None):
+    """Return the current value of each profile pragma on ``connection``."""
+    if names is None:
+        names = settings.SQLITE_PRAGMAS
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+def backup_database(source_path, target_path, pages=1024):
+    """
+    Copy a SQLite database file with the online backup API.
+
+    Safe while other connections are reading and writing the source; the copy
+    is a consistent snapshot.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        with target:
+            source.backup(target, pages=pages)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,136 @@
+"""
+Utility functions for the delta-sync change feed.
+
+Every save and delete of a customer, product, invoice or invoice item appends
+a ``SyncChange`` row, whose auto-incrementing ``seq`` is the sync position.
+``changes_since`` returns what changed after a position: the current rows of
+saved objects and the ids of deleted ones (tombstones), so a device catching
+up downloads the changes rather than the whole history.
+
+``QuerySet.update()``, ``bulk_create()`` and raw SQL send no signals, so code
+changing synced rows that way must call ``record_changes`` itself, as the
+deposit batches and the batched invoice deletion do.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Exists, Max, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Customer, Invoice, InvoiceItem, Product, SyncChange, invoices_being_deleted
+
+# Key of the PostgreSQL advisory lock that serializes writes to the change log
+SYNC_LOCK_KEY = 7_246_001
+
+SYNC_MODELS = {'customer': Customer, 'product': Product, 'invoice': Invoice, 'invoiceitem': InvoiceItem}
+MODEL_NAMES = {model: name for name, model in SYNC_MODELS.items()}
+
+
+def record_changes(model, pks, deleted=False, using=DEFAULT_DB_ALIAS):
+    """
+    Log a save (or a delete) of each primary key in ``pks`` with one INSERT.
+
+    On PostgreSQL a transaction holds a lock from its first logged change
+    until it ends, so log rows commit in ``seq`` order and a client never
+    moves past a position whose change is still uncommitted. SQLite already
+    allows only one writer at a time.
+    """
+    changes = [SyncChange(model=MODEL_NAMES[model], object_id=pk, deleted=deleted) for pk in pks]
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        SyncChange.objects.using(using).bulk_create(changes)
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [SYNC_LOCK_KEY])
+        SyncChange.objects.using(using).bulk_create(changes)
+
+
+def _plain(row):
+    return {field: str(value) if isinstance(value, Decimal) else value for field, value in row.items()}
+
+
+def changes_since(since, limit=1000, using=DEFAULT_DB_ALIAS):
+    """
+    Collect the changes logged after position ``since``, reading at most ``limit`` log rows.
+
+    An object changed several times is returned once, in its current state.
+    Objects saved and then deleted are only returned as tombstones.
+
+    Returns:
+        dict: ``changes`` (rows by model name), ``deleted`` (ids by model
+        name), ``next`` (the position to ask from next time) and ``more``
+        (whether more changes are waiting after ``next``)
+    """
+    entries = list(
+        SyncChange.objects.using(using).filter(seq__gt=since).order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'deleted')[:limit]
+    )
+    latest = {(name, object_id): deleted for _, name, object_id, deleted in entries}
+    saved, deleted = defaultdict(list), defaultdict(list)
+    for (name, object_id), is_deleted in latest.items():
+        (deleted if is_deleted else saved)[name].append(object_id)
+
+    changes = {}
+    for name, model in SYNC_MODELS.items():
+        rows = model.objects.using(using).filter(pk__in=saved[name]).order_by('pk').values() if saved[name] else []
+        changes[name] = [_plain(row) for row in rows]
+    return {
+        'changes': changes,
+        'deleted': {name: sorted(deleted[name]) for name in SYNC_MODELS},
+        'next': entries[-1][0] if entries else since,
+        'more': len(entries) == limit,
+    }
+
+
+def log_unlogged_objects(using=DEFAULT_DB_ALIAS, batch_size=2000):
+    """
+    Log a save for every synced object without any change yet, such as rows
+    from bulk loads, so that a sync from position 0 is a full download.
+
+    Returns:
+        dict: number of objects logged per model name
+    """
+    counts = {}
+    for name, model in SYNC_MODELS.items():
+        logged = SyncChange.objects.using(using).filter(model=name, object_id=OuterRef('pk'))
+        pks = list(model.objects.using(using).filter(~Exists(logged)).order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(pks), batch_size):
+            record_changes(model, pks[start:start + batch_size], using=using)
+        counts[name] = len(pks)
+    return counts
+
+
+def compact_changes(using=DEFAULT_DB_ALIAS):
+    """
+    Delete the changes superseded by a later change of the same object.
+
+    Clients lose nothing: whatever their position, the latest change of each
+    object is still ahead of it or already behind it. Returns the number of
+    rows deleted.
+    """
+    latest = SyncChange.objects.using(using).values('model', 'object_id').annotate(last=Max('seq')).values('last')
+    deleted, _ = SyncChange.objects.using(using).exclude(seq__in=latest).delete()
+    return deleted
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=InvoiceItem)
+def log_saved_object(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    record_changes(sender, [instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=InvoiceItem)
+def log_deleted_object(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    invoice_id = instance.pk if sender is Invoice else getattr(instance, 'invoice_id', None)
+    if invoice_id in invoices_being_deleted.get():  # Logged in one batch
+        return
+    record_changes(sender, [instance.pk], deleted=True, using=using)
@@ -9,15 +9,27 @@ import django_tables2 as tables
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django_filters import FilterSet, CharFilter, DateFilter, DateTimeFilter
+from django_filters.constants import EMPTY_VALUES
 from django_tables2.export.views import ExportMixin
 from django_tables2.utils import A
 
 from .models import Customer
 from .models import Invoice
 from .models import ProductTransaction
+from .search_utils import search_queryset
 from .templatetags.custom_filter import currency
 
 
+def items_text(record, with_unit=False):
+    """Plain-text version of the items lists, for exports."""
+    lines = []
+    for item in record.invoiceitem_set.all():
+        quantity = f"{item.quantity} {item.product.unit or ''}".rstrip() if with_unit else f"{item.quantity}"
+        charge = f"${item.price}" if item.product_type == "normal" else f"({item.product_type})"
+        lines.append(f"{item.product.name}: {quantity} @ {charge}")
+    return "; ".join(lines)
+
+
 class CustomerTable(tables.Table):
     name = tables.LinkColumn(
         'customer_detail', args=[A('name'), A('care_of')],
@@ -45,11 +57,25 @@ class CustomerTable(tables.Table):
         fields = ("name", "care_of", "address", "office_hour", "telephone_number")
 
 
+class SearchIndexFilter(CharFilter):
+    """Match word prefixes through the full-text search index, optionally within some index columns."""
+
+    def __init__(self, *args, columns=None, **kwargs):
+        self.columns = columns
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return search_queryset(qs, value, self.columns)
+
+
 class CustomerFilter(FilterSet):
-    name = CharFilter(field_name='name', lookup_expr='icontains', label="Customer Name")
-    care_of = CharFilter(field_name='care_of', lookup_expr='icontains', label="Care Of")
-    address = CharFilter(field_name='address', lookup_expr='icontains', label="Address")
-    telephone_number = CharFilter(field_name='telephone_number', lookup_expr='icontains', label="Telephone Number")
+    search = SearchIndexFilter(label="Search")
+    name = SearchIndexFilter(columns=['title'], label="Customer Name")
+    care_of = SearchIndexFilter(columns=['subtitle'], label="Care Of")
+    address = SearchIndexFilter(columns=['body'], label="Address")
+    telephone_number = SearchIndexFilter(columns=['phone'], label="Telephone Number")
 
     class Meta:
         model = Customer
@@ -95,8 +121,9 @@ class InvoiceTable(tables.Table):
 
 
 class InvoiceFilter(FilterSet):
-    customer_name = CharFilter(field_name='customer__name', lookup_expr='icontains', label="Customer Name")
-    customer_care_of = CharFilter(field_name='customer__care_of', lookup_expr='icontains', label="Care Of")
+    search = SearchIndexFilter(label="Search")
+    customer_name = SearchIndexFilter(columns=['subtitle'], label="Customer Name")
+    customer_care_of = SearchIndexFilter(columns=['body'], label="Care Of")
     delivery_date = DateFilter(field_name='delivery_date', lookup_expr='gte', label="Delivery Date (From)")
     delivery_date_to = DateFilter(field_name='delivery_date', lookup_expr='lte', label="Delivery Date (To)")
     payment_date = DateFilter(field_name='payment_date', lookup_expr='gte', label="Payment Date (From)")
@@ -159,6 +186,7 @@ class CustomerInvoiceTable(ExportMixin, tables.Table):
         template_name='invoice/copy_order_button.html',
         verbose_name='Copy Order',
         orderable=False,
+        exclude_from_export=True,
         attrs={
             'td': {
                 'class': 'text-center'
@@ -173,6 +201,12 @@ class CustomerInvoiceTable(ExportMixin, tables.Table):
         """Render price with currency formatting and styling."""
         return mark_safe(f"<span class='text-danger fw-bold'>${currency(value)}</span>")
 
+    def value_total_price(self, value):
+        return value
+
+    def value_items(self, record):
+        return items_text(record)
+
     class Meta:
         model = Invoice
         fields = ("number", "total_price", "delivery_date", "payment_date", "items", "copy_order")
@@ -288,7 +322,13 @@ class SalesmanInvoiceTable(ExportMixin, tables.Table):
     def render_total_amount(self, record):
         """Calculate and render total amount for invoice items."""
         return mark_safe(
-            f"<span class='text-danger fw-bold'>${sum(item.sum_price for item in record.invoiceitem_set.all()):,.2f}</span>")
+            f"<span class='text-danger fw-bold'>${self.value_total_amount(record):,.2f}</span>")
+
+    def value_total_amount(self, record):
+        return sum(item.sum_price for item in record.invoiceitem_set.all())
+
+    def value_items(self, record):
+        return items_text(record, with_unit=True)
 
     class Meta:
         model = Invoice
@@ -1 +1,27 @@
-from .test_number_generation import *
\ No newline at end of file
+from .test_number_generation import *
+from .test_query_counts import *
+from .test_import_sqlite import *
+from .test_db_routers import *
+from .test_period_utils import *
+from .test_index_advisor import *
+from .test_search_utils import *
+from .test_product_picker import *
+
+from .test_admin_changelists import *
+from .test_invoice_deletion import *
+from .test_invoice_read_api import *
+from .test_sync_api import *
+from .test_commission_utils import *
+from .test_price_book import *
+from .test_pricing_utils import *
+from .test_table_export import *
+from .test_report_snapshots import *
+from .test_view_cache import *
+from .test_dashboard_events import *
+from .test_async_views import *
+from .test_deposit_utils import *
+from .test_deposit_batches import *
+from .test_profiling import *
+from .test_metrics import *
+from .test_benchmark_utils import *
+from .test_sqlite_backend import *
\ No newline at end of file
@@ -0,0 +1,112 @@
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Customer, Invoice, Product, ProductTransaction
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_admin_changelists
+
+class AdminChangelistTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('changelist', 'changelist@example.com', 'password')
+        cls.customers = Customer.objects.bulk_create(
+            Customer(name=f"Customer {index}", address="Nathan Road") for index in range(40)
+        )
+        cls.product = Product.objects.create(name="Amoxil 500mg", quantity=100)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_invoices(self, count):
+        start = Invoice.objects.count()
+        Invoice.objects.bulk_create(
+            Invoice(number=str(1000 + index), customer=self.customers[index % 40], delivery_date=date(2025, 1, 1))
+            for index in range(start, start + count)
+        )
+
+    def add_transactions(self, count):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        ProductTransaction.objects.bulk_create(
+            ProductTransaction(product=self.product, transaction_type='sale', change=-1,
+                               quantity_after_transaction=100, timestamp=start + timedelta(hours=index))
+            for index in range(count)
+        )
+
+    def changelist(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_invoice_changelist_queries_do_not_grow(self):
+        self.add_invoices(5)
+        self.changelist('/admin/invoice/invoice/')
+        _, few = self.changelist('/admin/invoice/invoice/')
+        self.add_invoices(35)
+        _, many = self.changelist('/admin/invoice/invoice/')
+        self.assertEqual(len(few), len(many))
+
+    def test_transaction_changelist_queries_do_not_grow(self):
+        self.add_transactions(5)
+        self.changelist('/admin/invoice/producttransaction/')
+        _, few = self.changelist('/admin/invoice/producttransaction/')
+        self.add_transactions(200)
+        _, many = self.changelist('/admin/invoice/producttransaction/')
+        self.assertEqual(len(few), len(many))
+
+    def test_transaction_log_pages_with_cursor(self):
+        self.add_transactions(12)
+        newest_first = list(ProductTransaction.objects.order_by('-timestamp', '-id').values_list('pk', flat=True))
+
+        pages = []
+        url = '/admin/invoice/producttransaction/'
+        with mock.patch.object(admin.site._registry[ProductTransaction], 'list_per_page', 5):
+            while url:
+                response, queries = self.changelist(url)
+                cl = response.context['cl']
+                pages.append([transaction.pk for transaction in cl.result_list])
+                self.assertFalse([sql for sql in queries if 'OFFSET' in sql])
+                url = cl.next_page_url and '/admin/invoice/producttransaction/' + cl.next_page_url
+        self.assertEqual(pages, [newest_first[:5], newest_first[5:10], newest_first[10:]])
+
+    def test_sorted_transaction_log_uses_page_numbers(self):
+        self.add_transactions(3)
+        response, _ = self.changelist('/admin/invoice/producttransaction/', {'o': '3'})
+        self.assertFalse(response.context['cl'].keyset_active)
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_large_unfiltered_changelist_uses_estimated_count(self):
+        self.add_invoices(12)
+        self.analyze()
+        with mock.patch('invoice.pagination_utils.ESTIMATED_COUNT_THRESHOLD', 10):
+            response, queries = self.changelist('/admin/invoice/invoice/')
+            self.assertFalse([sql for sql in queries if 'COUNT(*)' in sql])
+            self.assertEqual(response.context['cl'].result_count, 12)
+
+            # Filtered changelists are counted exactly
+            response, _ = self.changelist('/admin/invoice/invoice/', {'customer__id__exact': self.customers[0].pk})
+            self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_deleted_rows_are_not_counted(self):
+        self.add_invoices(12)
+        Invoice.objects.filter(pk__in=Invoice.objects.order_by('pk').values('pk')[:5]).delete()
+
+        response, _ = self.changelist('/admin/invoice/invoice/')
+        self.assertEqual(response.context['cl'].result_count, 7)
+
+        # Without statistics even a large table is counted exactly
+        with mock.patch('invoice.pagination_utils.ESTIMATED_COUNT_THRESHOLD', 5):
+            response, queries = self.changelist('/admin/invoice/invoice/')
+        self.assertEqual(response.context['cl'].result_count, 7)
+        self.assertTrue([sql for sql in queries if 'COUNT(*)' in sql])
@@ -0,0 +1,88 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from ..metrics_utils import cache_requests, request_queries
+from ..models import Customer, Invoice, InvoiceItem, Product, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_async_views
+
+class AsyncJsonViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('poller', 'poller@example.com', 'password')
+        cls.salesman = Salesman.objects.create(code="DS", name="Dominic So")
+        customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road", salesman=cls.salesman)
+        product = Product.objects.create(name="Amoxil 500mg (Lot no.: A123)", quantity=1000, price=10)
+        for number, delivery_date in (("3001", date(2024, 3, 5)), ("3002", date(2024, 4, 9)), ("3003", localdate())):
+            invoice = Invoice.objects.create(number=number, customer=customer)
+            InvoiceItem.objects.create(invoice=invoice, product=product, quantity=3)
+            invoice.delivery_date = delivery_date
+            invoice.save()
+        cls.urls = [
+            reverse('sales_data'),
+            reverse('product_insights'),
+            reverse('monthly_analyze_api', kwargs={'year': 2024, 'month': 3}),
+            reverse('salesman-monthly-preview', args=["dominic"]),
+            reverse('ProductView'),
+            reverse('CustomerView'),
+            reverse('InvoiceView'),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    async def test_wsgi_and_asgi_answer_alike(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        for url in self.urls:
+            with self.subTest(url=url):
+                wsgi = await sync_to_async(self.client.get)(url)
+                await sync_to_async(cache.clear)()
+                asgi = await self.async_client.get(url)
+                self.assertEqual((wsgi.status_code, asgi.status_code), (200, 200))
+                self.assertEqual(wsgi.json(), asgi.json())
+
+    def test_list_apis_keep_the_drf_rendering(self):
+        [product] = self.client.get(reverse('ProductView')).json()
+        self.assertEqual(product['price'], "10.00")
+        invoices = self.client.get(reverse('InvoiceView')).json()
+        self.assertEqual([invoice['products'] for invoice in invoices], [[product['id']]] * 3)
+
+        response = self.client.post(reverse('ProductView'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response.json(), {'detail': 'Method "POST" not allowed.'})
+
+    def test_salesman_monthly_preview(self):
+        with self.assertNumQueries(2 + 12):  # Salesman, latest delivery and one aggregate per month
+            response = self.client.get(reverse('salesman-monthly-preview', args=["dominic"]))
+        self.assertEqual(response.json()['salesman'], "Dominic So")
+        self.assertTrue(all(month['total'] == 30.0 for month in response.json()['months']))
+
+        response = self.client.get(reverse('salesman-monthly-preview', args=["nobody"]))
+        self.assertEqual((response.status_code, response.json()), (404, {'detail': 'Not found.'}))
+
+    def test_dashboard_endpoints_require_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse('sales_data'))
+        self.assertRedirects(response, f"{reverse('admin:login')}?next={reverse('sales_data')}",
+                             fetch_redirect_response=False)
+
+    async def test_asgi_requests_are_cached_and_measured(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        hits = cache_requests._values.get(("view:sales_data", 'hit'), 0)
+        queries = request_queries._values.get(('sales_data',), {}).get('sum', 0)
+
+        await self.async_client.get(reverse('sales_data'))
+        await self.async_client.get(reverse('sales_data'))
+
+        self.assertEqual(cache_requests._values[("view:sales_data", 'hit')], hits + 1)
+        # The middleware counts the queries the async ORM runs on the request's thread
+        self.assertGreater(request_queries._values[('sales_data',)]['sum'], queries + 3)
@@ -0,0 +1,31 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ..benchmark_utils import capture_queries, percentile, time_callable
+from ..db_routers import REPLICA_ALIAS, reading_from_replica
+from ..models import Invoice
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_benchmark_utils
+
+class BenchmarkUtilsTest(TestCase):
+    databases = {'default', REPLICA_ALIAS}
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([5], 95), 5)
+        self.assertIsNone(percentile([], 50))
+
+    @mock.patch('invoice.db_routers.replica_available', return_value=True)
+    def test_replica_reads_are_counted(self, available):
+        def report():
+            with reading_from_replica():
+                return list(Invoice.objects.all()), Invoice.objects.using('default').count()
+
+        with capture_queries() as queries:
+            report()
+        self.assertEqual([query['alias'] for query in queries], [REPLICA_ALIAS, 'default'])
+
+        _, query_counts, _ = time_callable(report, iterations=2, warmup=0)
+        self.assertEqual(query_counts, [2, 2])
@@ -0,0 +1,123 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from ..commission_utils import (
+    install_commission_rules, install_default_rules, load_rules, month_commission, monthly_commissions,
+)
+from ..models import CommissionShare, CommissionTier, Customer, Invoice, Salesman, SharedSalesAccount
+from ..period_utils import custom_period
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_commission_utils
+
+class CommissionEngineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('accounts', 'accounts@example.com', 'password')
+        cls.salesmen = {
+            code: Salesman.objects.create(code=code, name=name)
+            for code, name in [('DS', 'Dominic So'), ('AC', 'Alex Cheung'), ('MM', 'Matthew Mak'),
+                               ('DS/MM/AC', 'DS/MM/AC'), ('KK', 'Kelvin Ko'), ('Lafarge', 'Lafarge')]
+        }
+        install_default_rules()
+        cls.customers = {
+            code: Customer.objects.create(name=f"Clinic {code}", address="12 Nathan Road", salesman=salesman)
+            for code, salesman in cls.salesmen.items()
+        }
+
+    def sell(self, code, total, day):
+        Invoice.objects.create(number=f"{code}-{Invoice.objects.count()}", customer=self.customers[code],
+                               total_price=total, delivery_date=day)
+
+    def test_default_rules_match_the_previous_scheme(self):
+        rules = load_rules()
+        self.assertEqual(rules.rate(Decimal('49999.99')), Decimal('0.02'))
+        self.assertEqual(rules.rate(Decimal('50000')), Decimal('0.025'))
+        self.assertEqual(rules.rate(Decimal('169999')), Decimal('0.05'))
+        self.assertEqual(rules.rate(Decimal('170000')), Decimal('0.055'))
+        self.assertEqual(rules.shares[self.salesmen['DS'].id], Decimal('0.4'))
+        self.assertEqual(rules.shared_accounts, {self.salesmen['DS/MM/AC'].id, self.salesmen['KK'].id})
+
+    def test_personal_and_shared_sales(self):
+        self.sell('DS', 60000, date(2025, 3, 3))
+        self.sell('DS/MM/AC', 15000, date(2025, 3, 10))
+        self.sell('KK', 5000, date(2025, 3, 31))
+        self.sell('Lafarge', 90000, date(2025, 3, 12))
+
+        commission = month_commission(self.salesmen['DS'].id, 2025, 3)
+
+        self.assertEqual(commission.pooled_sales, Decimal('20000'))
+        self.assertEqual(commission.shared_sales, Decimal('8000'))
+        self.assertEqual(commission.qualifying_sales, Decimal('68000'))
+        self.assertEqual(commission.rate, Decimal('0.025'))
+        self.assertEqual(commission.commission, Decimal('1870'))
+        self.assertEqual(month_commission(self.salesmen['MM'].id, 2025, 3).qualifying_sales, Decimal('6000'))
+
+    def test_rules_are_read_from_the_database(self):
+        self.sell('AC', 10000, date(2025, 3, 3))
+        CommissionTier.objects.filter(min_sales=0).update(rate=Decimal('0.03'))
+        CommissionShare.objects.filter(salesman=self.salesmen['AC']).delete()
+
+        commissions = monthly_commissions(custom_period(date(2025, 3, 1), date(2025, 3, 31)))[date(2025, 3, 1)]
+
+        self.assertNotIn(self.salesmen['AC'].id, commissions)
+        self.assertEqual(month_commission(self.salesmen['AC'].id, 2025, 3).commission, Decimal('330'))
+
+    def test_one_aggregate_for_a_range_of_months(self):
+        for month in range(1, 7):
+            self.sell('DS', 1000 * month, date(2025, month, 5))
+            self.sell('MM', 500, date(2025, month, 6))
+        rules = load_rules()
+
+        with self.assertNumQueries(1):
+            commissions = monthly_commissions(custom_period(date(2025, 1, 1), date(2025, 6, 30)), rules=rules)
+
+        self.assertEqual(len(commissions), 6)
+        self.assertEqual(commissions[date(2025, 4, 1)][self.salesmen['DS'].id].personal_sales, Decimal('4000'))
+        self.assertEqual(commissions[date(2025, 4, 1)][self.salesmen['MM'].id].personal_sales, Decimal('500'))
+
+    def test_commission_endpoints(self):
+        self.sell('DS', 10000, date(2024, 2, 5))
+        self.sell('DS/MM/AC', 10000, date(2024, 11, 5))
+        self.client.force_login(self.user)
+
+        month = self.client.get(reverse('get_all_salesmen_commissions', kwargs={'year': 2024, 'month': 2})).json()
+        self.assertEqual(month, [{'salesman': 'Alex Cheung', 'commission': 0.0},
+                                 {'salesman': 'Dominic So', 'commission': 220.0},
+                                 {'salesman': 'Matthew Mak', 'commission': 0.0}])
+
+        matrix = self.client.get(reverse('salesmen_commission_matrix', kwargs={'year': 2024})).json()
+        self.assertEqual(len(matrix['months']), 12)
+        self.assertEqual([row['salesman'] for row in matrix['salesmen']], ['Alex Cheung', 'Dominic So', 'Matthew Mak'])
+        dominic = matrix['salesmen'][1]
+        self.assertEqual((dominic['commissions'][1], dominic['commissions'][10]), (220.0, 88.0))
+        self.assertEqual(dominic['total'], 308.0)
+        self.assertEqual(matrix['totals'][10], 220.0)
+
+
+class CommissionRulesInstallTest(TestCase):
+
+    def test_new_database_gets_the_default_tiers(self):
+        CommissionTier.objects.all().delete()
+
+        install_commission_rules(apps.get_app_config('invoice'))
+
+        self.assertEqual(load_rules().rate(Decimal('60000')), Decimal('0.025'))
+        # Shares wait for their salesmen
+        self.assertFalse(CommissionShare.objects.exists() or SharedSalesAccount.objects.exists())
+
+    def test_missing_tables_are_left_alone(self):
+        CommissionTier.objects.all().delete()
+
+        with mock.patch('django.db.backends.base.introspection.BaseDatabaseIntrospection.table_names',
+                        return_value=[]):
+            install_commission_rules(apps.get_app_config('invoice'))
+
+        self.assertFalse(CommissionTier.objects.exists())
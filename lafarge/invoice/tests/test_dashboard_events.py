@@ -0,0 +1,110 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from ..dashboard_utils import format_state, tile_versions
+from ..models import Customer, Invoice, InvoiceItem, Product, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_dashboard_events
+
+def parse_events(content):
+    """``(event, data, id)`` of each event in a server-sent events body."""
+    events = []
+    for block in content.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data']), fields['id']))
+    return events
+
+
+class DashboardEventsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('dashboard', 'dashboard@example.com', 'password')
+        salesman = Salesman.objects.create(code="DS", name="Dominic So")
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road",
+                                               salesman=salesman)
+        cls.product = Product.objects.create(name="Amoxil 500mg", quantity=1000, price=10)
+        cls.invoice = Invoice.objects.create(number="2001", customer=cls.customer,
+                                             delivery_date=localdate() - timedelta(days=3))
+        InvoiceItem.objects.create(invoice=cls.invoice, product=cls.product, quantity=2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.state = format_state(localdate(), tile_versions())
+
+    def events(self, since=None, **headers):
+        response = self.client.get(reverse('dashboard_events'), {'since': since} if since else {}, headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return parse_events(response.content)
+
+    def test_nothing_is_pushed_to_an_up_to_date_page(self):
+        self.assertEqual(self.events(self.state), [])
+
+    def test_a_new_page_receives_every_tile(self):
+        self.assertEqual([event for event, data, event_id in self.events()], ['today', 'deposits', 'charts'])
+
+    def test_a_delivery_pushes_today_and_the_charts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = Invoice.objects.create(number="2002", customer=self.customer)
+            InvoiceItem.objects.create(invoice=invoice, product=self.product, quantity=1)
+            invoice.delivery_date = localdate()
+            invoice.save()
+
+        events = self.events(self.state)
+        self.assertEqual([event for event, data, event_id in events], ['today', 'charts'])
+        self.assertIn("#2002", events[0][1]['html'])
+
+        # The id of the last event brings a reconnecting page up to date
+        self.assertEqual(self.events(**{'Last-Event-ID': events[-1][2]}), [])
+
+    def test_a_payment_pushes_only_the_deposits(self):
+        self.invoice.payment_date = localdate()
+        self.invoice.payment_method = 'cash'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.save()
+
+        events = self.events(self.state)
+        self.assertEqual([event for event, data, event_id in events], ['deposits'])
+        self.assertIn("#2001", events[0][1]['html'])
+
+    def test_changes_are_pushed_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.invoice.payment_date = localdate()
+            self.invoice.save()
+            self.assertEqual(self.events(self.state), [])
+
+    def test_charts_are_only_pushed_to_their_viewers(self):
+        clerk = User.objects.create_user('clerk', 'clerk@example.com', 'password', is_staff=True)
+        self.client.force_login(clerk)
+        self.assertEqual([event for event, data, event_id in self.events()], ['today', 'deposits'])
+
+        self.client.force_login(User.objects.create_user('lafarge', 'office@example.com', 'password', is_staff=True))
+        self.assertEqual([event for event, data, event_id in self.events()], ['today', 'deposits', 'charts'])
+
+    def test_requires_staff(self):
+        self.client.force_login(User.objects.create_user('customer', 'customer@example.com', 'password'))
+        self.assertEqual(self.client.get(reverse('dashboard_events')).status_code, 403)
+
+    def test_home_page_carries_its_state(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['dashboard_state'], self.state)
+        self.assertContains(response, 'id="dashboard-deposits"')
+
+    async def test_streams_under_asgi(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('dashboard_events'))
+        self.assertTrue(response.streaming)
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b"retry: "))
+        self.assertTrue((await anext(chunks)).startswith(b"id: "))
+        await chunks.aclose()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..db_routers import REPLICA_ALIAS, ReplicaRouter, reading_from_replica
+from ..management.commands.refresh_replica import Command as RefreshReplica
+from ..models import Invoice
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_db_routers
+
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_default_outside_replica_block(self):
+        self.assertIsNone(self.router.db_for_read(Invoice))
+
+    @mock.patch('invoice.db_routers.replica_available', return_value=True)
+    def test_reads_use_replica_inside_block(self, available):
+        with reading_from_replica():
+            self.assertEqual(self.router.db_for_read(Invoice), REPLICA_ALIAS)
+            self.assertIsNone(self.router.db_for_write(Invoice))
+        self.assertIsNone(self.router.db_for_read(Invoice))
+
+    @mock.patch('invoice.db_routers.replica_available', return_value=False)
+    def test_reads_fall_back_when_replica_unavailable(self, available):
+        with reading_from_replica():
+            self.assertIsNone(self.router.db_for_read(Invoice))
+
+    @mock.patch('invoice.db_routers.replica_available', return_value=True)
+    def test_related_reads_follow_instance(self, available):
+        invoice = Invoice(number='1')
+        invoice._state.db = 'default'
+        with reading_from_replica():
+            self.assertEqual(self.router.db_for_read(Invoice, instance=invoice), 'default')
+
+    def test_writes_to_replica_instances_go_to_default(self):
+        invoice = Invoice(number='1')
+        invoice._state.db = REPLICA_ALIAS
+        self.assertEqual(self.router.db_for_write(Invoice, instance=invoice), 'default')
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate(REPLICA_ALIAS, 'invoice'))
+        self.assertTrue(self.router.allow_migrate('default', 'invoice'))
+
+
+class RefreshReplicaTest(SimpleTestCase):
+
+    def test_refresh_replaces_snapshot_with_readable_copy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, snapshot = os.path.join(directory, 'source.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+            with sqlite3.connect(source) as connection:
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+                connection.execute("INSERT INTO item VALUES (1), (2)")
+            connection.close()
+
+            RefreshReplica().refresh(source, snapshot)
+
+            reader = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+            self.assertEqual(reader.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM item").fetchone()[0], 2)
+            reader.close()
+            self.assertFalse(os.path.exists(f"{snapshot}.tmp"))
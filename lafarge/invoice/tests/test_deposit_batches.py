@@ -0,0 +1,144 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from ..dashboard_utils import tile_versions
+from ..deposit_utils import DepositMismatch, create_deposit_batch, reconcile_deposit_batch
+from ..models import Customer, DepositBatch, Invoice, ReportSnapshot, Salesman, SyncChange
+from ..report_utils import close_period, deposit_batch_summary
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_deposit_batches
+
+class DepositBatchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('accounts', 'accounts@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road",
+                                               salesman=Salesman.objects.create(code="DS", name="Dominic So"))
+        cls.today = localdate()
+        cls.paid = cls.today - timedelta(days=2)
+        for number, total, method, cheque in [
+            ("5001", 100, 'cheque', "HSBC 000101"),
+            ("5002", 50, 'cheque', "HSBC 000101"),
+            ("5003", 30, 'cash', None),
+            ("5004", 20, 'fps', None),
+        ]:
+            Invoice.objects.create(number=number, customer=cls.customer, total_price=total, payment_method=method,
+                                   cheque_detail=cheque, payment_date=cls.paid)
+        Invoice.objects.create(number="5005", customer=cls.customer, total_price=900, payment_method='cash',
+                               payment_date=cls.paid, deposit_date=cls.paid)
+
+    def setUp(self):
+        cache.clear()
+
+    def batch(self):
+        return create_deposit_batch(Invoice.objects.all(), self.today)
+
+    def enter_actuals(self, batch, **actuals):
+        for method, amount in actuals.items():
+            batch.totals.filter(payment_method=method).update(actual=amount)
+
+    def test_batch_records_expected_totals_per_method(self):
+        batch = self.batch()
+
+        # Deposited invoices are left out, and batched ones are not batched again
+        self.assertEqual(sorted(batch.invoices.values_list('number', flat=True)), ["5001", "5002", "5003", "5004"])
+        self.assertEqual(dict(batch.totals.values_list('payment_method', 'expected')),
+                         {'cheque': 150, 'cash': 30, 'fps': 20})
+        self.assertIsNone(self.batch())
+
+    def test_post_dated_cheques_wait_for_their_date(self):
+        Invoice.objects.create(number="5006", customer=self.customer, total_price=70, payment_method='cheque',
+                               cheque_detail="HSBC 000102", payment_date=self.today + timedelta(days=5))
+
+        batch = self.batch()
+
+        self.assertNotIn("5006", batch.invoices.values_list('number', flat=True))
+        self.assertEqual(batch.totals.get(payment_method='cheque').expected, 150)
+        later = create_deposit_batch(Invoice.objects.all(), self.today + timedelta(days=5))
+        self.assertEqual(list(later.invoices.values_list('number', flat=True)), ["5006"])
+
+    def test_mismatched_totals_leave_invoices_undeposited(self):
+        batch = self.batch()
+        self.enter_actuals(batch, cheque=150, cash=25)
+
+        mismatches = reconcile_deposit_batch(batch)
+
+        self.assertEqual(mismatches, [DepositMismatch('cash', 30, 25), DepositMismatch('fps', 20, None)])
+        self.assertFalse(batch.invoices.filter(deposit_date__isnull=False).exists())
+        self.assertIsNone(DepositBatch.objects.get(pk=batch.pk).reconciled_at)
+
+    def test_payment_changed_after_batching_is_caught(self):
+        batch = self.batch()
+        self.enter_actuals(batch, cheque=150, cash=30, fps=20)
+        Invoice.objects.filter(number="5004").update(payment_method='cash')
+
+        self.assertEqual(reconcile_deposit_batch(batch),
+                         [DepositMismatch('cash', 50, 30), DepositMismatch('fps', 0, 20)])
+        self.assertEqual(batch.totals.get(payment_method='cash').expected, 50)
+
+    def test_reconcile_deposits_the_batch_with_one_update(self):
+        batch = self.batch()
+        self.enter_actuals(batch, cheque=150, cash=30, fps=20)
+        versions = tile_versions()
+        logged = SyncChange.objects.count()
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reconcile_deposit_batch(batch), [])
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "invoice_invoice"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Invoice.objects.filter(deposit_batch=batch).values_list('deposit_date', flat=True)),
+                         {self.today})
+        self.assertIsNotNone(DepositBatch.objects.get(pk=batch.pk).reconciled_at)
+        self.assertEqual(SyncChange.objects.count(), logged + 4)
+        self.assertGreater(tile_versions()['deposits'], versions['deposits'])
+
+    def test_payment_report_reads_batch_totals(self):
+        batch = self.batch()
+        self.enter_actuals(batch, cheque=150, cash=30)
+
+        with self.assertNumQueries(2):
+            summary = deposit_batch_summary(self.today.year, self.today.month)
+
+        (row,) = summary['deposit_batches']
+        self.assertEqual((row.expected_total, row.actual_total, row.missing_actuals), (200, 180, 1))
+        self.assertEqual([(total['label'], total['expected'], total['actual'])
+                          for total in summary['deposit_method_totals']],
+                         [("Cash", 30, 30), ("Cheque", 150, 150), ("Fps", 20, None)])
+
+    def test_reconcile_marks_closed_payment_report_stale(self):
+        paid = date(2025, 4, 10)
+        Invoice.objects.filter(deposit_date__isnull=True).update(payment_date=paid)
+        batch = create_deposit_batch(Invoice.objects.all(), date(2025, 5, 2))
+        self.enter_actuals(batch, cheque=150, cash=30, fps=20)
+        close_period(2025, 4)
+
+        reconcile_deposit_batch(batch)
+
+        snapshot = ReportSnapshot.objects.get(report='monthly_payment_report', year=2025, month=4)
+        self.assertTrue(snapshot.stale)
+        self.assertFalse(ReportSnapshot.objects.get(report='monthly_report', year=2025, month=4).stale)
+
+    def test_admin_actions_batch_and_reconcile(self):
+        self.client.force_login(self.user)
+        pks = list(Invoice.objects.filter(number__in=["5003", "5004"]).values_list('pk', flat=True))
+        self.client.post(reverse('admin:invoice_invoice_changelist'),
+                         {'action': 'batch_for_deposit', '_selected_action': pks})
+        batch = DepositBatch.objects.get()
+        self.assertEqual(batch.date, self.today)
+        self.enter_actuals(batch, cash=30, fps=20)
+
+        self.client.post(reverse('admin:invoice_depositbatch_changelist'),
+                         {'action': 'reconcile', '_selected_action': [batch.pk]})
+
+        self.assertEqual(sorted(Invoice.objects.filter(deposit_date=self.today).values_list('number', flat=True)),
+                         ["5003", "5004"])
@@ -0,0 +1,74 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from ..deposit_utils import build_deposit_slips, due_deposit_slips, pending_deposit_summary
+from ..models import Customer, Invoice, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_deposit_utils
+
+class DepositUtilsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('accounts', 'accounts@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road",
+                                               salesman=Salesman.objects.create(code="DS", name="Dominic So"))
+        cls.today = localdate()
+        later = cls.today + timedelta(days=7)
+        for number, total, method, cheque, paid in [
+            ("4001", 100, 'cheque', "HSBC 000101", cls.today),
+            ("4002", 50, 'cheque', "HSBC 000101", cls.today),
+            ("4003", 70, 'cheque', "BOC 000202", cls.today),
+            ("4004", 30, 'cash', None, cls.today),
+            ("4005", 20, 'cash', None, cls.today - timedelta(days=1)),
+            ("4006", 400, 'cheque', "HSBC 000303", later),
+            ("4007", 60, 'fps', None, later),
+        ]:
+            Invoice.objects.create(number=number, customer=cls.customer, total_price=total, payment_method=method,
+                                   cheque_detail=cheque, payment_date=paid)
+        Invoice.objects.create(number="4008", customer=cls.customer, total_price=900, payment_method='cash',
+                               payment_date=cls.today, deposit_date=cls.today)
+
+    def test_panel_is_one_aggregate_and_one_list(self):
+        with self.assertNumQueries(2):
+            summary = pending_deposit_summary(self.today)
+            numbers = sorted(invoice.number for invoice in summary['pending_deposits'])
+
+        self.assertEqual(numbers, ["4001", "4002", "4003", "4004", "4005", "4006", "4007"])
+        self.assertEqual(summary['total_pending_deposit'], 270)
+        self.assertEqual(summary['payment_totals_dict'], {'cheque': 220, 'cash': 50})
+        # Cheques are counted once however many invoices they pay
+        self.assertEqual(summary['payment_counts_dict'], {'cheque': 2, 'cash': 2, 'fps': 0})
+        self.assertEqual(summary['future_payment_totals_dict'], {'cheque': 400, 'fps': 60})
+        self.assertEqual(summary['future_payment_counts_dict'], {'cheque': 1, 'cash': 0, 'fps': 1})
+
+    def test_slips_hold_one_line_per_cheque(self):
+        slips = due_deposit_slips(self.today)
+
+        self.assertEqual([(slip.label, slip.total) for slip in slips], [("Cash", 50), ("Cheque", 220)])
+        cash, cheque = slips
+        self.assertEqual([line.reference for line in cash.lines], ["4005", "4004"])
+        self.assertEqual([(line.reference, [invoice.number for invoice in line.invoices], line.amount)
+                          for line in cheque.lines],
+                         [("BOC 000202", ["4003"], 70), ("HSBC 000101", ["4001", "4002"], 150)])
+
+    def test_long_slips_are_split(self):
+        invoices = [Invoice(number=str(number), payment_method='cash', total_price=Decimal('10.00'))
+                    for number in range(5)]
+        slips = build_deposit_slips(invoices, lines_per_slip=2)
+        self.assertEqual([(len(slip.lines), slip.total) for slip in slips], [(2, 20), (2, 20), (1, 10)])
+
+    def test_deposit_slips_page(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('deposit_slips'))
+        self.assertContains(response, "HSBC 000101")
+        self.assertContains(response, "$220.00")
+        self.assertNotContains(response, "HSBC 000303")
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import TransactionTestCase
+
+from ..management.commands.generate_dataset import Command as GenerateDataset
+from ..management.commands.import_sqlite import imported_models
+from ..models import CommissionTier, Forbidden_Word, Invoice, InvoiceItem, PricingRule, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_import_sqlite
+
+LEGACY_ALIAS = 'legacy'
+
+
+class ImportSqliteTest(TransactionTestCase):
+    """
+    Round trip: data written to a separate SQLite file must come back into the
+    configured database (SQLite or PostgreSQL) unchanged.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'legacy.sqlite3')
+        connections.settings[LEGACY_ALIAS] = {
+            **connections.settings['default'],
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path, 'OPTIONS': {}, 'TEST': {},
+        }
+        self.addCleanup(self.remove_legacy_database)
+        # Content type ids are cached per alias and the legacy file is new for every test
+        ContentType.objects.clear_cache()
+        call_command('migrate', database=LEGACY_ALIAS, verbosity=0)
+        # The fixture brings its own rules in place of the defaults installed by migrate
+        CommissionTier.objects.using(LEGACY_ALIAS).all().delete()
+        PricingRule.objects.using(LEGACY_ALIAS).all().delete()
+
+        call_command('generate_dataset', customers=6, products=4, months=1, invoices_per_month=10, seed=3,
+                     stdout=StringIO())
+        clerk = User.objects.create_user('clerk', password='password')
+        clerk.user_permissions.add(Permission.objects.get(codename='change_invoice'))
+
+        fixture = os.path.join(self.directory, 'fixture.json')
+        call_command('dumpdata', 'invoice', 'auth.user', natural_foreign=True, output=fixture, verbosity=0)
+        call_command('loaddata', fixture, database=LEGACY_ALIAS, verbosity=0)
+        self.snapshot = self.rows(LEGACY_ALIAS)
+        GenerateDataset().flush()
+        Forbidden_Word.objects.all().delete()
+        User.objects.all().delete()
+
+    def remove_legacy_database(self):
+        connections[LEGACY_ALIAS].close()
+        del connections[LEGACY_ALIAS]
+        del connections.settings[LEGACY_ALIAS]
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def rows(using='default'):
+        return {
+            model._meta.label: list(model.objects.using(using).order_by('pk').values())
+            for model in imported_models()
+        }
+
+    def test_import_copies_rows_with_primary_keys(self):
+        self.assertFalse(Invoice.objects.exists())
+        call_command('import_sqlite', self.path, stdout=StringIO())
+
+        self.assertTrue(InvoiceItem.objects.exists())
+        self.assertEqual(self.rows(), self.snapshot)
+        self.assertTrue(User.objects.get(username='clerk').has_perm('invoice.change_invoice'))
+
+    def test_sequences_continue_after_import(self):
+        call_command('import_sqlite', self.path, stdout=StringIO())
+        highest = Salesman.objects.order_by('-pk').first().pk
+        self.assertGreater(Salesman.objects.create(code='NEW', name='New Salesman').pk, highest)
+
+    def test_refuses_non_empty_target(self):
+        call_command('import_sqlite', self.path, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_sqlite', self.path, stdout=StringIO())
@@ -0,0 +1,65 @@
+import json
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from ..models import Customer, Invoice
+from ..query_plan_utils import analyse_workload, app_tables, declared_indexes, explain, main_table, redundant_indexes
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_index_advisor
+
+def captured(queryset, view):
+    sql, params = queryset.query.sql_with_params()
+    return [{'alias': 'default', 'sql': sql, 'params': params, 'views': {view}, 'executions': 1}]
+
+
+class QueryPlanTest(TestCase):
+
+    def test_number_index_is_covered_by_unique_constraint(self):
+        pairs = redundant_indexes(declared_indexes(connection, app_tables()))
+        covered = {index['name']: other for index, other in pairs if index['table'] == 'invoice_invoice'}
+        number_index = next(name for name in covered if name.startswith('invoice_inv_number'))
+        self.assertTrue(covered[number_index]['unique'])
+        self.assertEqual(covered[number_index]['columns'], ('number',))
+
+    def test_unindexed_filter_is_a_full_scan(self):
+        plan = explain(connection, *Invoice.objects.filter(cheque_detail='HSBC 1').query.sql_with_params())
+        self.assertIn('invoice_invoice', plan['scans'])
+
+        indexed = explain(connection, *Invoice.objects.filter(number='1').query.sql_with_params())
+        self.assertNotIn('invoice_invoice', indexed['scans'])
+
+    def test_full_scan_suggests_index(self):
+        report = analyse_workload(captured(Invoice.objects.filter(cheque_detail='HSBC 1'), 'cheques'), min_rows=0)
+        self.assertIn({'table': 'invoice_invoice', 'columns': ('cheque_detail',), 'views': ['cheques']},
+                      report['add'])
+
+    def test_sorted_table_is_the_outer_from_table(self):
+        queryset = Invoice.objects.filter(customer__in=Customer.objects.filter(name='Chan')).order_by('cheque_detail')
+        sql = str(queryset.query)
+        self.assertIn('FROM "invoice_customer"', sql)
+        self.assertEqual(main_table(sql, app_tables()), 'invoice_invoice')
+
+    def test_existing_index_is_not_suggested(self):
+        report = analyse_workload(captured(Invoice.objects.order_by('number'), 'numbers'), min_rows=0)
+        self.assertFalse([entry for entry in report['add'] if entry['table'] == 'invoice_invoice'])
+
+
+@override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+class IndexAdvisorCommandTest(TestCase):
+
+    def test_report_covers_view_workload(self):
+        call_command('generate_dataset', flush=True, seed=7, customers=12, products=4, months=1,
+                     invoices_per_month=20, stdout=StringIO())
+        output = StringIO()
+        call_command('index_advisor', format='json', stdout=output)
+        report = json.loads(output.getvalue())
+
+        self.assertGreater(report['statements'], len(report['targets']))
+        self.assertIn('invoice_list', report['targets'])
+        redundant = [entry['index']['name'] for entry in report['redundant']]
+        self.assertTrue(any(name.startswith('invoice_inv_number') for name in redundant))
@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..deletion_utils import delete_invoices
+from ..models import AdditionalItem, Customer, Invoice, InvoiceItem, Product, ProductTransaction
+from ..search_utils import search
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_invoice_deletion
+
+class DeleteInvoicesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('deleter', 'deleter@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road")
+        cls.amoxil = Product.objects.create(name="Amoxil 500mg", quantity=100, price=10, unit_per_box=12)
+        cls.zinnat = Product.objects.create(name="Zinnat 250mg", quantity=50, price=20, unit_per_box=0)
+
+    def create_invoice(self, number, delivered=True, lines=((None, 5),)):
+        invoice = Invoice.objects.create(number=number, customer=self.customer)
+        for product, quantity in lines:
+            InvoiceItem.objects.create(invoice=invoice, product=product or self.amoxil, quantity=quantity)
+        AdditionalItem.objects.create(invoice=invoice, description="Delivery", price=30)
+        if delivered:
+            invoice.delivery_date = date(2025, 1, 10)
+            invoice.save()
+        return invoice
+
+    def test_restocks_products_and_logs_delivered_invoices(self):
+        delivered = self.create_invoice("1001", lines=((self.amoxil, 5), (self.zinnat, 3), (self.amoxil, 2)))
+        self.create_invoice("1002", delivered=False, lines=((self.amoxil, 4),))
+
+        self.assertEqual(delete_invoices(Invoice.objects.all()), 2)
+
+        self.assertFalse(Invoice.objects.exists())
+        amoxil, zinnat = Product.objects.get(pk=self.amoxil.pk), Product.objects.get(pk=self.zinnat.pk)
+        self.assertEqual((amoxil.quantity, amoxil.box_amount, amoxil.box_remain), (100, 8, 4))
+        self.assertEqual((zinnat.quantity, zinnat.box_amount, zinnat.box_remain), (50, 0, 50))
+
+        restocks = ProductTransaction.objects.filter(transaction_type='restock').order_by('id')
+        self.assertEqual(
+            [(transaction.product_id, transaction.change, transaction.quantity_after_transaction)
+             for transaction in restocks],
+            # The undelivered invoice is restocked without a log entry
+            [(self.amoxil.pk, 5, 94), (self.zinnat.pk, 3, 50), (self.amoxil.pk, 2, 96)],
+        )
+        self.assertEqual(restocks[0].description,
+                         f"Restock due to deletion of invoice #{delivered.number} from Chan Medical Clinic")
+        self.assertEqual(search("1001"), [])
+
+    def test_query_count_does_not_grow_with_invoices(self):
+        def deletion_queries(numbers):
+            for number in numbers:
+                self.create_invoice(number, lines=((self.amoxil, 1), (self.zinnat, 1)))
+            with CaptureQueriesContext(connection) as queries:
+                delete_invoices(Invoice.objects.all())
+            return len(queries)
+
+        self.assertEqual(deletion_queries(["2001", "2002"]), deletion_queries([str(3000 + n) for n in range(20)]))
+
+    def test_admin_bulk_delete_action(self):
+        invoices = [self.create_invoice("4001"), self.create_invoice("4002")]
+        self.client.force_login(self.user)
+        response = self.client.post('/admin/invoice/invoice/', {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [invoice.pk for invoice in invoices],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Invoice.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.amoxil.pk).quantity, 100)
@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import AdditionalItem, Customer, Deliveryman, Invoice, InvoiceItem, Product, Salesman
+from ..serializers import serialize_invoices
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_invoice_read_api
+
+class InvoiceReadApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('reader', 'reader@example.com', 'password')
+        cls.salesman = Salesman.objects.create(code="DS", name="Dominic So")
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", care_of="Dr. Chan",
+                                               address="12 Nathan Road", salesman=cls.salesman)
+        cls.deliveryman = Deliveryman.objects.create(code="D01", name="Driver 1")
+        cls.product = Product.objects.create(name="Amoxil 500mg (Lot no.: A123)", quantity=100, price=10)
+
+    def create_invoice(self, number, **fields):
+        invoice = Invoice.objects.create(number=number, customer=self.customer, **fields)
+        InvoiceItem.objects.create(invoice=invoice, product=self.product, quantity=2, price=10)
+        AdditionalItem.objects.create(invoice=invoice, description="Delivery", price=30)
+        return invoice
+
+    def test_embeds_related_rows_and_items(self):
+        invoice = self.create_invoice("1001", deliveryman=self.deliveryman)
+
+        [result] = serialize_invoices(Invoice.objects.all())
+
+        self.assertEqual(result['id'], invoice.id)
+        self.assertEqual(result['total_price'], "50.00")
+        self.assertEqual(result['customer']['care_of'], "Dr. Chan")
+        self.assertEqual(result['salesman'], {'id': self.salesman.id, 'code': "DS", 'name': "Dominic So"})
+        self.assertEqual(result['deliveryman']['code'], "D01")
+        [item] = result['items']
+        self.assertEqual((item['base_name'], item['lot_number'], item['sum_price']), ("Amoxil 500mg", "A123", "20.00"))
+        self.assertEqual(result['additional_items'], [{'id': invoice.additionalitem_set.get().id,
+                                                       'description': "Delivery", 'price': "30.00"}])
+
+    def test_missing_salesman_is_null(self):
+        self.customer.salesman = None
+        self.customer.save()
+        self.create_invoice("1001")
+        [result] = serialize_invoices(Invoice.objects.all())
+        self.assertIsNone(result['salesman'])
+        self.assertIsNone(result['deliveryman'])
+
+    def test_query_count_does_not_grow_with_invoices(self):
+        self.create_invoice("1001")
+        with self.assertNumQueries(3):
+            serialize_invoices(Invoice.objects.all())
+        for number in range(1002, 1012):
+            self.create_invoice(str(number))
+        with self.assertNumQueries(3):
+            self.assertEqual(len(serialize_invoices(Invoice.objects.all())), 11)
+
+    def test_endpoint_pages_by_id(self):
+        invoices = [self.create_invoice(str(number)) for number in range(1001, 1004)]
+        self.client.force_login(self.user)
+        url = reverse('InvoiceDetailedView')
+
+        first = self.client.get(url, {'limit': 2}).json()
+        self.assertEqual([result['number'] for result in first['results']], ["1001", "1002"])
+        self.assertEqual(first['next'], invoices[1].id)
+        second = self.client.get(url, {'limit': 2, 'after': first['next']}).json()
+        self.assertEqual([result['number'] for result in second['results']], ["1003"])
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.client.get(url, {'limit': 'all'}).status_code, 400)
+
+    def test_endpoint_limit_is_at_least_one(self):
+        self.create_invoice("1001")
+        self.create_invoice("1002")
+        self.client.force_login(self.user)
+        url = reverse('InvoiceDetailedView')
+
+        for limit in (0, -1):
+            response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([result['number'] for result in response.json()['results']], ["1001"])
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics_utils import (
+    Histogram, _registry, cache_requests, pdf_render_duration, record_cache_access, register_queue, render_metrics,
+    request_queries, requests_total,
+)
+from ..models import Customer, Invoice, Product, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_metrics
+
+class MetricsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('metrics', 'metrics@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road",
+                                               delivery_address="12 Nathan Road", office_hour="9am - 6pm",
+                                               salesman=Salesman.objects.create(code="DS", name="Dominic So"))
+        cls.invoice = Invoice.objects.create(number="1001", customer=cls.customer)
+        Product.objects.create(name="Amoxil 500mg", quantity=1000, price=10)
+
+    def test_histogram_exposes_cumulative_buckets(self):
+        histogram = Histogram('test_histogram_seconds', 'Test histogram.', labels=('view',), buckets=(0.1, 1))
+        self.addCleanup(_registry.remove, histogram)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='home')
+
+        self.assertEqual(histogram.expose()[2:], [
+            'test_histogram_seconds_bucket{view="home",le="0.1"} 1',
+            'test_histogram_seconds_bucket{view="home",le="1"} 2',
+            'test_histogram_seconds_bucket{view="home",le="+Inf"} 3',
+            'test_histogram_seconds_sum{view="home"} 5.55',
+            'test_histogram_seconds_count{view="home"} 3',
+        ])
+
+    def test_requests_are_timed_and_their_queries_counted_per_view(self):
+        self.client.force_login(self.user)
+        served = requests_total._values.get(('product_list', '200'), 0)
+        observed = request_queries._values.get(('product_list',), {}).get('count', 0)
+
+        self.client.get(reverse('product_list'))
+
+        self.assertEqual(requests_total._values[('product_list', '200')], served + 1)
+        state = request_queries._values[('product_list',)]
+        self.assertEqual(state['count'], observed + 1)
+        self.assertGreater(state['sum'], 0)
+
+    @override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+    def test_pdf_render_duration_per_document(self):
+        self.client.force_login(self.user)
+        rendered = pdf_render_duration._values.get(('invoice',), {}).get('count', 0)
+
+        self.client.get(reverse('download_invoice_pdf', args=[self.invoice.number]))
+
+        self.assertEqual(pdf_render_duration._values[('invoice',)]['count'], rendered + 1)
+
+    def test_endpoint_exposes_caches_and_queues(self):
+        record_cache_access('test_layer', hit=True)
+        record_cache_access('test_layer', hit=False)
+        register_queue('test_queue', lambda: 7)
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('lafarge_cache_requests_total{cache="test_layer",result="hit"}', body)
+        self.assertIn('lafarge_job_queue_depth{queue="test_queue"} 7', body)
+        self.assertEqual(cache_requests._values[('test_layer', 'miss')], 1)
+        # Scrapes are not counted as requests
+        self.assertNotIn('view="metrics"', render_metrics())
+
+    def test_endpoint_is_closed_to_other_addresses(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9').status_code, 200)
@@ -0,0 +1,70 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Invoice, InvoiceItem
+from ..period_utils import custom_period, month_period, quarter_period, week_period, year_period
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_period_utils
+
+class PeriodTest(SimpleTestCase):
+
+    def test_month_period(self):
+        self.assertEqual(month_period(2025, 2), (date(2025, 2, 1), date(2025, 3, 1)))
+        self.assertEqual(month_period('2024', '12'), (date(2024, 12, 1), date(2025, 1, 1)))
+        self.assertEqual(month_period(2024, 2).last_day, date(2024, 2, 29))
+
+    def test_week_period_starts_on_monday(self):
+        self.assertEqual(week_period(date(2025, 3, 19)), (date(2025, 3, 17), date(2025, 3, 24)))
+        self.assertEqual(week_period(date(2025, 3, 17)), (date(2025, 3, 17), date(2025, 3, 24)))
+
+    def test_quarter_and_year_period(self):
+        self.assertEqual(quarter_period(2025, 4), (date(2025, 10, 1), date(2026, 1, 1)))
+        self.assertEqual(year_period(2025), (date(2025, 1, 1), date(2026, 1, 1)))
+
+    def test_custom_period_includes_last_day(self):
+        period = custom_period(date(2025, 3, 1), date(2025, 3, 15))
+        self.assertIn(date(2025, 3, 15), period)
+        self.assertNotIn(date(2025, 3, 16), period)
+        with self.assertRaises(ValueError):
+            custom_period(date(2025, 3, 2), date(2025, 3, 1))
+
+    def test_lookups_are_half_open(self):
+        self.assertEqual(month_period(2025, 3).lookups('invoice__delivery_date'), {
+            'invoice__delivery_date__gte': date(2025, 3, 1),
+            'invoice__delivery_date__lt': date(2025, 4, 1),
+        })
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plan wording is SQLite specific")
+class PeriodQueryPlanTest(TestCase):
+    """Period filters must become index range searches, not full table scans."""
+
+    def assertRangeSearch(self, queryset, column):
+        plan = queryset.explain()
+        self.assertNotIn('SCAN invoice_invoice', plan)
+        self.assertIn(f'{column}>? AND {column}<?', plan)
+
+    def test_month_filter_uses_delivery_date_index(self):
+        self.assertRangeSearch(
+            Invoice.objects.filter(**month_period(2025, 3).lookups('delivery_date')), 'delivery_date')
+
+    def test_salesman_month_filter_uses_composite_index(self):
+        self.assertRangeSearch(
+            Invoice.objects.filter(salesman_id=1, **month_period(2025, 3).lookups('delivery_date')), 'delivery_date')
+
+    def test_payment_month_filter_uses_payment_date_index(self):
+        self.assertRangeSearch(
+            Invoice.objects.filter(**month_period(2025, 3).lookups('payment_date')), 'payment_date')
+
+    def test_item_filter_through_invoice_uses_index(self):
+        self.assertRangeSearch(
+            InvoiceItem.objects.filter(**month_period(2025, 3).lookups('invoice__delivery_date')), 'delivery_date')
+
+    def test_month_extract_scans_the_table(self):
+        # Django turns __year into a range but __month stays a strftime() call on the column
+        plan = Invoice.objects.filter(delivery_date__month=3).explain()
+        self.assertIn('SCAN invoice_invoice', plan)
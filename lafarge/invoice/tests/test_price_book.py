@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Customer, Invoice, InvoiceItem, Product, SpecialPrice
+from ..price_book_utils import resolve_prices
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_price_book
+
+class PriceBookTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('orders', 'orders@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road")
+        cls.amoxil = Product.objects.create(name="Amoxil 500mg (Lot no.: A1)", quantity=100, price=10)
+        cls.amoxil_next_lot = Product.objects.create(name="Amoxil 500mg (Lot no.: A2)", quantity=100, price=11)
+        cls.zinnat = Product.objects.create(name="Zinnat 250mg", quantity=100, price=20)
+        cls.special = SpecialPrice.objects.create(customer=cls.customer, product_base_name="Amoxil 500mg",
+                                                  special_price=8)
+
+    def setUp(self):
+        # Rolled-back test data can leave price books behind under reused customer ids
+        cache.clear()
+
+    def test_resolves_a_batch_of_products_with_one_query(self):
+        with self.assertNumQueries(1):
+            prices = resolve_prices(self.customer.id, [self.amoxil, self.amoxil_next_lot, self.zinnat])
+        self.assertEqual(prices, {
+            self.amoxil.id: (Decimal('8'), True),
+            self.amoxil_next_lot.id: (Decimal('8'), True),
+            self.zinnat.id: (Decimal('20'), False),
+        })
+        with self.assertNumQueries(0):
+            resolve_prices(self.customer.id, [self.zinnat])
+
+    def test_invoice_lines_read_the_price_book_once(self):
+        invoice = Invoice.objects.create(number="1001", customer=self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            for product in (self.amoxil, self.amoxil_next_lot, self.zinnat):
+                InvoiceItem.objects.create(invoice=invoice, product=product, quantity=1)
+        special_price_queries = [query for query in queries if 'invoice_specialprice' in query['sql']]
+
+        self.assertEqual(len(special_price_queries), 1)
+        self.assertEqual([item.price for item in invoice.invoiceitem_set.order_by('id')],
+                         [Decimal('8'), Decimal('8'), Decimal('20')])
+
+    def test_special_price_changes_invalidate_the_book(self):
+        resolve_prices(self.customer.id, [self.amoxil])
+        self.special.special_price = 9
+        self.special.save()
+        self.assertEqual(resolve_prices(self.customer.id, [self.amoxil])[self.amoxil.id], (Decimal('9'), True))
+
+        self.special.delete()
+        self.assertEqual(resolve_prices(self.customer.id, [self.amoxil])[self.amoxil.id], (Decimal('10'), False))
+
+    def test_moving_a_special_price_invalidates_both_books(self):
+        other = Customer.objects.create(name="Wong Dental Clinic", address="8 Queen's Road")
+        resolve_prices(self.customer.id, [self.amoxil])
+        resolve_prices(other.id, [self.amoxil])
+
+        self.special.customer = other
+        self.special.save()
+
+        self.assertEqual(resolve_prices(self.customer.id, [self.amoxil])[self.amoxil.id], (Decimal('10'), False))
+        self.assertEqual(resolve_prices(other.id, [self.amoxil])[self.amoxil.id], (Decimal('8'), True))
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        url = reverse('CustomerPriceBookView', kwargs={'customer_id': self.customer.id})
+
+        response = self.client.get(url, {'products': f"{self.zinnat.id},{self.amoxil.id}"}).json()
+
+        self.assertEqual(response['products'], [
+            {'id': self.amoxil.id, 'name': "Amoxil 500mg (Lot no.: A1)", 'list_price': "10.00", 'price': "8.00",
+             'special': True},
+            {'id': self.zinnat.id, 'name': "Zinnat 250mg", 'list_price': "20.00", 'price': "20.00", 'special': False},
+        ])
+        self.assertEqual(self.client.get(url, {'products': 'all'}).status_code, 400)
+        missing = reverse('CustomerPriceBookView', kwargs={'customer_id': self.customer.id + 100})
+        self.assertEqual(self.client.get(missing).status_code, 404)
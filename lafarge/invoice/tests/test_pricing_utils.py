@@ -0,0 +1,116 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..models import Customer, Invoice, InvoiceItem, PricingRule, Product, SpecialPrice, SyncChange
+from ..pricing_utils import get_pricing_rules, install_pricing_rules, price_line
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_pricing_utils
+
+class PriceLineTest(SimpleTestCase):
+
+    def setUp(self):
+        self.product = Product(name="Licarlo 10mg (Lot no.: L1)", price=Decimal('30.60'), units_per_pack=3)
+
+    def test_cents_under_fifty_are_dropped(self):
+        self.assertEqual(price_line(self.product, Decimal('1')).sum_price, Decimal('10'))  # 10.20
+        self.assertEqual(price_line(self.product, Decimal('2')).sum_price, Decimal('20'))  # 20.40
+        self.product.price = Decimal('31.80')
+        self.assertEqual(price_line(self.product, Decimal('1')).sum_price, Decimal('10.60'))
+
+    def test_price_sources(self):
+        self.assertEqual(price_line(self.product, Decimal('3')), (Decimal('30.60'), Decimal('30.60'), 'list'))
+        self.assertEqual(price_line(self.product, Decimal('3'), special_price=Decimal('27')),
+                         (Decimal('27'), Decimal('27'), 'special'))
+        self.assertEqual(price_line(self.product, Decimal('3'), net_price=Decimal('25'), special_price=Decimal('27')),
+                         (Decimal('25'), Decimal('25'), 'net'))
+        self.assertEqual(price_line(self.product, Decimal('3'), product_type='bonus'), (None, Decimal('0.00'), None))
+
+    def test_floor_rule(self):
+        self.product.price = Decimal('32.25')
+        self.assertEqual(price_line(self.product, Decimal('2')).sum_price, Decimal('21.50'))
+        self.assertEqual(price_line(self.product, Decimal('2'), rules=[('Licarlo', 'floor')]).sum_price,
+                         Decimal('21'))
+
+
+class QuoteApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('quotes', 'quotes@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road")
+        cls.licarlo = Product.objects.create(name="Licarlo 10mg (Lot no.: L1)", quantity=100, price=Decimal('32.25'),
+                                             units_per_pack=3)
+        cls.zinnat = Product.objects.create(name="Zinnat 250mg", quantity=100, price=20)
+        SpecialPrice.objects.create(customer=cls.customer, product_base_name="Zinnat 250mg", special_price=18)
+        PricingRule.objects.get_or_create(product_name_contains="Licarlo")  # Installed by migrate
+
+    def setUp(self):
+        # Rolled-back test data can leave rules and price books behind in the cache
+        cache.clear()
+
+    def test_saved_lines_follow_the_rule_table(self):
+        invoice = Invoice.objects.create(number="1001", customer=self.customer)
+        floored = InvoiceItem.objects.create(invoice=invoice, product=self.licarlo, quantity=2)
+        PricingRule.objects.all().delete()
+        exact = InvoiceItem.objects.create(invoice=invoice, product=self.licarlo, quantity=2)
+        self.assertEqual((floored.sum_price, exact.sum_price), (Decimal('21'), Decimal('21.50')))
+
+    def test_quote_prices_a_draft_order_without_writing(self):
+        self.client.force_login(self.user)
+        changes = SyncChange.objects.count()
+        order = {'customer': self.customer.id, 'lines': [
+            {'product': self.licarlo.id, 'quantity': '2'},
+            {'product': self.zinnat.id, 'quantity': '3'},
+            {'product': self.zinnat.id, 'quantity': '1', 'product_type': 'bonus'},
+        ]}
+
+        # Session, user, customer, products, price book and rules, however many lines
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('QuoteView'), order, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        quote = response.json()
+        self.assertEqual([(line['price'], line['sum_price'], line['source']) for line in quote['lines']],
+                         [("32.25", "21", 'list'), ("18.00", "54", 'special'), (None, "0.00", None)])
+        self.assertEqual(quote['total'], "75.00")
+        self.assertEqual(Product.objects.get(pk=self.zinnat.pk).quantity, 100)
+        self.assertFalse(InvoiceItem.objects.exists())
+        self.assertEqual(SyncChange.objects.count(), changes)
+
+    def test_quote_rejects_unknown_products(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('QuoteView'), {
+            'customer': self.customer.id, 'lines': [{'product': 999, 'quantity': '1'}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['products'], [999])
+
+
+class PricingRulesInstallTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_database_gets_the_default_rules(self):
+        PricingRule.objects.all().delete()
+        self.assertEqual(get_pricing_rules(), [])
+
+        install_pricing_rules(apps.get_app_config('invoice'))
+
+        self.assertEqual(get_pricing_rules(), [('Licarlo', 'floor')])
+
+    def test_missing_table_is_left_alone(self):
+        PricingRule.objects.all().delete()
+
+        with mock.patch('django.db.backends.base.introspection.BaseDatabaseIntrospection.table_names',
+                        return_value=[]):
+            install_pricing_rules(apps.get_app_config('invoice'))
+
+        self.assertFalse(PricingRule.objects.exists())
@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..forms import ProductChoiceCache, ProductChoiceField, product_choice_label
+from ..models import Customer, Invoice, InvoiceItem, Product
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_product_picker
+
+class ProductPickerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('picker', 'picker@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road")
+        cls.in_stock = Product.objects.create(name="Amoxil 500mg (Lot no.: L002)", quantity=120)
+        cls.sold_out = Product.objects.create(name="Amoxil 500mg (Lot no.: L001)", quantity=0)
+        cls.other = Product.objects.create(name="Zinnat 250mg", quantity=10)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_invoice(self, number, lines):
+        invoice = Invoice.objects.create(number=number, customer=self.customer)
+        InvoiceItem.objects.bulk_create(
+            InvoiceItem(invoice=invoice, product=self.in_stock, quantity=1) for _ in range(lines)
+        )
+        return invoice
+
+    def change_page_queries(self, invoice):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/admin/invoice/invoice/{invoice.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_change_page_queries_do_not_grow_with_lines(self):
+        # Warm the content type cache used by the admin history link
+        self.change_page_queries(self.create_invoice("1000", 1))
+        _, short = self.change_page_queries(self.create_invoice("1001", 2))
+        response, long = self.change_page_queries(self.create_invoice("1002", 20))
+        self.assertEqual(short, long)
+        # Only the selected product is rendered, not the whole product table
+        self.assertContains(response, "Amoxil 500mg · Lot L002 · 120.0 in stock", count=20)
+        self.assertNotContains(response, "Zinnat")
+
+    def test_autocomplete_lists_in_stock_products_first(self):
+        response = self.client.get('/admin/invoice/product/autocomplete/', {
+            'app_label': 'invoice', 'model_name': 'invoiceitem', 'field_name': 'product', 'term': 'amoxil',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'id': str(self.in_stock.pk), 'text': "Amoxil 500mg · Lot L002 · 120.0 in stock"},
+            {'id': str(self.sold_out.pk), 'text': "Amoxil 500mg · Lot L001 · out of stock"},
+        ])
+
+    def test_field_resolves_products_from_cache(self):
+        field = ProductChoiceField(Product.objects.all(), choice_cache=ProductChoiceCache(
+            Q(pk__in=[self.in_stock.pk, self.sold_out.pk])
+        ))
+        with self.assertNumQueries(1):
+            self.assertEqual(field.clean(str(self.in_stock.pk)), self.in_stock)
+            self.assertEqual(field.clean(str(self.sold_out.pk)), self.sold_out)
+        # Products missing from the cache are still looked up
+        self.assertEqual(field.clean(str(self.other.pk)), self.other)
+
+    def test_label(self):
+        self.assertEqual(product_choice_label(Product.objects.get(pk=self.other.pk)), "Zinnat 250mg · 10.0 in stock")
@@ -0,0 +1,72 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Product
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_profiling
+
+class RequestProfilingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.staff = User.objects.create_user('clerk', 'clerk@example.com', 'password', is_staff=True)
+        cls.product = Product.objects.create(name="Amoxil 500mg", quantity=1000, price=10)
+
+    def setUp(self):
+        self.profile_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        settings = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.url = reverse('product_transactions', args=[self.product.id])
+
+    def test_superuser_capture_is_saved_and_listed(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(self.url, {'_profile': 'all'})
+
+        name = response['X-Profile-Id']
+        self.assertTrue((self.profile_dir / f"{name}.prof").exists())
+        self.assertIn("allocation sites", (self.profile_dir / f"{name}.alloc.txt").read_text())
+        metadata = json.loads((self.profile_dir / f"{name}.json").read_text())
+        self.assertEqual((metadata['view'], metadata['modes']),
+                         ('product_transaction_view', ['cprofile', 'tracemalloc']))
+
+        page = self.client.get(reverse('profile_list'))
+        self.assertEqual([capture['name'] for capture in page.context['captures']], [name])
+        self.assertTrue(page.context['captures'][0]['top_functions'])
+        download = self.client.get(reverse('download_profile', args=[name]))
+        self.assertEqual(download.status_code, 200)
+
+    def test_header_selects_the_mode(self):
+        self.client.force_login(self.superuser)
+        name = self.client.get(self.url, HTTP_X_PROFILE='tracemalloc')['X-Profile-Id']
+
+        self.assertFalse((self.profile_dir / f"{name}.prof").exists())
+        self.assertTrue((self.profile_dir / f"{name}.alloc.txt").exists())
+
+    def test_only_superusers_are_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'_profile': 'all'})
+
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+        self.assertEqual(self.client.get(reverse('profile_list')).status_code, 403)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_profiling_ignores_the_request(self):
+        self.client.force_login(self.superuser)
+
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url, {'_profile': 'all'}))
+
+    def test_download_rejects_names_outside_the_directory(self):
+        self.client.force_login(self.superuser)
+
+        self.assertEqual(self.client.get(reverse('download_profile', args=['..secret'])).status_code, 404)
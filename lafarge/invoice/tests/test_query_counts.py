@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.timezone import localdate
+
+from ..benchmark_utils import capture_queries, representative_requests
+from ..models import Invoice
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_query_counts
+
+SMALL_DATASET = {'customers': 12, 'products': 4, 'months': 2, 'invoices_per_month': 20}
+LARGE_DATASET = {'customers': 50, 'products': 20, 'months': 2, 'invoices_per_month': 100}
+
+# Hard ceiling per request, whatever the data size
+MAX_QUERIES_PER_REQUEST = 30
+
+
+def format_queries(queries):
+    return "\n".join(f"  {index}. [{query['alias']}] {query['sql']}" for index, query in enumerate(queries, start=1))
+
+
+@override_settings(STATIC_ROOT=settings.STATICFILES_DIRS[0])
+class ViewQueryCountTest(TestCase):
+    """
+    Every report view must issue the same number of queries for 40 invoices as
+    for 200, so N+1 patterns fail here instead of in production.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('querycount', 'querycount@example.com', 'password')
+        cls.small = cls.measure(SMALL_DATASET)
+        cls.large = cls.measure(LARGE_DATASET)
+
+    @classmethod
+    def measure(cls, dataset):
+        call_command('generate_dataset', flush=True, seed=7, stdout=StringIO(), **dataset)
+        # Make sure today's dashboard has deliveries at both sizes
+        Invoice.objects.filter(pk=Invoice.objects.latest('id').pk).update(delivery_date=localdate())
+        client = cls.client_class()
+        client.force_login(cls.user)
+        results = {}
+        for name, url in representative_requests():
+            # Every alias, so that reads routed to the replica count against the budget too
+            with capture_queries() as queries:
+                response = client.get(url)
+            results[name] = (url, response.status_code, list(queries))
+        return results
+
+    def test_views_respond(self):
+        for name, (url, status_code, _) in self.large.items():
+            with self.subTest(view=name):
+                self.assertEqual(status_code, 200, f"{name} ({url}) returned {status_code}")
+
+    def test_query_count_constant_as_data_grows(self):
+        self.assertEqual(set(self.small), set(self.large))
+        for name in self.large:
+            small_queries = self.small[name][2]
+            url, _, large_queries = self.large[name]
+            with self.subTest(view=name):
+                self.assertEqual(
+                    len(small_queries), len(large_queries),
+                    f"{name} ({url}) issued {len(small_queries)} queries for {SMALL_DATASET['months'] * SMALL_DATASET['invoices_per_month']} "
+                    f"invoices but {len(large_queries)} for {LARGE_DATASET['months'] * LARGE_DATASET['invoices_per_month']}:\n"
+                    f"{format_queries(large_queries)}"
+                )
+
+    def test_query_budget(self):
+        for name, (url, _, queries) in self.large.items():
+            with self.subTest(view=name):
+                self.assertLessEqual(
+                    len(queries), MAX_QUERIES_PER_REQUEST,
+                    f"{name} ({url}) issued {len(queries)} queries, budget is {MAX_QUERIES_PER_REQUEST}:\n"
+                    f"{format_queries(queries)}"
+                )
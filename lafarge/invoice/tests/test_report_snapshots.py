@@ -0,0 +1,141 @@
+from datetime import date
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..deletion_utils import delete_invoices
+from ..models import ClosedPeriod, CommissionTier, Customer, Deliveryman, Invoice, InvoiceItem, Product, \
+    ReportSnapshot, Salesman
+from ..report_utils import CLOSED_PERIODS_KEY, close_period, rebuild_stale_snapshots, reopen_period
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_report_snapshots
+
+class ReportSnapshotTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('reports', 'reports@example.com', 'password')
+        cls.salesman = Salesman.objects.create(code="DS", name="Dominic So")
+        cls.deliveryman = Deliveryman.objects.create(code="KW", name="Kenny Wong")
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road",
+                                               salesman=cls.salesman)
+        cls.product = Product.objects.create(name="Amoxil 500mg (Lot no.: A1)", quantity=1000, price=10)
+        cls.invoice = Invoice.objects.create(number="1001", customer=cls.customer, deliveryman=cls.deliveryman,
+                                             delivery_date=date(2024, 3, 5), payment_date=date(2024, 4, 2))
+        cls.item = InvoiceItem.objects.create(invoice=cls.invoice, product=cls.product, quantity=4)
+
+    def setUp(self):
+        # Rolled-back test data can leave closed periods behind in the cache
+        cache.clear()
+        self.client.force_login(self.user)
+        self.report_url = reverse('monthly_report', args=[2024, 3])
+
+    def snapshot(self, report='monthly_report', month=3):
+        return ReportSnapshot.objects.get(report=report, year=2024, month=month,
+                                          scope_id=self.salesman.id if report.startswith('salesman') else 0)
+
+    def test_closing_stores_every_report(self):
+        self.assertEqual(close_period(2024, 3), 5)
+        self.assertEqual(set(ReportSnapshot.objects.values_list('report', 'scope_id')), {
+            ('monthly_report', 0), ('monthly_payment_report', 0), ('monthly_analyze_detail', 0),
+            ('salesman_monthly_report', self.salesman.id), ('deliveryman_monthly_report', self.deliveryman.id),
+        })
+        self.assertIn("#1001", self.snapshot().html)
+
+    def test_closed_month_is_served_from_its_snapshot(self):
+        close_period(2024, 3)
+        ReportSnapshot.objects.filter(report='monthly_report').update(html="<p>Snapshot of March</p>")
+
+        self.client.get(self.report_url)  # Caches the closed periods
+        with self.assertNumQueries(3):  # Session, user and the snapshot
+            response = self.client.get(self.report_url)
+        self.assertContains(response, "Snapshot of March")
+
+        for name, args in [('salesman_monthly_report', [self.salesman.id, 2024, 3]),
+                           ('deliveryman_monthly_report', [self.deliveryman.id, 2024, 3]),
+                           ('monthly_analyze_detail', [2024, 3])]:
+            self.assertContains(self.client.get(reverse(name, args=args)), "Amoxil 500mg")
+
+    def test_open_months_are_computed_and_not_stored(self):
+        response = self.client.get(self.report_url)
+        self.assertContains(response, "#1001")
+        self.assertFalse(ReportSnapshot.objects.exists())
+
+    def test_edits_mark_the_snapshots_stale_and_the_next_view_rebuilds_them(self):
+        close_period(2024, 3)
+        close_period(2024, 4)
+
+        InvoiceItem.objects.create(invoice=self.invoice, product=self.product, quantity=7)
+        self.assertTrue(self.snapshot().stale)
+        self.assertTrue(self.snapshot('monthly_payment_report', month=4).stale)
+        self.assertFalse(self.snapshot('monthly_analyze_detail', month=4).stale)  # Nothing delivered in April
+
+        self.assertContains(self.client.get(self.report_url), "Total for 3/2024: <strong>$110.00")
+        snapshot = self.snapshot()
+        self.assertFalse(snapshot.stale)
+        self.assertIn("110.00", snapshot.html)
+
+    def test_moving_an_invoice_out_of_a_closed_month(self):
+        close_period(2024, 3)
+        self.invoice.delivery_date = date(2024, 5, 1)
+        self.invoice.save()
+
+        self.assertTrue(self.snapshot().stale)
+        self.assertEqual(rebuild_stale_snapshots(), 4)
+        self.assertNotIn("#1001", self.snapshot().html)
+
+    def test_edits_see_months_closed_by_another_process(self):
+        close_period(2024, 3)
+        # This process cached the closed months before the other one closed March
+        cache.set(CLOSED_PERIODS_KEY, frozenset())
+
+        self.invoice.delivery_date = date(2024, 5, 1)
+        self.invoice.save()
+
+        self.assertTrue(self.snapshot().stale)
+
+    def test_saves_read_the_previous_row_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.invoice.save()
+        self.assertEqual(len([query for query in queries if 'invoice_closedperiod' in query['sql']]), 1)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('SELECT')
+                              and 'FROM "invoice_invoice" WHERE' in query['sql']]), 1)
+        self.assertFalse(ReportSnapshot.objects.exists())
+
+        # What the save found does not carry over to a later delete
+        close_period(2024, 3)
+        self.invoice.delete()
+        self.assertTrue(self.snapshot().stale)
+
+    def test_deleting_invoices_marks_their_months_stale(self):
+        close_period(2024, 3)
+        close_period(2024, 4)
+
+        delete_invoices(Invoice.objects.filter(pk=self.invoice.pk))
+
+        self.assertTrue(self.snapshot().stale)
+        self.assertTrue(self.snapshot('monthly_payment_report', month=4).stale)
+        self.assertFalse(self.snapshot('monthly_report', month=4).stale)
+
+    def test_commission_rule_changes_mark_salesman_reports_stale(self):
+        close_period(2024, 3)
+        CommissionTier.objects.create(min_sales=250000, rate='0.06')
+        self.assertTrue(self.snapshot('salesman_monthly_report').stale)
+        self.assertFalse(self.snapshot().stale)
+
+    def test_reopen_and_command(self):
+        out = StringIO()
+        call_command('close_period', '--before', '2024-05', stdout=out)
+        self.assertEqual(list(ClosedPeriod.objects.values_list('year', 'month')), [(2024, 4), (2024, 3)])
+
+        reopen_period(2024, 3)
+        self.assertFalse(ReportSnapshot.objects.filter(month=3).exists())
+        self.client.get(self.report_url)
+        self.assertFalse(ReportSnapshot.objects.filter(month=3).exists())
@@ -0,0 +1,141 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Customer, Invoice, Product
+from ..search_utils import normalize_phone, query_terms, ranked_search, search, search_queryset
+from ..tables import CustomerFilter, InvoiceFilter
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_search_utils
+
+class QueryTermsTest(SimpleTestCase):
+
+    def test_words_become_lowercase_prefixes(self):
+        self.assertEqual(query_terms("  Chan, Tai-Man "), ['chan', 'tai', 'man'])
+
+    def test_phone_search_becomes_digits(self):
+        self.assertEqual(query_terms("+852 2345-6789"), ['85223456789'])
+        self.assertEqual(query_terms("(2345) 67"), ['234567'])
+
+    def test_phone_index_tokens_are_digit_suffixes(self):
+        self.assertEqual(normalize_phone("2345-6789"), "23456789 3456789 456789 56789 6789 789")
+        self.assertEqual(normalize_phone("+852 2345 6789").split()[:2], ["85223456789", "5223456789"])
+        self.assertEqual(normalize_phone("12"), "12")
+        self.assertEqual(normalize_phone(None), "")
+
+
+class SearchIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic = Customer.objects.create(name="Chan Medical Clinic", care_of="Dr Wong",
+                                             address="12 Nathan Road", telephone_number="+852 2345 6789")
+        cls.pharmacy = Customer.objects.create(name="Kowloon Pharmacy", care_of="Mr Chan",
+                                               address="3 Chanceller Street", telephone_number="3456 7890")
+        cls.product = Product.objects.create(name="Licarlo (Lot no: A123)", supplier="Medipharm")
+        cls.invoice = Invoice.objects.create(number="34963", customer=cls.clinic)
+
+    def test_prefix_match(self):
+        self.assertQuerySetEqual(search_queryset(Customer.objects.all(), "kowl pharm"), [self.pharmacy])
+        self.assertQuerySetEqual(search_queryset(Product.objects.all(), "licar"), [self.product])
+        self.assertQuerySetEqual(search_queryset(Invoice.objects.all(), "3496"), [self.invoice])
+
+    def test_name_matches_rank_first(self):
+        results = ranked_search(Customer.objects.all(), "chan")
+        self.assertEqual(list(results), [self.clinic, self.pharmacy])
+
+    def test_phone_search_ignores_formatting(self):
+        for query in ("23456789", "2345 6789", "+852 2345-6789", "852 2345", "52 234"):
+            with self.subTest(query=query):
+                self.assertQuerySetEqual(search_queryset(Customer.objects.all(), query), [self.clinic])
+
+    def test_column_restricted_search(self):
+        results = search_queryset(Customer.objects.all(), "chan", columns=['subtitle'])
+        self.assertQuerySetEqual(results, [self.pharmacy])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.pharmacy.name = "Harbour Pharmacy"
+        self.pharmacy.save()
+        self.assertFalse(search_queryset(Customer.objects.all(), "kowloon").exists())
+        self.assertTrue(search_queryset(Customer.objects.all(), "harbour").exists())
+
+        self.product.delete()
+        self.assertEqual(search("licarlo"), [])
+
+    def test_customer_rename_reindexes_invoices(self):
+        self.clinic.name = "Lee Medical Clinic"
+        self.clinic.save()
+        self.assertQuerySetEqual(search_queryset(Invoice.objects.all(), "lee", columns=['subtitle']), [self.invoice])
+
+    def index_queries(self, instance, **changes):
+        """Queries touching the index or the invoices while ``instance`` is saved with ``changes``."""
+        for field, value in changes.items():
+            setattr(instance, field, value)
+        with CaptureQueriesContext(connection) as queries:
+            instance.save()
+        return [query['sql'] for query in queries if 'invoice_search' in query['sql']
+                or query['sql'].startswith('SELECT "invoice_invoice"')]
+
+    def test_saves_leaving_the_indexed_fields_skip_the_index(self):
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(self.index_queries(product, quantity=500), [])
+        clinic = Customer.objects.get(pk=self.clinic.pk)
+        self.assertEqual(self.index_queries(clinic, office_hour="9am - 6pm"), [])
+
+        # The address is only in the customer's own entry
+        self.assertEqual(len(self.index_queries(clinic, address="8 Canton Road")), 2)
+        self.assertTrue(search_queryset(Customer.objects.all(), "canton").exists())
+        self.assertEqual(self.index_queries(clinic, address="8 Canton Road"), [])
+
+    def test_objects_built_with_a_primary_key_are_indexed(self):
+        Customer(pk=self.pharmacy.pk, name="Harbour Pharmacy", address="3 Chanceller Street",
+                 telephone_number="3456 7890").save()
+        self.assertTrue(search_queryset(Customer.objects.all(), "harbour").exists())
+
+    def test_search_across_kinds(self):
+        kinds = {(result['kind'], result['id']) for result in search("chan")}
+        self.assertEqual(kinds, {('customer', self.clinic.pk), ('customer', self.pharmacy.pk),
+                                 ('invoice', self.invoice.pk)})
+        self.assertEqual([result['kind'] for result in search("chan", kinds=['invoice'])], ['invoice'])
+
+    def test_filters_use_index(self):
+        customers = CustomerFilter({'telephone_number': '56 7890'}, queryset=Customer.objects.all()).qs
+        self.assertQuerySetEqual(customers, [self.pharmacy])
+        invoices = InvoiceFilter({'customer_name': 'chan med'}, queryset=Invoice.objects.all()).qs
+        self.assertQuerySetEqual(invoices, [self.invoice])
+
+
+class SearchEndpointTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('search', 'search@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_api_search(self):
+        response = self.client.get('/api/search/', {'q': 'nath', 'kind': 'customer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['id'] for result in response.json()['results']], [self.customer.pk])
+
+    def test_api_search_limit_is_at_least_one(self):
+        Customer.objects.create(name="Chan Dental Clinic", address="8 Nathan Road")
+        for limit in ('-1', '0'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/search/', {'q': 'nath', 'limit': limit})
+                self.assertEqual(len(response.json()['results']), 1)
+
+    def test_api_search_rejects_unknown_kind(self):
+        response = self.client.get('/api/search/', {'q': 'chan', 'kind': 'salesman'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_autocomplete(self):
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'invoice', 'model_name': 'invoice', 'field_name': 'customer', 'term': 'chan med',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['id'] for result in response.json()['results']], [str(self.customer.pk)])
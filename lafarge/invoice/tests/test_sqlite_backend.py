@@ -0,0 +1,64 @@
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.test import SimpleTestCase, override_settings
+
+from ..sqlite_backend.base import DatabaseWrapper
+from ..sqlite_utils import read_pragmas
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_sqlite_backend
+
+TUNED_ALIAS = 'tuned_sqlite'
+
+
+class SqliteBackendTest(SimpleTestCase):
+    """The test database is in memory and never tuned, so these run on a database file of their own."""
+
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = directory / 'tuned.sqlite3'
+        connection = DatabaseWrapper({**connections['default'].settings_dict, 'NAME': str(self.path)}, TUNED_ALIAS)
+        connections[TUNED_ALIAS] = connection
+        self.addCleanup(connections.__delitem__, TUNED_ALIAS)
+        self.addCleanup(connection.close)
+        self.connection = connection
+
+    def other_writer_blocked(self):
+        """Whether a second connection fails to take the write lock right now."""
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("ROLLBACK")
+            return False
+        except sqlite3.OperationalError as error:
+            self.assertIn("locked", str(error))
+            return True
+        finally:
+            other.close()
+
+    def test_new_connections_get_the_profile(self):
+        pragmas = read_pragmas(self.connection, ['journal_mode', 'busy_timeout', 'synchronous', 'temp_store'])
+
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['busy_timeout'], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(pragmas['synchronous'], 1)  # NORMAL
+        self.assertEqual(pragmas['temp_store'], 2)  # MEMORY
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        self.connection.ensure_connection()
+        with transaction.atomic(using=TUNED_ALIAS):
+            # Nothing written yet, but the lock is already held
+            self.assertTrue(self.other_writer_blocked())
+        self.assertFalse(self.other_writer_blocked())
+
+    @override_settings(SQLITE_IMMEDIATE_TRANSACTIONS=False)
+    def test_deferred_transactions_when_disabled(self):
+        self.connection.ensure_connection()
+        with transaction.atomic(using=TUNED_ALIAS):
+            self.assertFalse(self.other_writer_blocked())
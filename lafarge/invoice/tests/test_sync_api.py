@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from ..deletion_utils import delete_invoices
+from ..models import Customer, Invoice, InvoiceItem, Product, SyncChange
+from ..sync_utils import changes_since, compact_changes, log_unlogged_objects, record_changes
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_sync_api
+
+class SyncApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('driver', 'driver@example.com', 'password')
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road")
+        cls.product = Product.objects.create(name="Amoxil 500mg", quantity=100, price=10)
+
+    def position(self):
+        return SyncChange.objects.order_by('seq').last().seq
+
+    def test_returns_only_objects_changed_since_position(self):
+        since = self.position()
+        invoice = Invoice.objects.create(number="1001", customer=self.customer)
+        item = InvoiceItem.objects.create(invoice=invoice, product=self.product, quantity=2)
+
+        feed = changes_since(since)
+
+        self.assertEqual([row['id'] for row in feed['changes']['invoice']], [invoice.id])
+        self.assertEqual(feed['changes']['invoice'][0]['total_price'], "20.00")
+        self.assertEqual([row['id'] for row in feed['changes']['invoiceitem']], [item.id])
+        self.assertEqual([row['quantity'] for row in feed['changes']['product']], ["98.0"])
+        self.assertEqual(feed['changes']['customer'], [])
+        self.assertFalse(feed['more'])
+        self.assertEqual(changes_since(feed['next'])['changes']['invoice'], [])
+
+    def test_deletes_leave_tombstones(self):
+        invoice = Invoice.objects.create(number="1001", customer=self.customer)
+        kept = InvoiceItem.objects.create(invoice=invoice, product=self.product, quantity=1)
+        since = self.position()
+        removed = InvoiceItem.objects.create(invoice=invoice, product=self.product, quantity=1)
+        removed_id = removed.id
+        removed.delete()
+
+        feed = changes_since(since)
+
+        self.assertEqual(feed['deleted']['invoiceitem'], [removed_id])
+        self.assertEqual(feed['changes']['invoiceitem'], [])
+        self.assertEqual(feed['deleted']['invoice'], [])
+
+        since = feed['next']
+        delete_invoices(Invoice.objects.all())
+        feed = changes_since(since)
+        self.assertEqual(feed['deleted'], {'customer': [], 'product': [], 'invoice': [invoice.id],
+                                           'invoiceitem': [kept.id]})
+        self.assertEqual(feed['changes']['product'][0]['quantity'], "100.0")
+
+    def test_logging_a_change_is_one_insert(self):
+        with self.assertNumQueries(1):
+            record_changes(Product, [self.product.id])
+
+    def test_endpoint_pages_through_the_log(self):
+        since = self.position()
+        for number in range(1001, 1006):
+            Invoice.objects.create(number=str(number), customer=self.customer)
+        self.client.force_login(self.user)
+        url = reverse('SyncView')
+
+        first = self.client.get(url, {'since': since, 'limit': 3}).json()
+        second = self.client.get(url, {'since': first['next'], 'limit': 3}).json()
+
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        numbers = [row['number'] for page in (first, second) for row in page['changes']['invoice']]
+        self.assertEqual(numbers, ["1001", "1002", "1003", "1004", "1005"])
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_endpoint_limit_is_at_least_one(self):
+        since = self.position()
+        Invoice.objects.create(number="1001", customer=self.customer)
+        Invoice.objects.create(number="1002", customer=self.customer)
+        self.client.force_login(self.user)
+        url = reverse('SyncView')
+
+        for limit in (0, -1):
+            feed = self.client.get(url, {'since': since, 'limit': limit}).json()
+            self.assertTrue(feed['more'])
+            self.assertGreater(feed['next'], since)
+            self.assertEqual([row['number'] for row in feed['changes']['invoice']], ["1001"])
+
+    def test_backfill_and_compaction(self):
+        bulk = Customer.objects.bulk_create([Customer(name="Wong Pharmacy", address="3 Queen's Road")])[0]
+        self.assertEqual(log_unlogged_objects()['customer'], 1)
+        self.assertEqual(log_unlogged_objects()['customer'], 0)
+        self.assertIn(bulk.id, [row['id'] for row in changes_since(0)['changes']['customer']])
+
+        self.product.save()
+        self.assertEqual(SyncChange.objects.filter(model='product', object_id=self.product.id).count(), 2)
+        compact_changes()
+        latest = SyncChange.objects.get(model='product', object_id=self.product.id)
+        self.assertEqual(latest.seq, self.position())
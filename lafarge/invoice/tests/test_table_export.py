@@ -0,0 +1,90 @@
+import csv
+import io
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from ..models import Customer, Invoice, InvoiceItem, Product, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_table_export
+
+class StreamingExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('exports', 'exports@example.com', 'password')
+        cls.salesman = Salesman.objects.create(code="DS", name="Dominic So")
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", care_of="Chan Tai Man",
+                                               address="12 Nathan Road", salesman=cls.salesman)
+        cls.product = Product.objects.create(name="Amoxil 500mg", quantity=1000, price=10, unit="box")
+        for number in range(1, 4):
+            invoice = Invoice.objects.create(number=f"{number:04d}", customer=cls.customer)
+            InvoiceItem.objects.create(invoice=invoice, product=cls.product, quantity=number)
+            InvoiceItem.objects.create(invoice=invoice, product=cls.product, quantity=1, product_type='bonus')
+            invoice.delivery_date = date(2024, 3, number)  # Logs the product transactions
+            invoice.save()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.customer_url = reverse('customer_detail', args=[self.customer.name, self.customer.care_of])
+
+    def csv_rows(self, response):
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_customer_csv_is_streamed_without_html(self):
+        response = self.client.get(self.customer_url, {'_export': 'csv', 'sort': 'number'})
+
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = self.csv_rows(response)
+        self.assertEqual(rows[0], ['Number', 'Total Price', 'Delivery Date', 'Payment Date', 'Items'])
+        self.assertEqual(rows[1][:3], ['0001', '10.00', '2024-03-01'])
+        self.assertEqual(rows[1][4], 'Amoxil 500mg: 1.0 @ $10.00; Amoxil 500mg: 1.0 @ (bonus)')
+        self.assertEqual(len(rows), 4)
+
+    def test_customer_xlsx_is_written_in_write_only_mode(self):
+        response = self.client.get(self.customer_url, {'_export': 'xlsx', 'sort': 'number'})
+
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        self.assertEqual(rows[0][0], 'Number')
+        self.assertEqual([row[0] for row in rows[1:]], ['0001', '0002', '0003'])
+        self.assertEqual(float(rows[3][1]), 30)
+
+    async def test_exports_are_async_iterators_under_asgi(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+
+        response = await self.async_client.get(self.customer_url, {'_export': 'csv', 'sort': 'number'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual([row[0] for row in rows], ['Number', '0001', '0002', '0003'])
+
+        response = await self.async_client.get(self.customer_url, {'_export': 'xlsx', 'sort': 'number'})
+        self.assertTrue(response.is_async)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(load_workbook(io.BytesIO(content)).active['A4'].value, '0003')
+
+    def test_export_queries_do_not_grow_with_rows(self):
+        # Session, user, customer, count, then the invoices and their prefetched items and products
+        with self.assertNumQueries(7):
+            self.csv_rows(self.client.get(self.customer_url, {'_export': 'csv'}))
+
+    def test_salesman_and_product_exports(self):
+        rows = self.csv_rows(self.client.get(reverse('salesman_detail', args=[self.salesman.id]),
+                                             {'_export': 'csv', 'sort': 'number'}))
+        self.assertEqual(rows[0], ['Number', 'Customer Name', 'Items', 'Payment Date', 'Delivery Date',
+                                   'Total Amount'])
+        self.assertEqual(rows[3][2], 'Amoxil 500mg: 3.0 box @ $10.00; Amoxil 500mg: 1.0 box @ (bonus)')
+        self.assertEqual(rows[3][5], '30.00')
+
+        rows = self.csv_rows(self.client.get(reverse('product_transaction_detail', args=[self.product.id]),
+                                             {'_export': 'csv'}))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[1][:3], ['0001', 'Chan Medical Clinic', 'OUT'])
@@ -0,0 +1,119 @@
+from datetime import date
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from ..cache_utils import check_shared_cache, data_version
+from ..db_routers import REPLICA_ALIAS
+from ..metrics_utils import cache_requests
+from ..models import Customer, Invoice, InvoiceItem, Product, Salesman
+
+
+# RUN TEST WITH THIS COMMAND python manage.py test invoice.tests.test_view_cache
+
+class VersionedViewCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('dashboard', 'dashboard@example.com', 'password')
+        cls.salesman = Salesman.objects.create(code="DS", name="Dominic So")
+        cls.customer = Customer.objects.create(name="Chan Medical Clinic", address="12 Nathan Road",
+                                               salesman=cls.salesman)
+        cls.product = Product.objects.create(name="Amoxil 500mg", quantity=1000, price=10)
+        cls.invoice = Invoice.objects.create(number="1001", customer=cls.customer, delivery_date=localdate())
+        InvoiceItem.objects.create(invoice=cls.invoice, product=cls.product, quantity=3)
+
+    def setUp(self):
+        # Entries cached by other tests would be served for rolled-back data
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def hits(self, name):
+        return cache_requests._values.get((f"view:{name}", 'hit'), 0)
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        url = reverse('monthly_preview')
+        first = self.client.get(url)
+        hits = self.hits('monthly_preview')
+
+        with self.assertNumQueries(2):  # Session and user only
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.hits('monthly_preview'), hits + 1)
+
+    def test_data_changes_invalidate_entries(self):
+        url = reverse('monthly_preview')
+        self.client.get(url)
+        version = data_version()
+
+        InvoiceItem.objects.create(invoice=self.invoice, product=self.product, quantity=4)
+        self.assertGreater(data_version(), version)
+        self.assertContains(self.client.get(url), "70")
+
+        version = data_version()
+        self.product.price = 12
+        self.product.save()
+        self.assertGreater(data_version(), version)
+
+    def test_pages_are_cached_per_user(self):
+        self.client.get(reverse('home'))
+        misses = cache_requests._values.get(("view:home", 'miss'), 0)
+
+        other = User.objects.create_superuser('accounts', 'accounts@example.com', 'password')
+        self.client.force_login(other)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_requests._values.get(("view:home", 'miss'), 0), misses + 1)
+
+    def test_api_responses_are_cached_as_data(self):
+        self.client.logout()  # No session to load, so a hit runs no query at all
+        url = reverse('salesmen_commission_matrix', kwargs={'year': date.today().year})
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.json(), first.json())
+
+
+class ReplicaViewCacheTest(TestCase):
+    databases = {'default', REPLICA_ALIAS}
+
+    def setUp(self):
+        cache.clear()
+
+    def hits(self, name):
+        return cache_requests._values.get((f"view:{name}", 'hit'), 0)
+
+    @mock.patch('invoice.db_routers.replica_available', return_value=True)
+    def test_replica_reads_are_not_stored(self, available):
+        url = reverse('salesmen_commission_matrix', kwargs={'year': date.today().year})
+        hits = self.hits('salesmen_commission_matrix')
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.hits('salesmen_commission_matrix'), hits)
+
+        available.return_value = False
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.hits('salesmen_commission_matrix'), hits + 1)
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_locmem_is_refused_for_several_workers(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['invoice.E001'])
+
+    @override_settings(WEB_CONCURRENCY=4, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/0'}})
+    def test_shared_backends_pass(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    def test_locmem_is_fine_for_one_worker(self):
+        self.assertTrue(settings.CACHES['default']['BACKEND'].endswith('.LocMemCache'))
+        self.assertEqual(check_shared_cache(None), [])
@@ -1,15 +1,15 @@
 from django.urls import path, re_path
 
 from .views.api_views import (
-    ProductView, InvoiceView, CustomerView,
-    UpdateDeliveryDateView, UpdatePaymentDateView, SalesmanMonthlyReport, SalesmanMonthlyPreview,
-    GetAllSalesmenCommissions
+    ProductView, InvoiceView, InvoiceDetailedView, CustomerView, CustomerPriceBookView, QuoteView, SearchView,
+    SyncView, UpdateDeliveryDateView, UpdatePaymentDateView, SalesmanMonthlyReport, SalesmanMonthlyPreview,
+    GetAllSalesmenCommissions, SalesmenCommissionMatrix
 )
 from .views.customer_page_views import (
     CustomerListView, customer_detail,
     customers_with_unpaid_invoices, unpaid_invoices_by_customer, unpaid_invoices_by_month_detail, copy_previous_order
 )
-from .views.home_page_views import home, sales_data, product_insights_data
+from .views.home_page_views import home, sales_data, product_insights_data, dashboard_events
 from .views.invoice_page_views import InvoiceListView, invoice_detail, monthly_preview, monthly_report
 from .views.pdf_download_views import (
     download_delivery_note_pdf, download_invoice_legacy_pdf,
@@ -25,8 +25,10 @@ from .views.salesman_page_views import (
 
 from .views.deliveryman_page_views import (deliveryman_list,deliveryman_monthly_preview, deliveryman_monthly_report)
 
-from .views.payment_page_views import (monthly_payment_preview, monthly_payment_report)
+from .views.payment_page_views import (monthly_payment_preview, monthly_payment_report, deposit_slips)
 from .views.analyze_page_views import (monthly_analyze_preview, monthly_analyze_detail, monthly_analyze_api)
+from .views.profiling_views import profile_list, download_profile
+from .views.metrics_views import metrics
 
 urlpatterns = [
     # Salesmen
@@ -60,16 +62,23 @@ urlpatterns = [
     # API Endpoints
     path("api/products/", ProductView, name="ProductView"),
     path("api/invoices/", InvoiceView, name="InvoiceView"),
+    path("api/invoices/detailed/", InvoiceDetailedView, name="InvoiceDetailedView"),
     path("api/customers/", CustomerView, name="CustomerView"),
+    path("api/customers/<int:customer_id>/price-book/", CustomerPriceBookView, name="CustomerPriceBookView"),
+    path("api/quote/", QuoteView, name="QuoteView"),
+    path("api/search/", SearchView, name="SearchView"),
+    path("api/sync/", SyncView, name="SyncView"),
     path('api/update-delivery-date/', UpdateDeliveryDateView.as_view(), name='update-delivery-date'),
     path('api/update-payment-date/', UpdatePaymentDateView.as_view(), name='update-payment-date'),
-    path('api/salesman/<str:salesman_name>/monthly/', SalesmanMonthlyReport.as_view(), name='salesman-monthly-preview'),
+    path('api/salesman/<str:salesman_name>/monthly/', SalesmanMonthlyPreview, name='salesman-monthly-preview'),
     path('api/salesman/<str:salesman_name>/monthly/<int:year>/<int:month>/', SalesmanMonthlyReport.as_view(), name='salesman-monthly-report'),
     path("api/salesmen/commissions/<int:year>/<int:month>/", GetAllSalesmenCommissions.as_view(), name="get_all_salesmen_commissions"),
+    path("api/salesmen/commissions/<int:year>/", SalesmenCommissionMatrix.as_view(), name="salesmen_commission_matrix"),
 
     # Payments
     path("payments/monthly", monthly_payment_preview, name="monthly_payment_preview"),
     path("payments/monthly/<int:year>/<int:month>/", monthly_payment_report, name="monthly_payment_report"),
+    path("payments/deposit-slips/", deposit_slips, name="deposit_slips"),
 
     # Unpaids
     path('unpaid-invoices/', customers_with_unpaid_invoices, name='unpaid_invoices'),
@@ -90,8 +99,16 @@ urlpatterns = [
     path("analyze/monthly/<int:year>/<int:month>/", monthly_analyze_detail, name="monthly_analyze_detail"),
     path("api/analyze/monthly/<int:year>/<int:month>/", monthly_analyze_api, name="monthly_analyze_api"),
 
+    # Profiling
+    path('profiles/', profile_list, name='profile_list'),
+    path('profiles/<str:name>/download/', download_profile, name='download_profile'),
+
+    # Monitoring
+    path('metrics', metrics, name='metrics'),
+
     # Home
     path('', home, name='home'),
     path('sales-data/', sales_data, name='sales_data'),
     path('product_insights/', product_insights_data, name='product_insights'),
+    path('dashboard/events/', dashboard_events, name='dashboard_events'),
 ]
@@ -3,18 +3,22 @@ from collections import defaultdict
 from datetime import datetime, timedelta
 
 from dateutil.relativedelta import relativedelta
-from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Sum
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
-from django.utils.timezone import make_aware, now
+from django.utils.timezone import now
 
+from ..cache_utils import versioned_cache
 from ..models import Invoice, InvoiceItem
-from ..decorators import user_is_lafarge_or_superuser
+from ..decorators import staff_member_required_async, use_replica, user_is_lafarge_or_superuser
+from ..period_utils import month_period
+from ..report_utils import render_report
 
 
 @user_is_lafarge_or_superuser
+@use_replica
+@versioned_cache('monthly_analyze_preview')
 def monthly_analyze_preview(request):
     """Display monthly analysis cards similar to invoice monthly preview."""
     latest_invoice = Invoice.objects.filter(delivery_date__isnull=False).order_by('-delivery_date').first()
@@ -32,18 +36,19 @@ def monthly_analyze_preview(request):
         # Skip January 2025 per business requirement
         if year == 2025 and month == 1:
             continue
+        period = month_period(year, month)
 
         # Calculate total products sold (by revenue)
         total_revenue = (
             InvoiceItem.objects
-            .filter(invoice__delivery_date__year=year, invoice__delivery_date__month=month)
+            .filter(**period.lookups('invoice__delivery_date'))
             .aggregate(total=Sum("sum_price"))["total"] or 0
         )
 
         # Count unique products (cleaned names)
         invoice_items = (
             InvoiceItem.objects
-            .filter(invoice__delivery_date__year=year, invoice__delivery_date__month=month)
+            .filter(**period.lookups('invoice__delivery_date'))
             .select_related('product')
             .values('product__name')
         )
@@ -68,64 +73,32 @@ def monthly_analyze_preview(request):
 
 
 @user_is_lafarge_or_superuser
+@use_replica
 def monthly_analyze_detail(request, year, month):
     """Display detailed monthly product analysis with horizontal bar chart."""
-    # Get all invoice items for the specified month
-    invoice_items = (
-        InvoiceItem.objects
-        .filter(invoice__delivery_date__year=year, invoice__delivery_date__month=month)
-        .select_related('product')
-        .values('product__name', 'sum_price', 'quantity')
-    )
-
-    # Group by cleaned product name (without lot numbers)
-    grouped_products = defaultdict(lambda: {'revenue': 0.0, 'quantity': 0.0})
-    for item in invoice_items:
-        if item['product__name']:
-            clean_name = re.sub(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)", "", item['product__name'])
-            grouped_products[clean_name]['revenue'] += float(item['sum_price'] or 0)
-            grouped_products[clean_name]['quantity'] += float(item['quantity'] or 0)
-
-    # Convert to list format and sort by revenue
-    product_analysis = [
-        {
-            'name': name,
-            'revenue': data['revenue'],
-            'quantity': data['quantity']
-        }
-        for name, data in sorted(grouped_products.items(), key=lambda x: x[1]['revenue'], reverse=True)
-    ]
-
-    # Calculate month name
-    month_name = datetime(year, month, 1).strftime('%B %Y')
-
-    context = {
-        'year': year,
-        'month': month,
-        'month_name': month_name,
-        'product_analysis': product_analysis,
-        'total_revenue': sum(p['revenue'] for p in product_analysis),
-        'total_products': len(product_analysis),
-    }
+    return render(request, 'invoice/monthly_analyze_detail.html', {
+        'report_html': render_report('monthly_analyze_detail', year, month),
+    })
 
-    return render(request, 'invoice/monthly_analyze_detail.html', context)
 
-
-@staff_member_required
-def monthly_analyze_api(request, year, month):
+@staff_member_required_async
+@use_replica
+@versioned_cache('monthly_analyze_api', vary_on_user=False)
+async def monthly_analyze_api(request, year, month):
     """API endpoint for monthly product analysis data."""
+    period = month_period(year, month)
     try:
         # Get all invoice items for the specified month
         invoice_items = (
             InvoiceItem.objects
-            .filter(invoice__delivery_date__year=year, invoice__delivery_date__month=month)
+            .filter(**period.lookups('invoice__delivery_date'))
             .select_related('product')
             .values('product__name', 'sum_price', 'quantity')
         )
 
         # Group by cleaned product name (without lot numbers)
         grouped_products = defaultdict(lambda: {'revenue': 0.0, 'quantity': 0.0})
-        for item in invoice_items:
+        async for item in invoice_items:
             if item['product__name']:
                 clean_name = re.sub(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)", "", item['product__name'])
                 grouped_products[clean_name]['revenue'] += float(item['sum_price'] or 0)
@@ -151,4 +124,4 @@ def monthly_analyze_api(request, year, month):
         return JsonResponse(data)
 
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
@@ -1,42 +1,152 @@
 from rest_framework import status
 from rest_framework.decorators import api_view
 from django.shortcuts import get_object_or_404
-from django.utils.timezone import make_aware
 from django.db.models import Sum
+from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from collections import defaultdict
+import asyncio
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
-from calendar import monthrange
 import re
 
+from ..async_utils import api_response, aserialize, async_api_view
+from ..cache_utils import versioned_cache
+from ..commission_utils import load_rules, month_commission, monthly_commissions
+from ..decorators import use_replica
+from ..period_utils import month_period, year_period
+from ..price_book_utils import resolve_prices
+from ..pricing_utils import quote_order
+from ..search_utils import KINDS, search
 from ..serializers import *
+from ..sync_utils import changes_since
 
 
-@api_view(['GET'])
-def ProductView(request):
+@async_api_view()
+async def ProductView(request):
     """API endpoint to retrieve all products."""
-    products = Product.objects.all()
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    return api_response(await aserialize(ProductSerializer, Product.objects.all()))
 
 
-@api_view(['GET'])
-def InvoiceView(request):
+@async_api_view()
+async def InvoiceView(request):
     """API endpoint to retrieve all invoices."""
-    invoices = Invoice.objects.all()
-    serializer = InvoiceSerializer(invoices, many=True)
-    return Response(serializer.data)
+    return api_response(await aserialize(InvoiceSerializer, Invoice.objects.prefetch_related('products')))
 
 
 @api_view(['GET'])
-def CustomerView(request):
+def InvoiceDetailedView(request):
+    """
+    API endpoint returning invoices with customer, salesman, deliveryman and items embedded.
+
+    Pages by invoice id: pass the returned ``next`` value as ``after`` to get the
+    following page. ``limit`` defaults to 100 and is kept between 1 and 1000.
+    """
+    try:
+        after = int(request.query_params.get('after', 0))
+        limit = max(1, min(int(request.query_params.get('limit', 100)), 1000))
+    except ValueError:
+        return Response({"error": "after and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    invoices = serialize_invoices(Invoice.objects.filter(id__gt=after).order_by('id')[:limit])
+    next_after = invoices[-1]['id'] if len(invoices) == limit else None
+    return Response({"results": invoices, "next": next_after})
+
+
+@api_view(['GET'])
+def SyncView(request):
+    """
+    API endpoint for the delta sync of customers, products, invoices and invoice items.
+
+    Returns the rows saved and the ids deleted since position ``since`` (0 for
+    a full download). Ask again from ``next`` while ``more`` is true.
+    """
+    try:
+        since = int(request.query_params.get('since', 0))
+        limit = max(1, min(int(request.query_params.get('limit', 1000)), 5000))
+    except ValueError:
+        return Response({"error": "since and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(changes_since(since, limit))
+
+
+@async_api_view()
+async def CustomerView(request):
     """API endpoint to retrieve all customers."""
-    customers = Customer.objects.all()
-    serializer = CustomerSerializer(customers, many=True)
-    return Response(serializer.data)
+    return api_response(await aserialize(CustomerSerializer, Customer.objects.all()))
+
+
+@api_view(['GET'])
+def CustomerPriceBookView(request, customer_id):
+    """
+    API endpoint returning a customer's unit price for every product, or for the
+    comma-separated ``products`` ids given.
+    """
+    if not Customer.objects.filter(pk=customer_id).exists():
+        return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
+    products = Product.objects.only('id', 'name', 'price').order_by('name')
+    if request.query_params.get('products'):
+        try:
+            ids = [int(pk) for pk in request.query_params['products'].split(',')]
+        except ValueError:
+            return Response({"error": "products must be comma-separated ids"}, status=status.HTTP_400_BAD_REQUEST)
+        products = products.filter(pk__in=ids)
+    products = list(products)
+    prices = resolve_prices(customer_id, products)
+    # Prices as strings, like the model serializers
+    return Response({
+        "customer": customer_id,
+        "products": [
+            {"id": product.id, "name": product.name, "list_price": str(product.price),
+             "price": str(prices[product.pk][0]), "special": prices[product.pk][1]}
+            for product in products
+        ],
+    })
+
+
+@api_view(['POST'])
+def QuoteView(request):
+    """
+    API endpoint pricing a draft order as saving it would, without saving anything.
+
+    Body: ``{"customer": id, "lines": [{"product": id, "quantity": n, "product_type": "normal",
+    "net_price": "0.00"}, ...]}``.
+    """
+    serializer = QuoteSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    quote = quote_order(serializer.validated_data['customer'].id, serializer.validated_data['lines'])
+    if quote['unknown_products']:
+        return Response({"error": "Products not found", "products": quote['unknown_products']},
+                        status=status.HTTP_400_BAD_REQUEST)
+    # Amounts as strings, like the model serializers
+    return Response({
+        "lines": [
+            {**line, **{field: None if line[field] is None else str(line[field])
+                        for field in ('quantity', 'net_price', 'price', 'sum_price')}}
+            for line in quote['lines']
+        ],
+        "total": str(quote['total']),
+    })
+
+
+@api_view(['GET'])
+def SearchView(request):
+    """
+    API endpoint searching customers, products and invoices by word prefix or phone number.
+
+    Query parameters: ``q``, an optional comma-separated ``kind`` filter and ``limit`` (1 to 100).
+    """
+    kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        return Response({"error": f"Unknown kind: {', '.join(sorted(unknown))}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    results = search(request.query_params.get('q', ''), kinds=kinds, limit=limit)
+    return Response({"results": results})
 
 
 class UpdateDeliveryDateView(APIView):
@@ -84,80 +194,64 @@ class UpdatePaymentDateView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-def sales_incentive_scheme(sales):
-    """
-    Calculate commission rate based on sales volume tiers.
-    
-    Args:
-        sales (float): Total sales amount
-        
-    Returns:
-        float: Commission percentage (as decimal)
-    """
-    if sales < 50000:
-        return 0.02
-    elif sales < 70000:
-        return 0.025
-    elif sales < 100000:
-        return 0.0325
-    elif sales < 130000:
-        return 0.04
-    elif sales < 170000:
-        return 0.05
-    elif sales >= 170000:
-        return 0.055
-
-
-class SalesmanMonthlyPreview(APIView):
+@async_api_view()
+@use_replica
+async def SalesmanMonthlyPreview(request, salesman_name):
     """API endpoint for salesman monthly sales summary."""
-    
-    def get(self, request, salesman_name):
-        salesman = get_object_or_404(Salesman, name__istartswith=salesman_name.capitalize())
-        latest_invoice = Invoice.objects.filter(salesman=salesman, delivery_date__isnull=False)
-        latest_invoice = latest_invoice.order_by('-delivery_date').first()
-        today = latest_invoice.delivery_date if latest_invoice else datetime.now().date()
-
-        months = []
-        for i in range(12):  # Process last 12 months of data
-            date = today.replace(day=1) - relativedelta(months=i)
-            year, month = date.year, date.month
-            if year == 2025 and month == 1:
-                continue
-            total_amount = Invoice.objects.filter(
-                salesman=salesman, delivery_date__year=year, delivery_date__month=month
-            ).aggregate(total=Sum("total_price"))["total"] or 0
-
-            if total_amount > 0:
-                months.append({
-                    'year': year,
-                    'month': month,
-                    'name': date.strftime('%B %Y'),
-                    'total': total_amount,
-                })
-
-        return Response({"months": months, "salesman": salesman.name})
+    try:
+        salesman = await Salesman.objects.aget(name__istartswith=salesman_name.capitalize())
+    except Salesman.DoesNotExist:
+        return api_response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    latest_invoice = Invoice.objects.filter(salesman=salesman, delivery_date__isnull=False)
+    latest_invoice = await latest_invoice.order_by('-delivery_date').afirst()
+    today = latest_invoice.delivery_date if latest_invoice else datetime.now().date()
+
+    dates = []
+    for i in range(12):  # Process last 12 months of data
+        date = today.replace(day=1) - relativedelta(months=i)
+        if not (date.year == 2025 and date.month == 1):
+            dates.append(date)
+    # One aggregate per month, awaited together
+    totals = await asyncio.gather(*(
+        Invoice.objects.filter(
+            salesman=salesman, **month_period(date.year, date.month).lookups('delivery_date')
+        ).aaggregate(total=Sum("total_price"))
+        for date in dates
+    ))
+
+    months = []
+    for date, total in zip(dates, totals):
+        total_amount = total["total"] or 0
+        if total_amount > 0:
+            months.append({
+                'year': date.year,
+                'month': date.month,
+                'name': date.strftime('%B %Y'),
+                'total': total_amount,
+            })
 
+    return api_response({"months": months, "salesman": salesman.name})
 
+
+@method_decorator(use_replica, name='get')
+@method_decorator(versioned_cache('salesman_monthly_report_api', vary_on_user=False), name='get')
 class SalesmanMonthlyReport(APIView):
     """API endpoint for detailed salesman monthly report with commission calculation."""
     
     def get(self, request, salesman_name, year, month):
         salesman = get_object_or_404(Salesman, name__istartswith=salesman_name.capitalize())
-        sales_share1 = get_object_or_404(Salesman, name="DS/MM/AC")
-        sales_share2 = get_object_or_404(Salesman, name="Kelvin Ko")
         year = int(year)
         month = int(month)
 
-        first_day = make_aware(datetime(year, month, 1))
-        last_day = make_aware(datetime(year, month, monthrange(year, month)[1]))
+        period = month_period(year, month)
+        rules = load_rules()
 
         invoices = Invoice.objects.filter(
-            salesman=salesman, delivery_date__range=(first_day, last_day)
+            salesman=salesman, **period.lookups('delivery_date')
         ).select_related('customer', 'salesman').prefetch_related("invoiceitem_set__product")
 
         invoice_shares = Invoice.objects.filter(
-            Q(salesman=sales_share1) | Q(salesman=sales_share2),
-            delivery_date__range=(first_day, last_day)
+            salesman_id__in=rules.shared_accounts, **period.lookups('delivery_date')
         ).select_related('customer', 'salesman').prefetch_related("invoiceitem_set__product")
 
         weeks = {i: {"invoices": [], "total": Decimal("0.00")} for i in range(1, 6)}
@@ -216,14 +310,7 @@ class SalesmanMonthlyReport(APIView):
             }
             invoice_shares_data.append(invoice_data)
 
-        monthly_total_share = sum(inv.total_price for inv in invoice_shares)
-
-
-        commission_percentage = {"Dominic So": 0.4, "Alex Cheung": 0.3, "Matthew Mak": 0.3}.get(salesman.name, 0)
-        personal_monthly_total_share = monthly_total_share * Decimal(str(commission_percentage))
-        sales_monthly_total = monthly_total + personal_monthly_total_share
-        incentive_percentage = sales_incentive_scheme(sales_monthly_total)
-        commission = sales_monthly_total * Decimal(str(incentive_percentage)) * Decimal("1.1")
+        commission = month_commission(salesman.id, year, month, rules)
 
         return Response({
             "weeks": weeks,
@@ -231,63 +318,52 @@ class SalesmanMonthlyReport(APIView):
             "month": month,
             "monthly_total": monthly_total,
             "salesman": salesman.name,
-            "commission": commission,
+            "commission": commission.commission,
             "invoice_shares_data": invoice_shares_data,
-            "monthly_total_share": monthly_total_share,
-            "monthly_total_share_percentage": commission_percentage,
-            "personal_monthly_total_share": personal_monthly_total_share,
-            "sales_monthly_total": sales_monthly_total,
-            "incentive_percentage": incentive_percentage,
+            "monthly_total_share": commission.pooled_sales,
+            "monthly_total_share_percentage": commission.share_percentage,
+            "personal_monthly_total_share": commission.shared_sales,
+            "sales_monthly_total": commission.qualifying_sales,
+            "incentive_percentage": commission.rate,
         })
 
 
+@method_decorator(use_replica, name='get')
+@method_decorator(versioned_cache('salesmen_commissions', vary_on_user=False), name='get')
 class GetAllSalesmenCommissions(APIView):
     """API endpoint for calculating all eligible salesmen commissions for a given month."""
     
     def get(self, request, year, month):
-        year = int(year)
-        month = int(month)
-
-        first_day = make_aware(datetime(year, month, 1))
-        last_day = make_aware(datetime(year, month, monthrange(year, month)[1]))
-
-        sales_share1 = get_object_or_404(Salesman, name="DS/MM/AC")
-        sales_share2 = get_object_or_404(Salesman, name="Kelvin Ko")
-
-        # Filter to commission-eligible salesmen only
-        eligible_salesmen = Salesman.objects.filter(name__in=["Dominic So", "Alex Cheung", "Matthew Mak"])
-
-        response_data = []
-
-        invoice_shares = Invoice.objects.filter(
-            Q(salesman=sales_share1) | Q(salesman=sales_share2),
-            delivery_date__range=(first_day, last_day)
-        )
-
-        monthly_total_share = sum(inv.total_price for inv in invoice_shares)
-
-
-        for salesman in eligible_salesmen:
-            invoices = Invoice.objects.filter(
-                salesman=salesman,
-                delivery_date__range=(first_day, last_day)
-            )
-            monthly_total = sum(inv.total_price for inv in invoices)
-
-            commission_percentage = {
-                "Dominic So": 0.4,
-                "Alex Cheung": 0.3,
-                "Matthew Mak": 0.3
-            }.get(salesman.name, 0)
-
-            personal_monthly_total_share = monthly_total_share * Decimal(str(commission_percentage))
-            sales_monthly_total = monthly_total + personal_monthly_total_share
-            incentive_percentage = sales_incentive_scheme(sales_monthly_total)
-            commission = sales_monthly_total * Decimal(str(incentive_percentage)) * Decimal("1.1")
-
-            response_data.append({
-                "salesman": salesman.name,
-                "commission": round(commission, 2)
-            })
-
-        return Response(response_data)
+        period = month_period(year, month)
+        commissions = monthly_commissions(period)[period.start]
+        names = dict(Salesman.objects.filter(id__in=commissions).values_list('id', 'name'))
+
+        return Response([
+            {"salesman": names[salesman_id], "commission": round(commission.commission, 2)}
+            for salesman_id, commission in sorted(commissions.items(), key=lambda entry: names[entry[0]])
+        ])
+
+
+@method_decorator(use_replica, name='get')
+@method_decorator(versioned_cache('salesmen_commission_matrix', vary_on_user=False), name='get')
+class SalesmenCommissionMatrix(APIView):
+    """API endpoint for the year-to-date commission of every eligible salesman, month by month."""
+
+    def get(self, request, year):
+        period = year_period(year)
+        today = datetime.now().date()
+        if period.start <= today < period.end:
+            period = period._replace(end=month_period(today.year, today.month).end)
+        commissions = monthly_commissions(period)
+        salesmen = Salesman.objects.filter(commission_share__isnull=False).order_by('name')
+
+        rows = []
+        for salesman in salesmen:
+            monthly = [round(commissions[month][salesman.id].commission, 2) for month in commissions]
+            rows.append({"salesman": salesman.name, "commissions": monthly, "total": sum(monthly)})
+        return Response({
+            "year": int(year),
+            "months": [month.strftime('%Y-%m') for month in commissions],
+            "salesmen": rows,
+            "totals": [sum(column) for column in zip(*(row["commissions"] for row in rows))],
+        })
@@ -14,8 +14,10 @@ from django_tables2 import SingleTableMixin
 from django_tables2.config import RequestConfig
 from django_tables2.export.export import TableExport
 
+from ..export_utils import STREAMING_FORMATS, stream_table_export
 from ..models import Customer, Invoice, InvoiceItem
 from ..number_generation_utils import generate_next_number
+from ..period_utils import month_period
 from ..tables import CustomerTable, InvoiceFilter, CustomerFilter, CustomerInvoiceTable
 
 
@@ -31,7 +33,7 @@ class CustomerListView(SingleTableMixin, FilterView):
 def customer_detail(request, customer_name, customer_care_of):
     """Display customer details with filterable invoice history and export functionality."""
     customer = get_object_or_404(Customer, Q(name=customer_name) & (Q(care_of=customer_care_of) | Q(care_of__isnull=True)))
-    invoices = Invoice.objects.filter(customer=customer)
+    invoices = Invoice.objects.filter(customer=customer).prefetch_related('invoiceitem_set__product')
 
     # Filter invoice history based on request parameters
     filter = InvoiceFilter(request.GET, queryset=invoices)
@@ -44,9 +46,11 @@ def customer_detail(request, customer_name, customer_care_of):
 
     # Handle data export if requested
     export_format = request.GET.get("_export", None)
+    if export_format in STREAMING_FORMATS:
+        return stream_table_export(table, export_format, f"{customer_name}_invoices.{export_format}", request=request)
     if TableExport.is_valid_format(export_format):
         exporter = TableExport(export_format, table)  # Pass the table instance here
-        return exporter.response(f"{customer_name}_invoices.{export_format}")
+        return exporter.response(f"{customer_name}_invoices.{export_format}", request=request)
 
     context = {
         'customer': customer,
@@ -58,32 +62,26 @@ def customer_detail(request, customer_name, customer_care_of):
 
 @staff_member_required
 def customers_with_unpaid_invoices(request):
-    # Fetch customers who have at least one unpaid invoice with delivery_date not null
-    customers = Customer.objects.filter(
-        invoice__payment_date__isnull=True,
-        invoice__delivery_date__isnull=False
-    ).distinct().exclude(name="Sample").select_related('salesman')
-
     # Fetch unpaid invoices with delivery_date not null
     unpaid_invoices = Invoice.objects.filter(
         payment_date__isnull=True,
         delivery_date__isnull=False
     ).exclude(number__startswith="S-").select_related('customer', 'salesman')
 
-    # Filter customer data to include only those with at least one unpaid invoice
-    customer_data = []
-    for customer in customers:
-        customer_unpaid_invoices = unpaid_invoices.filter(customer=customer)
-        if customer_unpaid_invoices.exists():  # Ensure at least one unpaid invoice
-            customer_total_unpaid = customer_unpaid_invoices.aggregate(
-                total=Sum('total_price')
-            )['total'] or 0  # Default to 0 if no unpaid invoices
-
-            customer_data.append({
-                "customer": customer,
-                "unpaid_invoices": customer_unpaid_invoices,
-                "total_unpaid": customer_total_unpaid,
-            })
+    # Group the unpaid invoices by customer in one pass instead of querying per customer
+    customer_data = {}
+    for invoice in unpaid_invoices.exclude(customer__name="Sample").order_by('customer_id', 'id'):
+        entry = customer_data.get(invoice.customer_id)
+        if entry is None:
+            entry = customer_data[invoice.customer_id] = {
+                "customer": invoice.customer,
+                "unpaid_invoices": [],
+                "total_unpaid": 0,
+            }
+        entry["unpaid_invoices"].append(invoice)
+        entry["total_unpaid"] += invoice.total_price
+    customer_data = list(customer_data.values())
+    customers = [entry["customer"] for entry in customer_data]
 
     total_unpaid = unpaid_invoices.aggregate(total=Sum('total_price'))['total'] or 0
 
@@ -128,9 +126,8 @@ def unpaid_invoices_by_month_detail(request, year_month):
     # Fetch invoices for the given month
     unpaid_invoices = Invoice.objects.filter(
         payment_date__isnull=True,
-        delivery_date__year=selected_month.year,
-        delivery_date__month=selected_month.month
-    ).exclude(number__startswith="S-")
+        **month_period(selected_month.year, selected_month.month).lookups('delivery_date')
+    ).exclude(number__startswith="S-").select_related('customer')
 
     total_unpaid = unpaid_invoices.aggregate(Sum('total_price'))['total_price__sum'] or 0
 
@@ -1,9 +1,6 @@
-import re
-from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import timedelta
 from decimal import Decimal
 
-from calendar import monthrange
 from dateutil.relativedelta import relativedelta
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Sum
@@ -12,13 +9,15 @@ from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
-from django.utils.timezone import make_aware
 from django.utils.timezone import now
 from django_filters.views import FilterView
 from django_tables2.views import SingleTableMixin
 
+from ..cache_utils import versioned_cache
 from ..decorators import user_is_lafarge_or_superuser
 from ..models import Invoice, Deliveryman
+from ..period_utils import month_period
+from ..report_utils import render_report
 from ..tables import InvoiceFilter
 
 
@@ -28,6 +27,7 @@ def deliveryman_list(request):
     return render(request, 'invoice/deliveryman_list.html', {'deliverymen': deliverymen})
 
 @user_is_lafarge_or_superuser
+@versioned_cache('deliveryman_monthly_preview')
 def deliveryman_monthly_preview(request, deliveryman_id):
     deliveryman = get_object_or_404(Deliveryman, id=deliveryman_id)
 
@@ -48,8 +48,7 @@ def deliveryman_monthly_preview(request, deliveryman_id):
 
         invoice_count = Invoice.objects.filter(
             deliveryman=deliveryman,
-            delivery_date__year=year,
-            delivery_date__month=month
+            **month_period(year, month).lookups('delivery_date')
         ).count()
 
         if invoice_count > 0:
@@ -77,49 +76,6 @@ def deliveryman_monthly_preview(request, deliveryman_id):
 @user_is_lafarge_or_superuser
 def deliveryman_monthly_report(request, deliveryman_id, year, month):
     deliveryman = get_object_or_404(Deliveryman, id=deliveryman_id)
-
-    year, month = int(year), int(month)
-
-    first_day = make_aware(datetime(year, month, 1))
-    last_day = make_aware(datetime(year, month, monthrange(year, month)[1], 23, 59, 59))
-
-    breadcrumbs = [
-        {"name": "Deliverymen", "url": reverse("deliveryman_list")},
-        {"name": deliveryman.name, "url": reverse("deliveryman_monthly_preview", kwargs={"deliveryman_id": deliveryman.id})},
-        {"name": f"{year}-{month:02d} Report", "url": ""},
-    ]
-
-    invoices = Invoice.objects.filter(
-        deliveryman=deliveryman,
-        delivery_date__range=(first_day, last_day)
-    ).select_related('customer').prefetch_related('invoiceitem_set__product').order_by('delivery_date')
-
-    daily_groups = defaultdict(list)
-
-    for invoice in invoices:
-        day = invoice.delivery_date  # already a date object
-        daily_groups[day].append(invoice)
-
-        grouped = defaultdict(list)
-        for item in invoice.invoiceitem_set.all():
-            if item.product:
-                clean_name = re.sub(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)", "", item.product.name).strip()
-                grouped[clean_name].append(str(item.quantity))
-
-        invoice.display_items = [f"{name} ({' + '.join(qtys)})" for name, qtys in grouped.items()]
-
-    sorted_daily_groups = sorted(daily_groups.items())
-
-    # NEW: Calculate total invoice count for the month
-    total_monthly_invoices = invoices.count()  # ← This is correct and fast!
-
-    context = {
-        "deliveryman": deliveryman,
-        "year": year,
-        "month": month,
-        "daily_groups": sorted_daily_groups,
-        "breadcrumbs": breadcrumbs,
-        "total_monthly_invoices": total_monthly_invoices,  # ← Add this
-    }
-
-    return render(request, "invoice/deliveryman_monthly_report.html", context)
\ No newline at end of file
+    return render(request, "invoice/deliveryman_monthly_report.html", {
+        "report_html": render_report('deliveryman_monthly_report', year, month, deliveryman),
+    })
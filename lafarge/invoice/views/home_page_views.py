@@ -1,104 +1,74 @@
+import asyncio
 import calendar
 import logging
 import re
 from collections import defaultdict
-from datetime import datetime
 
+from asgiref.sync import sync_to_async
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Sum
-from django.db.models.functions import ExtractMonth, ExtractYear
-from django.http import JsonResponse
+from django.db.models.functions import ExtractMonth
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils.timezone import localdate
-from django.utils.timezone import make_aware
 from django.utils.timezone import now
 
-from ..models import Invoice
+from ..async_utils import alist
+from ..cache_utils import versioned_cache
+from ..dashboard_utils import dashboard_stream, format_state, tile_versions, today_tile_context
+from ..deposit_utils import pending_deposit_summary
+from ..decorators import is_lafarge_or_superuser, staff_member_required_async, use_replica
+from ..models import Invoice, InvoiceItem
+from ..period_utils import month_period
 
 logger = logging.getLogger(__name__)
 
 
 @staff_member_required
+@versioned_cache('home')
 def home(request):
     """Dashboard view displaying today's invoices and pending deposits."""
-    start_date = make_aware(datetime(2025, 3, 19))
     today = localdate()
-    invoices_today = Invoice.objects.filter(delivery_date=today).select_related(
-        'customer', 'salesman', 'deliveryman',
-    ).prefetch_related('invoiceitem_set__product')
-
-    pending_deposits = Invoice.objects.filter(payment_date__isnull=False, deposit_date__isnull=True,
-                                              payment_date__gte=start_date).select_related('customer')
-
-    future_deposits = pending_deposits.filter(payment_date__gt=today)
-    current_pending_deposits = pending_deposits.exclude(id__in=future_deposits.values('id'))
-
-    total_pending_deposit = current_pending_deposits.aggregate(Sum('total_price'))['total_price__sum'] or 0
-
-    payment_type_totals = current_pending_deposits.values('payment_method').annotate(total=Sum('total_price'))
-    future_payment_type_totals = future_deposits.values('payment_method').annotate(total=Sum('total_price'))
-    payment_totals_dict = {entry['payment_method']: entry['total'] for entry in payment_type_totals}
-    future_payment_totals_dict = {entry['payment_method']: entry['total'] for entry in future_payment_type_totals}
-
-    # Calculate counts for each payment method (group by cheque_detail for cheques)
-    payment_counts_dict = {}
-    future_payment_counts_dict = {}
-    
-    for payment_method in set(payment_totals_dict.keys()) | set(future_payment_totals_dict.keys()):
-        # For current pending deposits
-        current_invoices = current_pending_deposits.filter(payment_method=payment_method)
-        if payment_method == 'cheque':
-            # Count unique cheque details
-            payment_counts_dict[payment_method] = len(set(current_invoices.exclude(cheque_detail__isnull=True).values_list('cheque_detail', flat=True)))
-        else:
-            # Count individual invoices for non-cheque payments
-            payment_counts_dict[payment_method] = current_invoices.count()
-        
-        # For future deposits
-        future_invoices = future_deposits.filter(payment_method=payment_method)
-        if payment_method == 'cheque':
-            # Count unique cheque details
-            future_payment_counts_dict[payment_method] = len(set(future_invoices.exclude(cheque_detail__isnull=True).values_list('cheque_detail', flat=True)))
-        else:
-            # Count individual invoices for non-cheque payments
-            future_payment_counts_dict[payment_method] = future_invoices.count()
-
-    modified_invoices = []
-    for invoice in invoices_today:
-        grouped_items = defaultdict(list)
-        for item in invoice.invoiceitem_set.all():
-            if item.product:
-                clean_name = re.sub(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)", "", item.product.name)
-                grouped_items[clean_name].append(str(item.quantity))
-
-        modified_invoices.append({
-            'delivery_date': invoice.delivery_date,
-            'number': invoice.number,
-            'customer': invoice.customer,
-            'deliveryman': invoice.deliveryman,
-            'salesman': invoice.salesman,
-            'total_price': invoice.total_price,
-            'items': [f"{name} ({' + '.join(quantities)})" for name, quantities in grouped_items.items()]
-        })
-
+    # Read before the tiles, so that a change made while they render is pushed to the page again
+    dashboard_state = format_state(today, tile_versions())
     return render(request, 'invoice/home.html', {
-        'invoices_today': modified_invoices,
-        'pending_deposits': pending_deposits,
-        'total_pending_deposit': total_pending_deposit,
-        'payment_totals_dict': payment_totals_dict,
-        'future_payment_totals_dict': future_payment_totals_dict,
-        'payment_counts_dict': payment_counts_dict,
-        'future_payment_counts_dict': future_payment_counts_dict,
+        **today_tile_context(today),
+        **pending_deposit_summary(today),
+        'dashboard_state': dashboard_state,
     })
 
 
-@staff_member_required
-def sales_data(request):
+def _dashboard_viewer(request):
+    user = request.user
+    return user.is_active and user.is_staff, is_lafarge_or_superuser(user)
+
+
+async def dashboard_events(request):
+    """Server-sent events pushing the dashboard tiles that change while the page is open."""
+    is_staff, sees_charts = await sync_to_async(_dashboard_viewer)(request)
+    if not is_staff:
+        raise PermissionDenied
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker cannot hold the connection without blocking: send what is pending and let the browser reconnect
+        events = [event async for event in dashboard_stream(since, sees_charts, duration=0)]
+        response = HttpResponse(''.join(events), content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(dashboard_stream(since, sees_charts), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Keep proxies from holding events back
+    return response
+
+
+@staff_member_required_async
+@use_replica
+@versioned_cache('sales_data', vary_on_user=False)
+async def sales_data(request):
     """API endpoint providing sales analytics data for charts and reports."""
     try:
-        if not Invoice.objects.exists():
-            return JsonResponse({"error": "No invoices found"}, status=400)
-
         current_date = now()
         last_month = (current_date.month - 1) or 12
         last_month_year = current_date.year if current_date.month > 1 else current_date.year - 1
@@ -106,9 +76,9 @@ def sales_data(request):
 
         sales_per_month = (
             Invoice.objects
-                .annotate(month=ExtractMonth('delivery_date'), year=ExtractYear('delivery_date'))
-                .exclude(month__isnull=True)
-                .exclude(month=1, year=2025)
+                .exclude(delivery_date__isnull=True)
+                .exclude(**month_period(2025, 1).lookups('delivery_date'))
+                .annotate(month=ExtractMonth('delivery_date'))
                 .values('month')
                 .annotate(total_sales=Sum('total_price'))
                 .order_by('month')
@@ -116,7 +86,7 @@ def sales_data(request):
 
         sales_by_salesman = (
             Invoice.objects
-                .filter(delivery_date__month=last_month, delivery_date__year=last_month_year)
+                .filter(**month_period(last_month_year, last_month).lookups('delivery_date'))
                 .select_related('salesman')
                 .values('salesman__code')
                 .annotate(total_sales=Sum('total_price'))
@@ -126,9 +96,16 @@ def sales_data(request):
                 .order_by('-total_sales')
         )
 
+        # The three queries are independent, so they are awaited together
+        has_invoices, sales_per_month, sales_by_salesman = await asyncio.gather(
+            Invoice.objects.aexists(), alist(sales_per_month), alist(sales_by_salesman),
+        )
+        if not has_invoices:
+            return JsonResponse({"error": "No invoices found"}, status=400)
+
         data = {
-            "sales_per_month": list(sales_per_month),
-            "sales_by_salesman": list(sales_by_salesman),
+            "sales_per_month": sales_per_month,
+            "sales_by_salesman": sales_by_salesman,
             "last_month_name": last_month_name,
         }
 
@@ -139,8 +116,10 @@ def sales_data(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
-@staff_member_required
-def product_insights_data(request):
+@staff_member_required_async
+@use_replica
+@versioned_cache('product_insights_data', vary_on_user=False)
+async def product_insights_data(request):
     """API endpoint providing product sales analytics for the previous month."""
     try:
         current_date = now()
@@ -149,17 +128,16 @@ def product_insights_data(request):
         last_month_name = calendar.month_name[last_month]
 
         # Get all invoice items for the specified month
-        from ..models import InvoiceItem
         invoice_items = (
             InvoiceItem.objects
-                .filter(invoice__delivery_date__month=last_month, invoice__delivery_date__year=last_month_year)
+                .filter(**month_period(last_month_year, last_month).lookups('invoice__delivery_date'))
                 .select_related('product')
                 .values('product__name', 'sum_price')
         )
 
         # Group by cleaned product name (without lot numbers)
         grouped_products = defaultdict(float)
-        for item in invoice_items:
+        async for item in invoice_items:
             if item['product__name']:
                 clean_name = re.sub(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)", "", item['product__name'])
                 grouped_products[clean_name] += float(item['sum_price'] or 0)
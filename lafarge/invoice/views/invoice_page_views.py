@@ -1,22 +1,20 @@
-import re
-from collections import defaultdict
-from datetime import datetime, timedelta
-from decimal import Decimal
-
 from dateutil.relativedelta import relativedelta
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Sum
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.utils.decorators import method_decorator
-from django.utils.timezone import make_aware
 from django.utils.timezone import now
 from django_filters.views import FilterView
 from django_tables2 import SingleTableMixin
 
+from ..cache_utils import versioned_cache
 from ..models import Invoice
+from ..period_utils import month_period
 from ..tables import InvoiceTable, InvoiceFilter
 from ..decorators import user_is_lafarge_or_superuser
+from ..profiling_utils import profile_view
+from ..report_utils import render_report
 
 
 @method_decorator(staff_member_required, name='dispatch')
@@ -26,6 +24,9 @@ class InvoiceListView(SingleTableMixin, FilterView):
     template_name = "invoice/invoice_list.html"
     filterset_class = InvoiceFilter
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('customer', 'salesman')
+
 
 @staff_member_required
 def invoice_detail(request, invoice_number):
@@ -40,6 +41,7 @@ def invoice_detail(request, invoice_number):
     return render(request, 'invoice/invoice_detail.html', context)
 
 @staff_member_required
+@versioned_cache('monthly_preview')
 def monthly_preview(request):
     latest_invoice = Invoice.objects.filter(delivery_date__isnull=False).order_by('-delivery_date').first()
 
@@ -57,7 +59,7 @@ def monthly_preview(request):
         if year == 2025 and month == 1:
             continue
         total_amount = (
-                Invoice.objects.filter(delivery_date__year=year, delivery_date__month=month)
+                Invoice.objects.filter(**month_period(year, month).lookups('delivery_date'))
                 .aggregate(total=Sum("total_price"))["total"] or 0
         )
 
@@ -73,47 +75,8 @@ def monthly_preview(request):
 
 
 @staff_member_required
+@profile_view
 def monthly_report(request, year, month):
-    start_date = datetime(int(year), int(month), 1)
-    first_day = make_aware(datetime(int(year), int(month), 1))
-    last_day = make_aware(start_date + relativedelta(months=1) - timedelta(days=1))
-
-    invoices = Invoice.objects.filter(delivery_date__range=(first_day, last_day)).prefetch_related(
-        "invoiceitem_set", "invoiceitem_set__product"
-    )
-
-    weeks = {
-        1: {"invoices": [], "total": Decimal("0.00")},
-        2: {"invoices": [], "total": Decimal("0.00")},
-        3: {"invoices": [], "total": Decimal("0.00")},
-        4: {"invoices": [], "total": Decimal("0.00")},
-        5: {"invoices": [], "total": Decimal("0.00")},
-    }
-    monthly_total = Decimal("0.00")
-
-    for invoice in invoices:
-        week_number = (invoice.delivery_date.day - 1) // 7 + 1
-        if week_number <= 4:
-            weeks[week_number]["invoices"].append(invoice)
-            weeks[week_number]["total"] += invoice.total_price
-        else:
-            weeks[5]["invoices"].append(invoice)  # Handle months with more than 28 days
-            weeks[5]["total"] += invoice.total_price
-        monthly_total += invoice.total_price
-
-        # Group invoice items by product name without the lot number
-        grouped_items = defaultdict(list)
-
-        for item in invoice.invoiceitem_set.all():
-            if item.product:
-                clean_name = re.sub(r"\s*\(Lot\s*no\.?:?\s*[A-Za-z0-9-]+\)", "", item.product.name)
-                grouped_items[clean_name].append(str(item.quantity))
-
-        # Convert grouped items to a formatted list
-        invoice.items = [f"{name} ({' + '.join(quantities)})" for name, quantities in grouped_items.items()]
-
-    return render(
-        request,
-        "invoice/monthly_report.html",
-        {"weeks": weeks, "year": year, "month": month, "monthly_total": monthly_total},
-    )
+    return render(request, "invoice/monthly_report.html", {
+        "report_html": render_report('monthly_report', year, month),
+    })
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+
+from ..metrics_utils import render_metrics
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, open to local collectors and staff users."""
+    remote_addr = request.META.get('REMOTE_ADDR')
+    if remote_addr not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
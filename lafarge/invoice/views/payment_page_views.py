@@ -1,6 +1,5 @@
 import re
 from collections import defaultdict
-from datetime import datetime, timedelta
 from decimal import Decimal
 
 from dateutil.relativedelta import relativedelta
@@ -9,14 +8,18 @@ from django.db.models import Sum
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.utils.decorators import method_decorator
-from django.utils.timezone import make_aware
-from django.utils.timezone import now
+from django.utils.timezone import localdate, now
 from django_filters.views import FilterView
 from django_tables2 import SingleTableMixin
 
+from ..cache_utils import versioned_cache
+from ..deposit_utils import due_deposit_slips
 from ..models import Invoice
+from ..period_utils import month_period
+from ..report_utils import render_report
 from ..tables import InvoiceTable, InvoiceFilter
 
+@versioned_cache('monthly_payment_preview')
 def monthly_payment_preview(request):
     latest_invoice = Invoice.objects.filter(payment_date__isnull=False).order_by('-payment_date').first()
 
@@ -34,7 +37,7 @@ def monthly_payment_preview(request):
         if year == 2025 and month == 1:
             continue
         total_amount = (
-                Invoice.objects.filter(payment_date__year=year, payment_date__month=month)
+                Invoice.objects.filter(**month_period(year, month).lookups('payment_date'))
                 .aggregate(total=Sum("total_price"))["total"] or 0
         )
 
@@ -51,25 +54,14 @@ def monthly_payment_preview(request):
 
 @staff_member_required
 def monthly_payment_report(request, year, month):
-    start_date = datetime(int(year), int(month), 1)
-    first_day = make_aware(datetime(int(year), int(month), 1))
-    last_day = make_aware(start_date + relativedelta(months=1) - timedelta(days=1))
+    return render(request, "invoice/monthly_payment_report.html", {
+        "report_html": render_report('monthly_payment_report', year, month),
+    })
 
-    invoices = Invoice.objects.filter(payment_date__range=(first_day, last_day)).prefetch_related(
-        "invoiceitem_set", "invoiceitem_set__product"
-    ).order_by('cheque_detail', 'payment_date')
-    grouped_invoices = {}
-    for invoice in invoices:
-        cheque_detail = invoice.cheque_detail
-        if cheque_detail not in grouped_invoices:
-            grouped_invoices[cheque_detail] = {
-                'invoices': [],
-                'total_price': 0
-            }
-        grouped_invoices[cheque_detail]['invoices'].append(invoice)
-        grouped_invoices[cheque_detail]['total_price'] += invoice.total_price
-    return render(
-        request,
-        "invoice/monthly_payment_report.html",
-        {"year": year, "month": month, "grouped_invoices": grouped_invoices},
-    )
\ No newline at end of file
+
+@staff_member_required
+@versioned_cache('deposit_slips')
+def deposit_slips(request):
+    """Payments due for deposit grouped into bank deposit slips, one set per payment method."""
+    today = localdate()
+    return render(request, "invoice/deposit_slips.html", {"today": today, "slips": due_deposit_slips(today)})
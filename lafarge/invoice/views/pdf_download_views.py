@@ -15,9 +15,12 @@ from ..pdf_generation.invoice_legacy import draw_invoice_page_legacy
 from ..pdf_generation.order_form import draw_order_form_page
 from ..pdf_generation.sample import draw_sample_page
 from ..pdf_generation.statement import draw_statement_page
+from ..metrics_utils import time_pdf_render
+from ..profiling_utils import profile_view
 
 
 @staff_member_required
+@profile_view
 def download_invoice_legacy_pdf(request, invoice_number):
     invoice = get_object_or_404(
         Invoice.objects.select_related('customer', 'salesman').prefetch_related('invoiceitem_set__product'),
@@ -26,9 +29,9 @@ def download_invoice_legacy_pdf(request, invoice_number):
     buffer = io.BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A4)
 
-    draw_invoice_page_legacy(pdf, invoice)
-
-    pdf.save()
+    with time_pdf_render('invoice_legacy'):
+        draw_invoice_page_legacy(pdf, invoice)
+        pdf.save()
     buffer.seek(0)
     pdf_content = buffer.getvalue()
     buffer.close()
@@ -39,6 +42,7 @@ def download_invoice_legacy_pdf(request, invoice_number):
 
 
 @staff_member_required
+@profile_view
 def download_invoice_pdf(request, invoice_number):
     invoice = get_object_or_404(
         Invoice.objects.select_related('customer', 'salesman').prefetch_related('invoiceitem_set__product'),
@@ -47,18 +51,19 @@ def download_invoice_pdf(request, invoice_number):
     buffer = io.BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A4)
 
-    draw_invoice_page(pdf, invoice, "Poison Form")
-    pdf.showPage()
+    with time_pdf_render('invoice'):
+        draw_invoice_page(pdf, invoice, "Poison Form")
+        pdf.showPage()
 
-    draw_invoice_page(pdf, invoice, "Original")
-    pdf.showPage()
+        draw_invoice_page(pdf, invoice, "Original")
+        pdf.showPage()
 
-    draw_invoice_page(pdf, invoice, "Customer Copy")
-    pdf.showPage()
+        draw_invoice_page(pdf, invoice, "Customer Copy")
+        pdf.showPage()
 
-    draw_invoice_page(pdf, invoice, "Company Copy")
+        draw_invoice_page(pdf, invoice, "Company Copy")
 
-    pdf.save()
+        pdf.save()
     buffer.seek(0)
     pdf_content = buffer.getvalue()
     buffer.close()
@@ -69,6 +74,7 @@ def download_invoice_pdf(request, invoice_number):
 
 
 @staff_member_required
+@profile_view
 def download_sample_pdf(request, invoice_number):
     sample = get_object_or_404(
         Invoice.objects.select_related('customer', 'salesman').prefetch_related('invoiceitem_set__product'),
@@ -77,9 +83,9 @@ def download_sample_pdf(request, invoice_number):
     buffer = io.BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A5)
 
-    draw_sample_page(pdf, sample)
-
-    pdf.save()
+    with time_pdf_render('sample'):
+        draw_sample_page(pdf, sample)
+        pdf.save()
     buffer.seek(0)
     pdf_content = buffer.getvalue()
     buffer.close()
@@ -90,6 +96,7 @@ def download_sample_pdf(request, invoice_number):
 
 
 @staff_member_required
+@profile_view
 def download_order_form_pdf(request, invoice_number):
     order_form = get_object_or_404(
         Invoice.objects.select_related('customer', 'salesman').prefetch_related('invoiceitem_set__product'),
@@ -98,9 +105,9 @@ def download_order_form_pdf(request, invoice_number):
     buffer = io.BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A5)
 
-    draw_order_form_page(pdf, order_form)
-
-    pdf.save()
+    with time_pdf_render('order_form'):
+        draw_order_form_page(pdf, order_form)
+        pdf.save()
     buffer.seek(0)
     pdf_content = buffer.getvalue()
     buffer.close()
@@ -111,6 +118,7 @@ def download_order_form_pdf(request, invoice_number):
 
 
 @staff_member_required
+@profile_view
 def download_statement_pdf(request, customer_name, customer_care_of):
     customer_name = unquote(customer_name)
     customer_care_of = unquote(customer_care_of)
@@ -119,9 +127,9 @@ def download_statement_pdf(request, customer_name, customer_care_of):
     buffer = io.BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A4)
 
-    draw_statement_page(pdf, customer, unpaid_invoices)
-
-    pdf.save()
+    with time_pdf_render('statement'):
+        draw_statement_page(pdf, customer, unpaid_invoices)
+        pdf.save()
     buffer.seek(0)
     pdf_content = buffer.getvalue()
     buffer.close()
@@ -132,6 +140,7 @@ def download_statement_pdf(request, customer_name, customer_care_of):
 
 
 @staff_member_required
+@profile_view
 def download_delivery_note_pdf(request, invoice_number):
     invoice = get_object_or_404(
         Invoice.objects.select_related('customer', 'salesman').prefetch_related('invoiceitem_set__product'),
@@ -140,9 +149,9 @@ def download_delivery_note_pdf(request, invoice_number):
     buffer = io.BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=A4)
 
-    draw_delivery_note(pdf, invoice)
-
-    pdf.save()
+    with time_pdf_render('delivery_note'):
+        draw_delivery_note(pdf, invoice)
+        pdf.save()
     buffer.seek(0)
     pdf_content = buffer.getvalue()
     buffer.close()
@@ -1,4 +1,3 @@
-import re
 from collections import defaultdict
 
 from django.contrib.admin.views.decorators import staff_member_required
@@ -6,8 +5,10 @@ from django.db.models import F
 from django.shortcuts import render, get_object_or_404
 from django_tables2.export.export import TableExport
 
-from ..check_utils import prefix_check
-from ..models import Product, ProductTransaction, InvoiceItem
+from ..check_utils import get_forbidden_words, prefix_check
+from ..export_utils import STREAMING_FORMATS, stream_table_export
+from ..models import Product, ProductTransaction, InvoiceItem, extract_lot_number
+from ..profiling_utils import profile_view
 from ..tables import ProductTransactionTable, ProductTransactionFilter
 
 
@@ -30,9 +31,12 @@ def product_transaction_detail(request, product_id):
 
     # Export data if requested
     export_format = request.GET.get("_export", None)
-    if export_format:
+    if export_format in STREAMING_FORMATS:
+        return stream_table_export(table, export_format, f"{product.name}_transactions.{export_format}",
+                                   request=request)
+    if TableExport.is_valid_format(export_format):
         exporter = TableExport(export_format, table)
-        return exporter.response(f"{product.name}_transactions.{export_format}")
+        return exporter.response(f"{product.name}_transactions.{export_format}", request=request)
 
     return render(request, 'invoice/product_transaction_detail.html', {
         'product': product,
@@ -42,6 +46,7 @@ def product_transaction_detail(request, product_id):
     })
 
 
+@profile_view
 def product_transaction_view(request, product_id):
     """Display product usage history through invoice items."""
     product = get_object_or_404(Product, id=product_id)
@@ -60,11 +65,7 @@ def product_transaction_view(request, product_id):
 
     transactions_data = []
     remaining_stock = product.quantity  # Start with the latest stock
-    batch_match = re.search(r"\(Lot\s*no\.?:?\s*([A-Za-z0-9-]+)\)", product.name)
-    if batch_match:
-        batch_number = batch_match.group(1)
-    else:
-        batch_number = ""
+    batch_number = extract_lot_number(product.name)
 
     for item in transactions:
         remaining_stock += item.quantity
@@ -93,6 +94,7 @@ def product_transaction_view(request, product_id):
         "remaining_stock": None
     })
 
+    forbidden_words = get_forbidden_words()
     for item in transactions:
         invoice_number = item.invoice.number
         quantity_change = -item.quantity
@@ -100,19 +102,19 @@ def product_transaction_view(request, product_id):
 
         care_of = None
         if item.invoice.customer.care_of:
-            if not prefix_check(item.invoice.customer.care_of.lower()):
+            if not prefix_check(item.invoice.customer.care_of.lower(), forbidden_words):
                 care_of = "Dr. " + item.invoice.customer.care_of
             else:
                 care_of = item.invoice.customer.care_of
         customer_name = None
         if item.invoice.customer.name:
-            if not prefix_check(item.invoice.customer.name.lower()):
+            if not prefix_check(item.invoice.customer.name.lower(), forbidden_words):
                 customer_name = "Dr. " + item.invoice.customer.name
             else:
                 customer_name = item.invoice.customer.name
         sample_customer = None
         if item.invoice.sample_customer:
-            if not prefix_check(item.invoice.sample_customer.lower()):
+            if not prefix_check(item.invoice.sample_customer.lower(), forbidden_words):
                 sample_customer = "Dr. " + item.invoice.sample_customer
             else:
                 sample_customer = item.invoice.sample_customer
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+from ..decorators import user_is_superuser
+from ..profiling_utils import get_capture_path, list_captures
+
+
+@user_is_superuser
+def profile_list(request):
+    """Admin page listing captured request profiles with their top functions."""
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request Profiles',
+        'captures': list_captures(),
+    }
+    return render(request, 'admin/invoice/profile_list.html', context)
+
+
+@user_is_superuser
+def download_profile(request, name):
+    """Download a captured ``.prof`` file for inspection with pstats or snakeviz."""
+    path = get_capture_path(name, '.prof')
+    if path is None:
+        raise Http404("Profile not found")
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
@@ -1,5 +1,7 @@
 from pathlib import Path
 import os
+import django
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'invoice.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -58,14 +61,118 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'lafarge.wsgi.application'
+ASGI_APPLICATION = 'lafarge.asgi.application'
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'database.sqlite3',
+# Database, DB_ENGINE selects "sqlite" (default) or "postgresql"
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'lafarge'),
+            'USER': os.getenv('DB_USER', 'lafarge'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Persistent connections, checked before reuse by each request
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer in transaction pooling mode cannot keep server-side cursors open
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', 'False').lower() in ('true', '1', 't'),
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv('DB_POOL', 'False').lower() in ('true', '1', 't'):
+        # In-process psycopg connection pool, needs Django 5.1+ and psycopg[pool]
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured("DB_POOL requires Django 5.1 or newer; use DB_CONN_MAX_AGE or PgBouncer.")
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'invoice.sqlite_backend',
+            'NAME': BASE_DIR / 'database.sqlite3',
+        }
     }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_ENGINE {DB_ENGINE!r}, expected 'sqlite' or 'postgresql'.")
+
+# SQLite performance profile, applied to every new connection (see invoice.sqlite_utils)
+SQLITE_TUNING_ENABLED = os.getenv('SQLITE_TUNING_ENABLED', 'True').lower() in ('true', '1', 't')
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),  # negative values are KiB
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+    'temp_store': 'MEMORY',
 }
+# Take the write lock when a transaction starts instead of on its first write
+SQLITE_IMMEDIATE_TRANSACTIONS = os.getenv('SQLITE_IMMEDIATE_TRANSACTIONS', 'True').lower() in ('true', '1', 't')
+
+# Read replica for report views (see invoice.db_routers). With SQLite it is a
+# snapshot file refreshed by "manage.py refresh_replica"; with PostgreSQL set DB_REPLICA_HOST.
+DATABASE_ROUTERS = ['invoice.db_routers.ReplicaRouter']
+REPLICA_MAX_AGE = int(os.getenv('REPLICA_MAX_AGE', 3600))  # seconds before reports fall back to default
+
+if DB_ENGINE == 'sqlite':
+    REPLICA_SNAPSHOT_PATH = os.getenv('REPLICA_SNAPSHOT_PATH', BASE_DIR / 'replica.sqlite3')
+    DATABASES['replica'] = {
+        'ENGINE': 'invoice.sqlite_backend',
+        'NAME': f"file:{REPLICA_SNAPSHOT_PATH}?mode=ro",
+        'SNAPSHOT_PATH': REPLICA_SNAPSHOT_PATH,
+        # The snapshot is read-only: keep its rollback journal, tune only caching
+        'SQLITE_PRAGMAS': {name: SQLITE_PRAGMAS[name] for name in ('cache_size', 'mmap_size', 'temp_store')},
+        'TEST': {'MIRROR': 'default'},
+    }
+elif os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Cache for the pricing, price book and closed-period lookups and the versioned view cache
+# (see invoice.cache_utils). CACHE_BACKEND selects "locmem" (default, per worker process),
+# "file" (shared by the workers of one host) or "redis" (shared by every host, set REDIS_URL).
+# WEB_CONCURRENCY is the number of worker processes, read by uvicorn and gunicorn as well;
+# the system checks refuse "locmem" for more than one.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'locmem').lower()
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+            'KEY_PREFIX': 'lafarge',
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'lafarge',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected 'locmem', 'file' or 'redis'.")
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -86,6 +193,13 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# On-demand request profiling (superusers only, see invoice.profiling_utils)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() in ('true', '1', 't')
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+
+# Prometheus metrics endpoint (/metrics), open to these addresses and to staff users
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1 ::1').split()
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 